@@ -0,0 +1,92 @@
+"""
+Statistik akurasi prediksi yang di-maintain secara incremental
+Setiap actual price yang masuk meng-update agregat dalam O(1):
+total count, direction hits, jumlah APE, dan window rolling 7/30/90 prediksi (ring buffer)
+"""
+
+WINDOWS = (7, 30, 90)
+
+
+class RunningAccuracy:
+    """Agregat akurasi + ring buffer untuk window rolling"""
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = tuple(sorted(windows))
+        self.capacity = self.windows[-1]
+        self.count = 0
+        self.hits = 0
+        self.sum_ape = 0.0
+        self.ape_ring = [0.0] * self.capacity
+        self.hit_ring = [0] * self.capacity
+        self.pos = 0
+        self.filled = 0
+        self.window_ape = {w: 0.0 for w in self.windows}
+        self.window_hits = {w: 0 for w in self.windows}
+
+    def update(self, ape: float, hit: bool):
+        """Tambah satu prediksi resolved (ape dalam persen)"""
+        hit = int(bool(hit))
+
+        # Keluarkan elemen yang keluar dari tiap window sebelum slot ditimpa
+        for w in self.windows:
+            if self.filled >= w:
+                leaving = (self.pos - w) % self.capacity
+                self.window_ape[w] -= self.ape_ring[leaving]
+                self.window_hits[w] -= self.hit_ring[leaving]
+            self.window_ape[w] += ape
+            self.window_hits[w] += hit
+
+        self.ape_ring[self.pos] = ape
+        self.hit_ring[self.pos] = hit
+        self.pos = (self.pos + 1) % self.capacity
+        self.filled = min(self.filled + 1, self.capacity)
+
+        self.count += 1
+        self.hits += hit
+        self.sum_ape += ape
+
+    def summary(self) -> dict:
+        if not self.count:
+            return None
+        windows = {}
+        for w in self.windows:
+            n = min(self.filled, w)
+            windows[str(w)] = {
+                "predictions": n,
+                "direction_accuracy": self.window_hits[w] / n * 100,
+                "avg_mape": self.window_ape[w] / n,
+            }
+        return {
+            "total_predictions": self.count,
+            "direction_accuracy": self.hits / self.count * 100,
+            "avg_mape": self.sum_ape / self.count,
+            "windows": windows,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "windows": list(self.windows),
+            "count": self.count,
+            "hits": self.hits,
+            "sum_ape": self.sum_ape,
+            "ape_ring": self.ape_ring,
+            "hit_ring": self.hit_ring,
+            "pos": self.pos,
+            "filled": self.filled,
+            "window_ape": {str(w): v for w, v in self.window_ape.items()},
+            "window_hits": {str(w): v for w, v in self.window_hits.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RunningAccuracy":
+        acc = cls(state.get("windows", WINDOWS))
+        acc.count = state["count"]
+        acc.hits = state["hits"]
+        acc.sum_ape = state["sum_ape"]
+        acc.ape_ring = state["ape_ring"]
+        acc.hit_ring = state["hit_ring"]
+        acc.pos = state["pos"]
+        acc.filled = state["filled"]
+        acc.window_ape = {int(w): v for w, v in state["window_ape"].items()}
+        acc.window_hits = {int(w): v for w, v in state["window_hits"].items()}
+        return acc
@@ -1,17 +1,28 @@
 from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi.responses import PlainTextResponse
 import os
 import firebase_admin
 from firebase_admin import credentials, auth, firestore, messaging
 from pydantic import BaseModel
 import numpy as np
 import pandas as pd
-import tensorflow as tf
-import joblib
-import yfinance as yf
 import logging
 import json
+import base64
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+from model_registry import ModelRegistry
+from prediction_store import PredictionStore, PREDICTIONS_DB
+from monitor import FeatureDriftMonitor, DRIFT_STATE_FILE
+from feature_buffer import FeatureBufferStore
+from market_data import MarketDataCache, FirestoreProvider, get_provider, MARKET_DATA_PROVIDER
+from uncertainty import MCDropoutEstimator, MC_DEFAULT_SAMPLES, MC_MAX_SAMPLES
+from request_profiler import install_profiler, profiled, is_admin, list_profiles, read_profile
+from memory_monitor import MemoryMonitor, install_memory_monitor, estimate_nbytes, shed_mapping
+from market_scheduler import MarketCloseScheduler, PrecomputeError, ENABLE_SCHEDULER, SCHEDULER_TICKERS
+
 # Setup logger
 logging.basicConfig(
     level=logging.INFO,
@@ -38,32 +49,34 @@ except Exception as e:
     firebase_app = None
     firestore_client = None
 
-# Path model & scaler untuk GGRM
-MODEL_PATH = "stock_model.keras"
-SCALER_PATH = "scaler_ggrm.pkl"
+# Feature columns untuk konsistensi
+FEATURE_COLS = ['Close', 'Open', 'High', 'Low', 'Volume', 'return1', 'ma7', 'ma21', 'std7']
+SEQ_LEN = 60
+TICKER_DEFAULT = "GGRM.JK"
+MAX_BATCH_TICKERS = int(os.getenv("MAX_BATCH_TICKERS", "50"))
+DRIFT_SAVE_EVERY = int(os.getenv("DRIFT_SAVE_EVERY", "50"))
+FORECAST_DAYS = 7
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "1000"))
+HISTORY_INDEX_MAX_ENTRIES = 64
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "256"))
+MAX_FORECAST_DAYS = int(os.getenv("MAX_FORECAST_DAYS", "30"))
+
+# Registry model per ticker (model, scaler, metadata), di-load lazy dengan LRU eviction
+registry = ModelRegistry(default_ticker=TICKER_DEFAULT)
 
 # Initialize metadata dengan default value
 metadata = {"info": "Model metadata tidak tersedia", "status": "loaded"}
+model = None
+scaler = None
 
-# Load model & scaler
+# Load model & scaler default (GGRM) saat startup
 logger.info("Loading GGRM model and scaler...")
 try:
-    model = tf.keras.models.load_model(MODEL_PATH, compile=False)
-    scaler = joblib.load(SCALER_PATH)
-    
-    # Load metadata jika ada
-    metadata_path = 'model_metadata.json'
-    if os.path.exists(metadata_path):
-        try:
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-            logger.info(f"Model metadata: {metadata}")
-        except Exception as e:
-            logger.warning(f"Could not load metadata: {e}")
-            metadata = {"info": "Metadata file tidak valid", "status": "fallback"}
-    else:
-        logger.info("Metadata file tidak ditemukan, menggunakan default")
-        
+    default_entry = registry.get(TICKER_DEFAULT)
+    model = default_entry.model
+    scaler = default_entry.scaler
+    metadata = default_entry.metadata
+    logger.info(f"Model metadata: {metadata}")
     logger.info("Model dan scaler berhasil dimuat")
 except FileNotFoundError as e:
     logger.error(f"File tidak ditemukan: {e}")
@@ -73,11 +86,6 @@ except Exception as e:
     logger.error(f"Error loading model: {e}")
     metadata = {"error": str(e), "status": "error"}
 
-# Feature columns untuk konsistensi
-FEATURE_COLS = ['Close', 'Open', 'High', 'Low', 'Volume', 'return1', 'ma7', 'ma21', 'std7']
-SEQ_LEN = 60
-TICKER_DEFAULT = "GGRM.JK"
-
 # Schema input untuk prediksi
 class StockInput(BaseModel):
     open: float
@@ -94,6 +102,10 @@ class StockInput(BaseModel):
 class SequenceInput(BaseModel):
     sequence: list  # 2D array (60, 9)
 
+# Schema untuk batch prediction
+class BatchPredictInput(BaseModel):
+    tickers: list  # daftar ticker, contoh ["GGRM.JK", "BBRI.JK"]
+
 # Schema untuk user profile
 class UserProfile(BaseModel):
     displayName: str = None
@@ -118,6 +130,14 @@ def verify_id_token_optional(token: str):
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
 
+# Profiling per request (admin: X-Profile: 1 / ?profile=1; sampling: PROFILE_SAMPLE_RATE=N)
+install_profiler(app, auth.verify_id_token)
+
+# RSS, ukuran cache dan peak per request; cache dibuang jika RSS melewati MEMORY_BUDGET_MB
+memory_monitor = MemoryMonitor()
+install_memory_monitor(app, memory_monitor)
+
+
 def get_current_user(authorization: str = Header(None)):
     """Dependency FastAPI: jika header Authorization disediakan, verifikasi token dan kembalikan decoded token. Jika tidak disediakan, kembalikan None."""
     if not authorization:
@@ -128,35 +148,63 @@ def get_current_user(authorization: str = Header(None)):
     return verify_id_token_optional(token)
 
 
-def fetch_stock_data(ticker: str = TICKER_DEFAULT, period: str = "1y") -> pd.DataFrame:
+# Sumber bar OHLCV (MARKET_DATA_PROVIDER: yfinance, firestore, local)
+market_provider = FirestoreProvider(firestore_client) if MARKET_DATA_PROVIDER == "firestore" else get_provider()
+
+
+def download_stock_data(ticker: str = TICKER_DEFAULT, period: str = "1y", interval: str = "1d") -> pd.DataFrame:
     """
-    Fetch stock data dari yfinance
+    Fetch stock data dari market data provider (upstream, dipanggil lewat market_cache)
+    """
+    logger.info(f"Fetching {ticker} data for period {period} dari {market_provider.name}...")
+    df = market_provider.history(ticker, period, interval)
+    logger.info(f"Fetched {len(df)} rows for {ticker}")
+    return df
+
+
+def download_stock_data_many(tickers: list, period: str = "1y", interval: str = "1d") -> dict:
+    """Fetch banyak ticker dalam satu request provider (upstream, dipanggil lewat market_cache)"""
+    logger.info(f"Fetching {len(tickers)} tickers for period {period} dari {market_provider.name}...")
+    frames = market_provider.history_many(tickers, period, interval)
+    logger.info(f"Fetched {len(frames)}/{len(tickers)} tickers")
+    return frames
+
+
+# Stale-while-revalidate cache + circuit breaker di depan provider
+market_cache = MarketDataCache(download_stock_data, fetch_many_fn=download_stock_data_many)
+
+
+def fetch_stock_data_with_info(ticker: str = TICKER_DEFAULT, period: str = "1y", interval: str = "1d") -> tuple:
+    """
+    Returns: (df, info) dengan info = {data_age_seconds, stale, source}
+    Data lama langsung dikembalikan saat upstream lambat/gagal
     """
     try:
-        logger.info(f"Fetching {ticker} data for period {period}...")
-        df = yf.download(ticker, period=period, interval="1d", progress=False)
-        if df.empty:
-            raise ValueError(f"No data returned for {ticker}")
-        logger.info(f"Fetched {len(df)} rows for {ticker}")
-        return df
+        # Interval besar (1wk, 1mo, 1h, ...) diturunkan lokal dari bar dasar yang di-cache
+        return market_cache.get_interval(ticker, period, interval)
     except Exception as e:
         logger.error(f"Error fetching {ticker}: {e}")
         raise
 
 
+def fetch_stock_data(ticker: str = TICKER_DEFAULT, period: str = "1y", interval: str = "1d") -> pd.DataFrame:
+    """
+    Fetch stock data (lewat cache market data)
+    """
+    return fetch_stock_data_with_info(ticker, period, interval)[0]
+
+
 def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Engineer technical features yang sama dengan training pipeline
     Columns: Close, Open, High, Low, Volume, return1, ma7, ma21, std7
     """
-    df = df.copy()
-    
     # Ensure required columns exist
     required = ['Open', 'High', 'Low', 'Close', 'Volume']
     if not all(col in df.columns for col in required):
         raise ValueError(f"Missing required columns: {required}")
     
-    # Keep only required columns
+    # Keep only required columns (seleksi kolom sudah menghasilkan frame baru, tidak perlu copy)
     df = df[required].dropna()
     
     # Engineer features
@@ -172,11 +220,12 @@ def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def prepare_prediction_data(ticker: str = TICKER_DEFAULT, lookback_days: int = 90) -> tuple:
+def prepare_prediction_data(ticker: str = TICKER_DEFAULT, lookback_days: int = 90, scaler=None) -> tuple:
     """
     Fetch data, engineer features, scale, dan siapkan untuk prediction
     Returns: (last_row_scaled, df, features_dict)
     """
+    scaler = scaler or registry.get(ticker).scaler
     try:
         # Fetch data
         df = fetch_stock_data(ticker, period="3mo")
@@ -204,42 +253,56 @@ def prepare_prediction_data(ticker: str = TICKER_DEFAULT, lookback_days: int = 9
         raise
 
 
-def predict_next_close(ticker: str = TICKER_DEFAULT) -> dict:
+# Window fitur ter-scale per ticker; download hanya untuk seed awal dan refresh kecil per TTL
+feature_buffers = FeatureBufferStore(fetch_stock_data)
+
+
+def predict_next_close(ticker: str = TICKER_DEFAULT, mc_samples: int = 0, latency_budget_ms: float = None) -> dict:
     """
     Predict next day close price menggunakan LSTM dengan data terbaru dari yfinance
+    mc_samples > 0: tambahkan interval prediksi MC dropout (K pass dalam satu batch)
     """
     try:
-        features_scaled, df, features_dict = prepare_prediction_data(ticker)
+        # Model per ticker (fallback ke model default jika belum ada)
+        entry = registry.get(ticker)
+        buffer = feature_buffers.get(ticker, entry.scaler)
         
-        # Ambil last SEQ_LEN rows (sequence untuk LSTM)
-        X = features_scaled[-SEQ_LEN:, :].reshape(1, SEQ_LEN, len(FEATURE_COLS))
+        # Sequence SEQ_LEN terakhir sudah ter-scale di ring buffer
+        with buffer.lock:
+            X = buffer.window().reshape(1, SEQ_LEN, len(FEATURE_COLS))
+            latest = buffer.latest_raw().copy()
+            last_date = buffer.last_date
+            version = buffer.version
         
-        # Predict
-        prediction_scaled = model.predict(X, verbose=0)
+        # Sudah di-precompute oleh scheduler untuk isi buffer yang sama
+        cached = get_cached_forecast(ticker, entry, version, "next")
+        if cached is not None:
+            result = {**cached, **market_cache.freshness(ticker)}
+            return add_uncertainty(result, entry, X, mc_samples, latency_budget_ms) if mc_samples else result
         
-        # Inverse scale (hanya Close column - index 0)
-        dummy = np.zeros((prediction_scaled.shape[0], len(FEATURE_COLS)))
-        dummy[:, 0] = prediction_scaled[:, 0]
-        prediction_unscaled = scaler.inverse_transform(dummy)
-        predicted_close = float(prediction_unscaled[0, 0])
+        # Predict (ensemble: semua member paralel pada input yang sama)
+        ensemble_info = None
+        if hasattr(entry.model, "predict_with_spread"):
+            prediction_scaled, _, member_preds = entry.model.predict_with_spread(X)
+            ensemble_info = describe_ensemble(entry, member_preds[:, 0])
+        else:
+            prediction_scaled = entry.model.predict(X, verbose=0)
         
-        # Get current close price
-        current_close = float(df['Close'].iloc[-1])
-        price_change = predicted_close - current_close
-        pct_change = (price_change / current_close) * 100 if current_close != 0 else 0
+        # Inverse scale (hanya Close column - index 0)
+        predicted_close = float(inverse_scale_close(entry.scaler, prediction_scaled[:, 0])[0])
         
-        result = {
-            "ticker": ticker,
-            "current_close": current_close,
-            "predicted_close": predicted_close,
-            "price_change": price_change,
-            "pct_change": pct_change,
-            "confidence": "Medium",
-            "timestamp": datetime.now().isoformat(),
-            "last_update": str(df.index[-1].date())
-        }
+        # Current close = Close pada bar terakhir
+        current_close = float(latest[0])
+        result = build_prediction_result(ticker, entry, current_close, predicted_close, last_date)
+        if ensemble_info:
+            result["ensemble"] = ensemble_info
+        record_feature_drift(entry, [ticker], [last_date], latest.reshape(1, -1))
+        put_cached_forecast(ticker, entry, version, "next", result)
+        result = {**result, **market_cache.freshness(ticker)}
+        if mc_samples:
+            result = add_uncertainty(result, entry, X, mc_samples, latency_budget_ms)
         
-        logger.info(f"Prediction for {ticker}: {current_close} → {predicted_close} ({pct_change:+.2f}%)")
+        logger.info(f"Prediction for {ticker}: {current_close} → {predicted_close} ({result['pct_change']:+.2f}%)")
         return result
     
     except Exception as e:
@@ -247,6 +310,314 @@ def predict_next_close(ticker: str = TICKER_DEFAULT) -> dict:
         raise
 
 
+def describe_ensemble(entry, member_scaled: np.ndarray) -> dict:
+    """Prediksi per member dan spread (std berbobot) dalam skala harga"""
+    ensemble = entry.model
+    prices = inverse_scale_close(entry.scaler, member_scaled)
+    mean = float(ensemble.weights @ prices)
+    return {
+        "members": [
+            {"model": name, "weight": float(w), "predicted_close": float(p)}
+            for name, w, p in zip(ensemble.names, ensemble.weights, prices)
+        ],
+        "spread": float(np.sqrt(ensemble.weights @ (prices - mean) ** 2)),
+        "spread_pct": float(np.sqrt(ensemble.weights @ (prices - mean) ** 2) / mean * 100) if mean else None,
+    }
+
+
+mc_estimator = MCDropoutEstimator()
+
+def add_uncertainty(result: dict, entry, X: np.ndarray, samples: int, latency_budget_ms: float = None) -> dict:
+    """Interval prediksi MC dropout; confidence diturunkan dari lebar interval"""
+    try:
+        estimate = mc_estimator.estimate(
+            entry.model, X, lambda v: inverse_scale_close(entry.scaler, v),
+            samples=samples, latency_budget_ms=latency_budget_ms, key=entry.ticker
+        )[0]
+    except ValueError as e:
+        return {**result, "uncertainty": {"error": str(e)}}
+    return {**result, "confidence": estimate["confidence"], "uncertainty": estimate}
+
+
+# Cache response prediksi per ticker, valid selama isi buffer (versi) dan model belum berubah.
+# Bar hari ini yang belum final menimpa slot terakhir tanpa mengubah last_date, tapi versinya berubah.
+# LRU per ticker agar ticker yang hanya sekali diminta tidak menumpuk
+# Lock juga dipegang shed_mapping (budget memori dari thread lain)
+forecast_cache = OrderedDict()
+forecast_cache_lock = threading.Lock()
+
+def get_cached_forecast(ticker: str, entry, version: int, kind: str):
+    with forecast_cache_lock:
+        cached = forecast_cache.get(ticker)
+        if cached is None or cached["version"] != version or cached["model_ticker"] != entry.ticker:
+            return None
+        forecast_cache.move_to_end(ticker)
+        return cached.get(kind)
+
+
+def put_cached_forecast(ticker: str, entry, version: int, kind: str, value):
+    with forecast_cache_lock:
+        cached = forecast_cache.get(ticker)
+        if cached is None or cached["version"] != version or cached["model_ticker"] != entry.ticker:
+            cached = {"version": version, "model_ticker": entry.ticker}
+        cached[kind] = value
+        forecast_cache[ticker] = cached
+        forecast_cache.move_to_end(ticker)
+        while len(forecast_cache) > FORECAST_CACHE_MAX_ENTRIES:
+            forecast_cache.popitem(last=False)
+
+
+def forecast_next_days(ticker: str = TICKER_DEFAULT, days: int = FORECAST_DAYS) -> dict:
+    """
+    Forecast recursive beberapa hari bursa ke depan: prediksi tiap hari dimasukkan
+    sebagai bar sintetis (O=H=L=C=prediksi, volume = volume terakhir) ke salinan ring buffer
+    """
+    entry = registry.get(ticker)
+    buffer = feature_buffers.get(ticker, entry.scaler)
+    
+    with buffer.lock:
+        sim = buffer.clone()
+    version = sim.version
+    
+    cached = get_cached_forecast(ticker, entry, version, "forecast")
+    if cached is not None and cached["days"] >= days:
+        return {**cached, "days": days, "forecast": cached["forecast"][:days]}
+    
+    current_close = float(sim.latest_raw()[0])
+    last_volume = float(sim.latest_raw()[4])
+    last_date = sim.last_date
+    
+    forecast = []
+    date = pd.Timestamp(last_date)
+    for _ in range(days):
+        X = sim.window().reshape(1, SEQ_LEN, len(FEATURE_COLS))
+        prediction_scaled = entry.model.predict(X, verbose=0)
+        predicted_close = float(inverse_scale_close(entry.scaler, prediction_scaled[:, 0])[0])
+        date = date + pd.offsets.BDay(1)
+        sim.push_bar(date, predicted_close, predicted_close, predicted_close, predicted_close, last_volume)
+        forecast.append({
+            "date": str(date.date()),
+            "predicted_close": predicted_close,
+            "pct_change": (predicted_close / current_close - 1) * 100 if current_close else 0,
+        })
+    
+    result = {
+        "ticker": ticker,
+        "model_ticker": entry.ticker,
+        "fallback_model": entry.ticker != ticker,
+        "current_close": current_close,
+        "days": days,
+        "forecast": forecast,
+        "method": "recursive",
+        "timestamp": datetime.now().isoformat(),
+        "last_update": str(pd.Timestamp(last_date).date()),
+    }
+    put_cached_forecast(ticker, entry, version, "forecast", result)
+    return result
+
+
+def precompute_forecasts(tickers: list) -> dict:
+    """
+    Job scheduler setelah market tutup: refresh bar, hitung next-day & forecast, isi cache.
+    Raise PrecomputeError berisi ticker yang gagal agar scheduler mencoba ulang ticker tersebut
+    """
+    summary = {}
+    for ticker in tickers:
+        try:
+            entry = registry.get(ticker)
+            feature_buffers.get(ticker, entry.scaler, force_refresh=True)
+            predict_next_close(ticker)
+            forecast_next_days(ticker, FORECAST_DAYS)
+            summary[ticker] = "ok"
+        except Exception as e:
+            logger.error(f"Precompute gagal untuk {ticker}: {e}")
+            summary[ticker] = f"error: {e}"
+    failed = [t for t, status in summary.items() if status != "ok"]
+    if failed:
+        raise PrecomputeError(failed, summary)
+    return summary
+
+
+market_scheduler = MarketCloseScheduler(precompute_forecasts, SCHEDULER_TICKERS)
+
+
+@app.on_event("startup")
+def start_market_scheduler():
+    if ENABLE_SCHEDULER:
+        market_scheduler.start()
+
+
+@app.on_event("shutdown")
+def stop_market_scheduler():
+    market_scheduler.stop()
+
+
+# Drift monitor per model (range histogram mengikuti scaler model, referensi dari histogram training)
+drift_monitors = {}
+# Bar terakhir yang sudah dicatat per (model, ticker): tiap bar masuk monitor sekali, bukan per request
+drift_last_bars = {}
+drift_lock = threading.Lock()
+
+def record_feature_drift(entry, tickers: list, bar_dates: list, rows: np.ndarray):
+    """Update drift monitor model dengan baris fitur (unscaled) bar yang belum pernah dicatat"""
+    try:
+        with drift_lock:
+            monitor = drift_monitors.get(entry.ticker)
+            if monitor is None or monitor.data_min.shape != np.shape(entry.scaler.data_min_) \
+                    or not np.allclose(monitor.data_min, entry.scaler.data_min_) \
+                    or not np.allclose(monitor.data_max, entry.scaler.data_max_):
+                # Model baru (scaler berganti): referensi dan bar yang tercatat ikut diganti
+                monitor = drift_monitors[entry.ticker] = FeatureDriftMonitor.from_scaler(
+                    entry.scaler, reference=entry.metadata.get("drift_reference")
+                )
+                drift_last_bars.pop(entry.ticker, None)
+            last_bars = drift_last_bars.setdefault(entry.ticker, {})
+            fresh = []
+            for k, (ticker, bar_date) in enumerate(zip(tickers, bar_dates)):
+                bar_date = pd.Timestamp(bar_date)
+                if bar_date.tzinfo is not None:
+                    bar_date = bar_date.tz_localize(None)   # buffer dan batch bisa beda timezone
+                if ticker not in last_bars or bar_date > last_bars[ticker]:
+                    last_bars[ticker] = bar_date
+                    fresh.append(k)
+        if not fresh:
+            return
+        rows = np.asarray(rows)[fresh]
+        monitor.update(rows)
+        if entry.ticker == TICKER_DEFAULT and DRIFT_SAVE_EVERY > 0 and monitor.count % DRIFT_SAVE_EVERY < len(rows):
+            monitor.save(DRIFT_STATE_FILE)
+    except Exception as e:
+        logger.warning(f"Gagal update drift monitor: {e}")
+
+
+def inverse_scale_close(scaler, values: np.ndarray) -> np.ndarray:
+    """Inverse scale nilai Close (kolom index 0) untuk satu atau banyak prediksi"""
+    dummy = np.zeros((len(values), len(FEATURE_COLS)))
+    dummy[:, 0] = values
+    return scaler.inverse_transform(dummy)[:, 0]
+
+
+def build_prediction_result(ticker: str, entry, current_close: float, predicted_close: float, last_date) -> dict:
+    """Susun response prediksi next-day untuk satu ticker"""
+    price_change = predicted_close - current_close
+    pct_change = (price_change / current_close) * 100 if current_close != 0 else 0
+    return {
+        "ticker": ticker,
+        "current_close": current_close,
+        "predicted_close": predicted_close,
+        "price_change": price_change,
+        "pct_change": pct_change,
+        "confidence": "Medium",
+        "model_ticker": entry.ticker,
+        "fallback_model": entry.ticker != ticker,
+        "timestamp": datetime.now().isoformat(),
+        "last_update": str(last_date.date())
+    }
+
+
+def fetch_stock_data_batch(tickers: list, period: str = "3mo") -> tuple:
+    """
+    Fetch beberapa ticker lewat market_cache: yang ada di cache (termasuk stale) langsung dipakai,
+    sisanya diambil dalam satu request upstream (yfinance: satu request untuk semua ticker)
+    Returns: (dict ticker -> DataFrame OHLCV, dict ticker -> pesan error)
+    """
+    frames, _, errors = market_cache.get_many(tickers, period)
+    return frames, errors
+
+
+def engineer_features_batch(ohlcv: np.ndarray) -> np.ndarray:
+    """
+    Versi vectorized dari engineer_features untuk banyak ticker sekaligus
+    Input: (N, L, 5) dengan kolom Open, High, Low, Close, Volume
+    Output: (N, L - 20, 9) dengan kolom sesuai FEATURE_COLS
+    """
+    opens, highs, lows, closes, volumes = (ohlcv[:, :, i] for i in range(5))
+    
+    windows7 = np.lib.stride_tricks.sliding_window_view(closes, 7, axis=1)
+    windows21 = np.lib.stride_tricks.sliding_window_view(closes, 21, axis=1)
+    
+    # Baris pertama yang semua fiturnya valid adalah index 20 (ma21)
+    start = 20
+    return1 = closes[:, start:] / closes[:, start - 1:-1] - 1
+    ma7 = windows7[:, start - 6:].mean(axis=2)
+    ma21 = windows21.mean(axis=2)
+    std7 = windows7[:, start - 6:].std(axis=2, ddof=1)
+    
+    return np.stack([
+        closes[:, start:], opens[:, start:], highs[:, start:], lows[:, start:], volumes[:, start:],
+        return1, ma7, ma21, std7
+    ], axis=2)
+
+
+def predict_batch(tickers: list) -> dict:
+    """
+    Prediksi next-day close untuk banyak ticker:
+    satu fetch untuk semua ticker, satu pass feature engineering + scaling,
+    dan satu forward pass per model
+    """
+    results, errors = {}, {}
+    
+    try:
+        frames, fetch_errors = fetch_stock_data_batch(tickers, period="6mo")
+    except Exception as e:
+        logger.error(f"Batch fetch error: {e}")
+        return {"results": results, "errors": {t: f"Fetch gagal: {e}" for t in tickers}}
+    
+    # Ambil SEQ_LEN + 20 bar terakhir per ticker agar bisa di-stack
+    rows_needed = SEQ_LEN + 20
+    valid, stacked, last_dates = [], [], []
+    for ticker in tickers:
+        df = frames.get(ticker)
+        if df is None:
+            errors[ticker] = fetch_errors.get(ticker, f"No data returned for {ticker}")
+            continue
+        df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+        if len(df) < rows_needed:
+            errors[ticker] = f"Insufficient data: {len(df)} < {rows_needed}"
+            continue
+        valid.append(ticker)
+        stacked.append(df.values[-rows_needed:].astype(float))
+        last_dates.append(df.index[-1])
+    
+    if not valid:
+        return {"results": results, "errors": errors}
+    
+    features = engineer_features_batch(np.stack(stacked))
+    
+    # Kelompokkan ticker per model agar tiap model cukup satu forward pass
+    groups = {}
+    for i, ticker in enumerate(valid):
+        try:
+            entry = registry.get(ticker)
+        except Exception as e:
+            errors[ticker] = f"Model tidak tersedia: {e}"
+            continue
+        groups.setdefault(entry.ticker, (entry, []))[1].append(i)
+    
+    for entry, idx in groups.values():
+        group_tickers = [valid[i] for i in idx]
+        try:
+            X = features[idx]
+            X_scaled = entry.scaler.transform(X.reshape(-1, len(FEATURE_COLS))).reshape(X.shape)
+            prediction_scaled = entry.model.predict(X_scaled, verbose=0)
+            predicted = inverse_scale_close(entry.scaler, prediction_scaled[:, 0])
+            record_feature_drift(entry, group_tickers, [last_dates[i] for i in idx], X[:, -1, :])
+            
+            for j, i in enumerate(idx):
+                current_close = float(features[i, -1, 0])
+                results[valid[i]] = {
+                    **build_prediction_result(valid[i], entry, current_close, float(predicted[j]), last_dates[i]),
+                    **market_cache.freshness(valid[i]),
+                }
+        except Exception as e:
+            logger.error(f"Batch prediction error untuk model {entry.ticker}: {e}")
+            for ticker in group_tickers:
+                errors[ticker] = str(e)
+    
+    logger.info(f"Batch prediction: {len(results)} sukses, {len(errors)} gagal")
+    return {"results": results, "errors": errors}
+
+
 @app.get("/")
 def root():
     return {
@@ -257,16 +628,36 @@ def root():
             "/docs - API Documentation (Swagger UI)",
             "/redoc - Alternative API Documentation",
             "/status - Model & API status (GET)",
+            "/drift - Feature drift of served bars vs training distribution (GET)",
             "/latest/{ticker} - Latest OHLCV + technical features (GET)",
             "/history/{ticker} - Historical data with features (GET)",
             "/predict - Predict with custom features (POST, needs auth)",
-            "/predict-next - Predict next day close from yfinance data (POST, needs auth)",
+            "/predict-next - Predict next day close from yfinance data, ?uncertainty=true for MC dropout intervals (POST, needs auth)",
+            "/predict-batch - Predict next day close for many tickers in one call (POST, needs auth)",
+            "/forecast/{ticker} - Recursive multi-day forecast, precomputed after market close (GET)",
             "/profile - User profile management (POST/GET, needs auth)",
-            "/notify - Send FCM notification (POST, needs auth)"
+            "/notify - Send FCM notification (POST, needs auth)",
+            "/admin/profiles - Request profiles, X-Profile: 1 to profile a request (GET, admin)",
+            "/memory - RSS, top allocators, cache sizes and per-request peaks (GET, admin)"
         ],
         "features_used": ["Close", "Open", "High", "Low", "Volume", "return1", "ma7", "ma21", "std7"]
     }
 
+prediction_store = None
+
+def get_accuracy_stats(ticker: str = TICKER_DEFAULT):
+    """Statistik akurasi incremental dari prediction store (None jika belum ada history)"""
+    global prediction_store
+    try:
+        if prediction_store is None:
+            if not os.path.exists(PREDICTIONS_DB):
+                return None
+            prediction_store = PredictionStore(PREDICTIONS_DB)
+        return prediction_store.running_stats(ticker)
+    except Exception as e:
+        logger.warning(f"Gagal membaca accuracy stats: {e}")
+        return None
+
 @app.get("/status")
 def get_status():
     """Status model dan informasi"""
@@ -275,9 +666,40 @@ def get_status():
         "ticker": "GGRM.JK",
         "metadata": metadata,
         "scaler_type": "MinMaxScaler",
-        "features": ["Close", "Open", "High", "Low", "Volume", "return1", "ma7", "ma21", "std7"]
+        "features": ["Close", "Open", "High", "Low", "Volume", "return1", "ma7", "ma21", "std7"],
+        "models": registry.report(),
+        "feature_buffers": feature_buffers.report(),
+        "scheduler": market_scheduler.report(),
+        "market_data": market_cache.report(),
+        "memory": {
+            "rss_mb": round(memory_monitor.rss() / 1024 / 1024, 1),
+            "budget_mb": round(memory_monitor.budget_bytes / 1024 / 1024, 1) if memory_monitor.budget_bytes else None,
+            "shed_events": memory_monitor.shed_events,
+        },
+        "accuracy": get_accuracy_stats(TICKER_DEFAULT),
+        "drift": {
+            ticker: {
+                "observations": m.count,
+                "drifted_features": report.get("drifted_features", []),
+                "out_of_range_features": report.get("out_of_range_features", []),
+            }
+            for ticker, m in list(drift_monitors.items())
+            for report in [m.report()]
+        }
     }
 
+@app.get("/drift")
+def get_feature_drift(ticker: str = TICKER_DEFAULT):
+    """
+    Drift fitur input yang dilayani dibanding range scaler model:
+    PSI/KS terhadap distribusi referensi, quantile, dan rate nilai di luar range
+    """
+    model_ticker = registry.resolve(ticker)
+    monitor = drift_monitors.get(model_ticker)
+    if monitor is None:
+        return {"ticker": ticker, "model_ticker": model_ticker, "observations": 0, "features": {}}
+    return {"ticker": ticker, "model_ticker": model_ticker, **monitor.report()}
+
 @app.post("/predict")
 def predict_stock(data: StockInput, current_user: dict = Depends(get_current_user)):
     """
@@ -326,13 +748,24 @@ def predict_stock(data: StockInput, current_user: dict = Depends(get_current_use
 
 
 @app.post("/predict-next")
-def predict_next(ticker: str = TICKER_DEFAULT, current_user: dict = Depends(get_current_user)):
+@profiled
+def predict_next(
+    ticker: str = TICKER_DEFAULT,
+    uncertainty: bool = False,
+    samples: int = MC_DEFAULT_SAMPLES,
+    latency_budget_ms: float = None,
+    current_user: dict = Depends(get_current_user)
+):
     """
     Prediksi harga Close hari berikutnya menggunakan data terbaru dari yfinance
     Menggunakan LSTM dengan sequence length 60 hari
+    uncertainty=true: interval prediksi MC dropout dengan `samples` pass (dikurangi otomatis
+    jika estimasi waktunya melebihi latency_budget_ms)
     """
+    if uncertainty and not 2 <= samples <= MC_MAX_SAMPLES:
+        raise HTTPException(status_code=400, detail=f"samples harus antara 2 dan {MC_MAX_SAMPLES}")
     try:
-        result = predict_next_close(ticker)
+        result = predict_next_close(ticker, samples if uncertainty else 0, latency_budget_ms)
         
         # Log ke Firestore jika ada user terautentikasi
         try:
@@ -356,14 +789,78 @@ def predict_next(ticker: str = TICKER_DEFAULT, current_user: dict = Depends(get_
         logger.error(f"Predict next error: {e}")
         return {"error": str(e), "status": "failed", "ticker": ticker}
 
+@app.post("/predict-batch")
+@profiled
+def predict_next_batch(data: BatchPredictInput, current_user: dict = Depends(get_current_user)):
+    """
+    Prediksi harga Close hari berikutnya untuk banyak ticker dalam satu request
+    Ticker yang gagal dilaporkan di "errors" tanpa menggagalkan ticker lain
+    """
+    # Hapus duplikat dengan tetap menjaga urutan
+    tickers = list(dict.fromkeys(str(t).strip().upper() for t in data.tickers if str(t).strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail="Daftar tickers kosong")
+    if len(tickers) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"Maksimal {MAX_BATCH_TICKERS} tickers per request")
+    
+    batch = predict_batch(tickers)
+    results, errors = batch["results"], batch["errors"]
+    
+    # Log ke Firestore jika ada user terautentikasi
+    try:
+        if firestore_client and current_user and results:
+            fs_batch = firestore_client.batch()
+            for ticker, result in results.items():
+                doc_ref = firestore_client.collection("predictions").document()
+                fs_batch.set(doc_ref, {
+                    "uid": current_user.get("uid"),
+                    "email": current_user.get("email"),
+                    "ticker": ticker,
+                    "current_close": result["current_close"],
+                    "predicted_close": result["predicted_close"],
+                    "price_change": result["price_change"],
+                    "pct_change": result["pct_change"],
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+            fs_batch.commit()
+    except Exception as e:
+        logger.warning(f"Gagal menyimpan log batch ke Firestore: {e}")
+    
+    return {
+        "requested": len(tickers),
+        "succeeded": len(results),
+        "failed": len(errors),
+        "results": [results[t] for t in tickers if t in results],
+        "errors": [{"ticker": t, "error": errors[t]} for t in tickers if t in errors],
+        "status": "success" if not errors else ("partial" if results else "failed"),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/forecast/{ticker}")
+@profiled
+def get_forecast(ticker: str = TICKER_DEFAULT, days: int = FORECAST_DAYS):
+    """
+    Forecast close beberapa hari bursa ke depan (recursive).
+    Setelah market tutup hasilnya sudah di-precompute oleh scheduler.
+    """
+    if days < 1 or days > MAX_FORECAST_DAYS:
+        raise HTTPException(status_code=400, detail=f"days harus antara 1 dan {MAX_FORECAST_DAYS}")
+    try:
+        return forecast_next_days(ticker, days)
+    except Exception as e:
+        logger.error(f"Forecast error: {e}")
+        return {"error": str(e), "status": "failed"}
+
+
 @app.get("/latest/{ticker}")
+@profiled
 def get_latest_data(ticker: str = TICKER_DEFAULT):
     """
     Ambil data GGRM terbaru dari Yahoo Finance dengan engineered features
     """
     try:
         logger.info(f"Fetching latest data untuk {ticker}...")
-        df = fetch_stock_data(ticker, period="3mo")
+        df, data_info = fetch_stock_data_with_info(ticker, period="3mo")
         df = engineer_features(df)
         
         if df.empty:
@@ -374,6 +871,8 @@ def get_latest_data(ticker: str = TICKER_DEFAULT):
         return {
             "ticker": ticker,
             "date": str(df.index[-1].date()),
+            "data_age_seconds": data_info["data_age_seconds"],
+            "stale": data_info["stale"],
             "ohlcv": {
                 "open": float(latest['Open']),
                 "high": float(latest['High']),
@@ -393,57 +892,184 @@ def get_latest_data(ticker: str = TICKER_DEFAULT):
         return {"error": str(e), "ticker": ticker}
 
 
+class HistoryIndex:
+    """Histori dengan fitur yang sudah di-engineer + array tanggal (ns, terurut) untuk binary search"""
+
+    def __init__(self, raw: pd.DataFrame, interval: str):
+        self.raw = raw
+        self.df = engineer_features(raw)
+        self.dates = self.df.index.values.astype("datetime64[ns]").view("i8")
+        self.intraday = interval.endswith(("m", "h"))
+
+    def bounds(self, start=None, end=None, after=None) -> tuple:
+        """[lo, hi) untuk start <= date <= end (end per hari, inklusif) dan date > after"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, pd.Timestamp(start).value, side="left"))
+        if after is not None:
+            lo = max(lo, int(np.searchsorted(self.dates, after, side="right")))
+        hi = len(self.dates) if end is None else int(np.searchsorted(
+            self.dates, (pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).value, side="left"))
+        return lo, max(lo, hi)
+
+    def rows(self, lo: int, hi: int) -> list:
+        """Susun baris response untuk slice [lo, hi) tanpa iterrows"""
+        page = self.df.iloc[lo:hi]
+        labels = page.index.strftime("%Y-%m-%d %H:%M" if self.intraday else "%Y-%m-%d")
+        values = page[['Open', 'High', 'Low', 'Close', 'Volume', 'return1', 'ma7', 'ma21', 'std7']].to_numpy(dtype=float).tolist()
+        return [
+            {
+                "date": label,
+                "ohlcv": {"open": o, "high": h, "low": l, "close": c, "volume": v},
+                "technical_features": {"return1": r, "ma7": m7, "ma21": m21, "std7": s7}
+            }
+            for label, (o, h, l, c, v, r, m7, m21, s7) in zip(labels, values)
+        ]
+
+
+history_indexes = OrderedDict()
+history_indexes_lock = threading.Lock()
+
+def get_history_index(ticker: str, period: str, interval: str) -> tuple:
+    """Index histori per (ticker, period, interval), dibangun ulang hanya jika data cache berganti"""
+    raw, data_info = fetch_stock_data_with_info(ticker, period, interval)
+    key = (ticker, period, interval)
+    with history_indexes_lock:
+        index = history_indexes.get(key)
+    if index is None or index.raw is not raw:
+        # Dibangun di luar lock; request bersamaan paling buruk membangun index yang sama dua kali
+        index = HistoryIndex(raw, interval)
+    with history_indexes_lock:
+        history_indexes[key] = index
+        history_indexes.move_to_end(key)
+        while len(history_indexes) > HISTORY_INDEX_MAX_ENTRIES:
+            history_indexes.popitem(last=False)
+    return index, data_info
+
+
+def locked_values(mapping, lock) -> list:
+    with lock:
+        return list(mapping.values())
+
+
+# Urutan registrasi = urutan shedding: cache turunan yang murah dibangun ulang lebih dulu
+memory_monitor.register(
+    "history_indexes",
+    lambda: {"entries": len(history_indexes),
+             "bytes": estimate_nbytes([index.df for index in locked_values(history_indexes, history_indexes_lock)])},
+    lambda fraction: shed_mapping(history_indexes, fraction, history_indexes_lock),
+)
+memory_monitor.register(
+    "forecast_cache",
+    lambda: {"entries": len(forecast_cache),
+             "bytes": estimate_nbytes(locked_values(forecast_cache, forecast_cache_lock))},
+    lambda fraction: shed_mapping(forecast_cache, fraction, forecast_cache_lock),
+)
+memory_monitor.register("market_data", market_cache.memory_usage, market_cache.shed)
+memory_monitor.register("feature_buffers", feature_buffers.memory_usage, feature_buffers.shed)
+memory_monitor.register(
+    "models",
+    lambda: {"entries": registry.report()["resident_models"], "bytes": registry.total_bytes()},
+    registry.shed,
+)
+
+
+def encode_history_cursor(date_ns: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": int(date_ns)}).encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))["after"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor tidak valid")
+
+
 @app.get("/history/{ticker}")
+@profiled
 def get_stock_history(
     ticker: str = TICKER_DEFAULT, 
-    period: str = "1mo", 
-    interval: str = "1d"
+    period: str = None, 
+    interval: str = "1d",
+    start: str = None,
+    end: str = None,
+    page_size: int = None,
+    cursor: str = None
 ):
     """
-    Ambil histori harga saham dari Yahoo Finance dengan engineered features
+    Ambil histori harga saham dengan engineered features
     Contoh: /history/GGRM.JK?period=1y&interval=1d
     Period: 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max
+    Range: /history/GGRM.JK?start=2023-01-01&end=2023-06-30 (period default max jika start/end diisi)
+    Pagination: page_size=N, lalu kirim next_cursor dari response sebagai cursor untuk halaman berikutnya
     """
+    if page_size is not None and not 1 <= page_size <= HISTORY_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size harus antara 1 dan {HISTORY_MAX_PAGE_SIZE}")
     try:
-        logger.info(f"Fetching history untuk {ticker}, period={period}...")
-        df = yf.download(ticker, period=period, interval=interval, progress=False)
-        
-        if df.empty:
-            return {"error": f"No data found for {ticker}", "ticker": ticker}
-        
-        # Engineer features
-        df = engineer_features(df)
+        start_ts = pd.Timestamp(start) if start else None
+        end_ts = pd.Timestamp(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end harus berformat YYYY-MM-DD")
+    after = decode_history_cursor(cursor) if cursor else None
+    period = period or ("max" if start or end else "1mo")
+    
+    try:
+        logger.info(f"Fetching history untuk {ticker}, period={period}, start={start}, end={end}...")
+        index, data_info = get_history_index(ticker, period, interval)
         
-        history = []
-        for idx, row in df.iterrows():
-            history.append({
-                "date": str(idx.date()),
-                "ohlcv": {
-                    "open": float(row["Open"]),
-                    "high": float(row["High"]),
-                    "low": float(row["Low"]),
-                    "close": float(row["Close"]),
-                    "volume": float(row["Volume"])
-                },
-                "technical_features": {
-                    "return1": float(row["return1"]),
-                    "ma7": float(row["ma7"]),
-                    "ma21": float(row["ma21"]),
-                    "std7": float(row["std7"])
-                }
-            })
+        # Binary search pada tanggal terurut; hanya baris halaman yang dibangun
+        lo, hi = index.bounds(start_ts, end_ts, after)
+        page_end = hi if page_size is None else min(hi, lo + page_size)
+        history = index.rows(lo, page_end)
+        next_cursor = encode_history_cursor(index.dates[page_end - 1]) if page_end < hi else None
         
         return {
             "ticker": ticker,
             "period": period,
             "interval": interval,
+            "start": start,
+            "end": end,
             "data_points": len(history),
+            "remaining_in_range": hi - lo,
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "data_age_seconds": data_info["data_age_seconds"],
+            "stale": data_info["stale"],
             "history": history
         }
     except Exception as e:
         logger.error(f"Error fetching history: {e}")
         return {"error": str(e), "ticker": ticker}
 
+@app.get("/memory")
+def get_memory(top: int = 15, current_user: dict = Depends(get_current_user)):
+    """
+    Footprint memori worker (admin): RSS, top alokasi per modul (MEMORY_TRACEMALLOC=1),
+    ukuran model/cache resident dan peak alokasi per endpoint
+    """
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Hanya untuk admin")
+    return memory_monitor.report(top=max(1, min(top, 100)))
+
+
+@app.get("/admin/profiles")
+def get_profiles(current_user: dict = Depends(get_current_user)):
+    """Daftar hasil profiling request (admin)"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Hanya untuk admin")
+    return {"profiles": list_profiles()}
+
+
+@app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_profile_stacks(profile_id: str, current_user: dict = Depends(get_current_user)):
+    """Folded stacks satu profile (input untuk flamegraph.pl / speedscope)"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Hanya untuk admin")
+    try:
+        return read_profile(profile_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile tidak ditemukan")
+
+
 @app.post("/profile")
 def create_or_update_profile(profile: UserProfile, current_user: dict = Depends(get_current_user)):
     """
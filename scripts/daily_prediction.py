@@ -7,12 +7,16 @@ import numpy as np
 import pandas as pd
 import tensorflow as tf
 import joblib
-import yfinance as yf
 import json
 import logging
+import argparse
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from prediction_store import PredictionStore, PREDICTIONS_DB
+from market_data import fetch_history
+from market_scheduler import market_now, POST_CLOSE_RUN
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,32 +26,40 @@ logger = logging.getLogger(__name__)
 
 TICKER = "GGRM.JK"
 SEQ_LEN = 60
-PREDICTIONS_FILE = "ggrm_predictions_history.json"
+PREDICTIONS_FILE = "ggrm_predictions_history.json"  # format lama, dimigrasi ke PREDICTIONS_DB
+STATS_WINDOW = 90
 
 def load_resources():
-    """Load model, scaler, dan predictions history"""
+    """Load model, scaler, dan predictions store"""
     try:
         model = tf.keras.models.load_model("stock_model.keras", compile=False)
         scaler = joblib.load("scaler_ggrm.pkl")
         
-        if Path(PREDICTIONS_FILE).exists():
-            with open(PREDICTIONS_FILE, 'r') as f:
-                history = json.load(f)
-        else:
-            history = {"predictions": []}
+        store = PredictionStore(PREDICTIONS_DB)
+        store.import_json(PREDICTIONS_FILE, ticker=TICKER)
         
-        return model, scaler, history
+        return model, scaler, store
         
     except Exception as e:
         logger.error(f"Error loading resources: {e}")
         raise
 
+def get_model_version(metadata_path="model_metadata.json"):
+    """Versi model = trained_date di metadata (dipakai untuk statistik akurasi per versi)"""
+    try:
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        return metadata.get("trained_date") or metadata.get("trained_at") or "unknown"
+    except Exception:
+        return "unknown"
+
 def get_daily_prediction(model, scaler):
     """Get prediction untuk harga GGRM besok"""
     logger.info(f"Getting prediction untuk {TICKER}...")
     
     # Fetch data
-    df = yf.download(TICKER, period="3mo", interval="1d", progress=False)
+    # 6mo: 3mo (~62 bar) tidak cukup untuk SEQ_LEN + warm-up ma21
+    df = fetch_history(TICKER, period="6mo")
     df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
     
     # Features
@@ -78,89 +90,121 @@ def get_daily_prediction(model, scaler):
     change_pct = (change / current_price) * 100
     
     prediction_data = {
+        "ticker": TICKER,
         "date": str(datetime.now().date()),
+        "base_date": str(df.index[-1].date()),
         "prediction_time": datetime.now().isoformat(),
         "current_price": float(current_price),
         "predicted_price": float(predicted_price),
         "change": float(change),
         "change_percent": float(change_pct),
         "direction": "UP" if change > 0 else "DOWN",
-        "confidence": "MEDIUM"
+        "confidence": "MEDIUM",
+        "model_version": get_model_version()
     }
     
     return prediction_data
 
-def update_history(new_prediction, history):
-    """Update prediction history dengan actual price saat tersedia"""
-    predictions = history.get("predictions", [])
+def backfill_actuals(store, ticker=None):
+    """
+    Isi actual price untuk SEMUA prediksi yang belum resolved
+    (termasuk yang terlewat karena weekend, libur bursa atau run yang gagal).
+    Satu download per ticker untuk range yang mencakup semua prediksi pending,
+    lalu join ke trading date secara vectorized.
+    """
+    pending = store.pending(ticker)
+    if not pending:
+        return 0
     
-    # Check if yesterday's prediction exists dan update dengan actual price
-    if len(predictions) > 0:
-        yesterday_pred = predictions[-1]
-        yesterday_date = datetime.fromisoformat(yesterday_pred["date"])
-        
-        # Fetch actual price yesterday
-        actual_date = (datetime.now() - timedelta(days=1)).date()
+    by_ticker = {}
+    for p in pending:
+        by_ticker.setdefault(p["ticker"], []).append(p)
+    
+    # Bar hari ini baru final setelah market tutup; sebelum itu Close masih harga intraday
+    now = market_now()
+    end = np.datetime64(now.date()) + np.timedelta64(1 if now.time() >= POST_CLOSE_RUN else 0, "D")
+    
+    resolved_total = 0
+    for t, preds in by_ticker.items():
+        # Bar dasar prediksi: base_date (bar terakhir yang dipakai model) atau tanggal run
+        base_dates = np.array([p.get("base_date") or p["date"] for p in preds], dtype="datetime64[D]")
+        start = base_dates.min()
+        if start >= end:
+            continue
         
         try:
-            df = yf.download(TICKER, start=actual_date, end=actual_date + timedelta(days=1), 
-                           progress=False, interval="1d")
-            if not df.empty:
-                actual_price = df['Close'].iloc[0]
-                actual_change = actual_price - yesterday_pred["current_price"]
-                actual_change_pct = (actual_change / yesterday_pred["current_price"]) * 100
-                actual_direction = "UP" if actual_change > 0 else "DOWN"
-                
-                # Update prediction dengan actual values
-                yesterday_pred["actual_price"] = float(actual_price)
-                yesterday_pred["actual_change"] = float(actual_change)
-                yesterday_pred["actual_change_percent"] = float(actual_change_pct)
-                yesterday_pred["actual_direction"] = actual_direction
-                
-                # Check accuracy
-                predicted_direction = yesterday_pred["direction"]
-                accuracy = predicted_direction == actual_direction
-                yesterday_pred["direction_accuracy"] = accuracy
-                
-                predictions[-1] = yesterday_pred
+            df = fetch_history(t, start=str(start), end=str(end))
         except Exception as e:
-            logger.warning(f"Could not update yesterday's prediction: {e}")
-    
-    # Add new prediction
-    predictions.append(new_prediction)
-    
-    # Keep only last 90 days
-    if len(predictions) > 90:
-        predictions = predictions[-90:]
+            logger.warning(f"Backfill {t} gagal: {e}")
+            continue
+        if df.empty:
+            continue
+        
+        index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+        trade_dates = index.values.astype("datetime64[D]")
+        closes = np.asarray(df["Close"], dtype=float).reshape(-1)
+        # Provider (mis. cache) bisa tetap mengembalikan bar yang belum final
+        final = trade_dates < end
+        trade_dates, closes = trade_dates[final], closes[final]
+        
+        # Actual = close di trading day pertama setelah bar dasar
+        idx = np.searchsorted(trade_dates, base_dates, side="right")
+        valid = idx < len(trade_dates)
+        if not valid.any():
+            continue
+        
+        actual = closes[idx[valid]]
+        current = np.array([p["current_price"] for p in preds], dtype=float)[valid]
+        predicted_direction = np.array([p["direction"] for p in preds])[valid]
+        change = actual - current
+        change_pct = change / current * 100
+        actual_direction = np.where(change > 0, "UP", "DOWN")
+        hits = predicted_direction == actual_direction
+        
+        valid_preds = [p for p, ok in zip(preds, valid) if ok]
+        rows = [{
+            "ticker": t,
+            "date": p["date"],
+            "actual_price": float(actual[i]),
+            "actual_change": float(change[i]),
+            "actual_change_percent": float(change_pct[i]),
+            "actual_direction": str(actual_direction[i]),
+            "direction_accuracy": bool(hits[i])
+        } for i, p in enumerate(valid_preds)]
+        
+        resolved = store.resolve_many(rows)
+        resolved_total += resolved
+        logger.info(f"Backfill {t}: {resolved}/{len(preds)} prediksi pending di-resolve")
     
-    return {"predictions": predictions}
+    return resolved_total
 
-def calculate_accuracy_stats(history):
-    """Calculate accuracy statistics"""
-    predictions = history.get("predictions", [])
-    
-    # Filter predictions dengan actual prices
-    completed = [p for p in predictions if "actual_price" in p]
+def update_history(new_prediction, store):
+    """Resolve semua prediksi pending dengan actual price, lalu append prediksi baru"""
+    backfill_actuals(store, TICKER)
     
-    if not completed:
+    # Add new prediction (append-only, history lengkap disimpan)
+    store.append(new_prediction, ticker=TICKER)
+    return store
+
+def calculate_accuracy_stats(store, ticker=TICKER, window=STATS_WINDOW):
+    """Accuracy statistics dari agregat yang di-maintain incremental (tanpa scan history)"""
+    running = store.running_stats(ticker)
+    if not running:
         return None
     
-    direction_correct = sum([p["direction_accuracy"] for p in completed])
-    direction_accuracy = (direction_correct / len(completed)) * 100
-    
-    # MAPE
-    mape_values = []
-    for p in completed:
-        mape = abs((p["actual_price"] - p["predicted_price"]) / p["actual_price"]) * 100
-        mape_values.append(mape)
-    
-    avg_mape = np.mean(mape_values)
-    
+    # Window rolling (default 90 prediksi terakhir), fallback ke agregat all-time
+    recent = running["windows"].get(str(window)) or {
+        "predictions": running["total_predictions"],
+        "direction_accuracy": running["direction_accuracy"],
+        "avg_mape": running["avg_mape"]
+    }
     return {
-        "total_predictions": len(completed),
-        "direction_accuracy": float(direction_accuracy),
-        "avg_mape": float(avg_mape),
-        "last_updated": datetime.now().isoformat()
+        "total_predictions": recent["predictions"],
+        "direction_accuracy": float(recent["direction_accuracy"]),
+        "avg_mape": float(recent["avg_mape"]),
+        "all_time": {k: running[k] for k in ("total_predictions", "direction_accuracy", "avg_mape")},
+        "windows": running["windows"],
+        "last_updated": running["last_updated"]
     }
 
 def print_report(prediction, stats):
@@ -182,27 +226,34 @@ def print_report(prediction, stats):
     
     print("\n" + "=" * 60)
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Daily prediction GGRM")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Hanya isi actual price untuk semua prediksi pending (semua ticker)")
+    args = parser.parse_args(argv)
+    
     try:
+        if args.backfill:
+            store = PredictionStore(PREDICTIONS_DB)
+            resolved = backfill_actuals(store)
+            logger.info(f"✅ Backfill selesai: {resolved} prediksi di-resolve")
+            return 0
+        
         logger.info("Starting daily prediction...")
         
         # Load resources
-        model, scaler, history = load_resources()
+        model, scaler, store = load_resources()
         
         # Get prediction
         prediction = get_daily_prediction(model, scaler)
         
         # Update history
-        history = update_history(prediction, history)
-        
-        # Save history
-        with open(PREDICTIONS_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
+        update_history(prediction, store)
         
-        logger.info(f"Prediction saved to {PREDICTIONS_FILE}")
+        logger.info(f"Prediction saved to {PREDICTIONS_DB}")
         
         # Calculate stats
-        stats = calculate_accuracy_stats(history)
+        stats = calculate_accuracy_stats(store)
         
         # Print report
         print_report(prediction, stats)
@@ -0,0 +1,314 @@
+"""
+Snapshot dataset ter-versi di disk untuk semua script training/validasi
+Satu kali build: bar OHLCV mentah, fitur teknikal, scaler yang di-fit, fitur ter-scale,
+target dan index window disimpan sebagai .npy sehingga bisa di-memory-map (zero-copy)
+Layout: DATASET_DIR/<kode>_<period>_<tanggal terakhir>_<hash>/
+    manifest.json, scaler.pkl, bar_dates.npy, bars.npy, dates.npy, features.npy,
+    scaled.npy, next_close.npy, next_close_scaled.npy, windows.npy
+Usage:
+    python dataset_snapshot.py --ticker GGRM.JK --period 5y      # build, cetak path snapshot
+    python dataset_snapshot.py --list
+Script training memakai --snapshot <path|kode ticker> atau env DATASET_SNAPSHOT
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("dataset_snapshot")
+
+DATASET_DIR = os.getenv("DATASET_DIR", "datasets")
+DATASET_SNAPSHOT = os.getenv("DATASET_SNAPSHOT", "")
+SNAPSHOT_FORMAT_VERSION = 1
+OHLCV = ['Open', 'High', 'Low', 'Close', 'Volume']
+FEATURES = ['Close', 'Open', 'High', 'Low', 'Volume', 'return1', 'ma7', 'ma21', 'std7']
+SEQ_LEN = 60
+HORIZON = 1
+
+
+def add_technical_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Fitur teknikal yang sama dengan pipeline training (return1, ma7, ma21, std7)"""
+    df = df[OHLCV].dropna()
+    df['return1'] = df['Close'].pct_change(1)
+    df['ma7'] = df['Close'].rolling(7).mean()
+    df['ma21'] = df['Close'].rolling(21).mean()
+    df['std7'] = df['Close'].rolling(7).std()
+    return df.dropna()
+
+
+def _dates_ns(index: pd.DatetimeIndex) -> np.ndarray:
+    """DatetimeIndex -> int64 ns UTC (timezone disimpan terpisah di manifest)"""
+    index = index.tz_convert("UTC").tz_localize(None) if index.tz is not None else index
+    return index.values.astype("datetime64[ns]").view("i8")
+
+
+def latest_pointer(root: str, ticker: str) -> str:
+    from model_registry import ticker_code
+    return os.path.join(root, f"LATEST_{ticker_code(ticker)}")
+
+
+def build_snapshot(ticker: str = "GGRM.JK", period: str = "5y", root: str = DATASET_DIR,
+                   seq_len: int = SEQ_LEN, horizon: int = HORIZON, df: pd.DataFrame = None) -> str:
+    """
+    Download (atau pakai df), engineer fitur, fit MinMaxScaler, lalu tulis snapshot.
+    Versi = hash isi bar + parameter, jadi data yang sama menghasilkan snapshot yang sama.
+    Returns: path direktori snapshot
+    """
+    import joblib
+    from sklearn.preprocessing import MinMaxScaler
+    from market_data import fetch_history
+    from model_registry import ticker_code
+
+    if df is None:
+        logger.info(f"Download {ticker} ({period}) untuk snapshot...")
+        df = fetch_history(ticker, period)
+    bars_df = df[OHLCV].dropna()
+    feat_df = add_technical_features(bars_df)
+    if len(feat_df) <= seq_len + horizon:
+        raise ValueError(f"Data {ticker} tidak cukup untuk snapshot: {len(feat_df)} baris")
+
+    bars = bars_df.values.astype(np.float64)
+    bar_dates = _dates_ns(bars_df.index)
+    features = feat_df[FEATURES].values.astype(np.float64)
+    dates = _dates_ns(feat_df.index)
+
+    scaler = MinMaxScaler()
+    scaled = scaler.fit_transform(features).astype(np.float32)
+
+    # Target untuk window yang berakhir di baris i (input baris [i - seq_len, i)): Close di baris i + horizon
+    closes = features[:, 0]
+    next_close = np.full(len(features), np.nan)
+    next_close[:-horizon] = closes[horizon:]
+    next_close_scaled = np.full(len(features), np.nan, dtype=np.float32)
+    next_close_scaled[:-horizon] = scaled[horizon:, 0]
+    windows = np.arange(seq_len, len(features) - horizon, dtype=np.int64)
+
+    digest = hashlib.sha1()
+    digest.update(bars.tobytes())
+    digest.update(bar_dates.tobytes())
+    digest.update(json.dumps([ticker, period, seq_len, horizon, FEATURES, SNAPSHOT_FORMAT_VERSION]).encode())
+    version = digest.hexdigest()[:12]
+    last_date = pd.Timestamp(dates[-1]).strftime("%Y%m%d")
+    name = f"{ticker_code(ticker)}_{period}_{last_date}_{version}"
+    path = os.path.join(root, name)
+
+    os.makedirs(root, exist_ok=True)
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        logger.info(f"Snapshot {name} sudah ada (data sama), dipakai ulang")
+    else:
+        # Tulis ke direktori sementara lalu rename supaya snapshot tidak pernah setengah jadi
+        tmp = tempfile.mkdtemp(prefix=f".{name}_", dir=root)
+        os.chmod(tmp, 0o755)
+        arrays = {
+            "bar_dates": bar_dates, "bars": bars, "dates": dates, "features": features, "scaled": scaled,
+            "next_close": next_close, "next_close_scaled": next_close_scaled, "windows": windows,
+        }
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp, f"{key}.npy"), array)
+        joblib.dump(scaler, os.path.join(tmp, "scaler.pkl"))
+
+        tz = getattr(bars_df.index, "tz", None)
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "version": version,
+            "name": name,
+            "ticker": ticker,
+            "period": period,
+            "created_at": datetime.now().isoformat(),
+            "timezone": str(tz) if tz is not None else None,
+            "first_date": str(feat_df.index[0].date()),
+            "last_date": str(feat_df.index[-1].date()),
+            "bars": int(len(bars)),
+            "rows": int(len(features)),
+            "features": FEATURES,
+            "seq_len": seq_len,
+            "horizon": horizon,
+            "n_windows": int(len(windows)),
+            "arrays": {key: {"shape": list(a.shape), "dtype": str(a.dtype)} for key, a in arrays.items()},
+        }
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # Build paralel lain sudah menulis snapshot yang sama
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, "manifest.json")):
+                raise
+        logger.info(f"✅ Snapshot {name}: {len(features)} baris, {len(windows)} window → {path}")
+
+    with open(latest_pointer(root, ticker), "w") as f:
+        f.write(name)
+    return path
+
+
+def resolve_snapshot(ref: str, root: str = DATASET_DIR) -> str:
+    """Path direktori snapshot, nama snapshot di DATASET_DIR, atau ticker (snapshot terbaru)"""
+    for candidate in (ref, os.path.join(root, ref)):
+        if os.path.exists(os.path.join(candidate, "manifest.json")):
+            return candidate
+    pointer = latest_pointer(root, ref)
+    if os.path.exists(pointer):
+        with open(pointer, "r") as f:
+            return os.path.join(root, f.read().strip())
+    raise FileNotFoundError(f"Snapshot tidak ditemukan: {ref} (jalankan dataset_snapshot.py dulu)")
+
+
+class DatasetSnapshot:
+    """
+    Snapshot yang di-memory-map: array dibaca dari page cache saat diakses,
+    sehingga beberapa proses (training, validasi, worker backtest) berbagi satu salinan
+    """
+
+    def __init__(self, path: str, mmap_mode: str = "r"):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r") as f:
+            self.manifest = json.load(f)
+        for key in self.manifest["arrays"]:
+            setattr(self, key, np.load(os.path.join(path, f"{key}.npy"), mmap_mode=mmap_mode))
+        self._scaler = None
+
+    @property
+    def ticker(self) -> str:
+        return self.manifest["ticker"]
+
+    @property
+    def seq_len(self) -> int:
+        return self.manifest["seq_len"]
+
+    @property
+    def horizon(self) -> int:
+        return self.manifest["horizon"]
+
+    @property
+    def scaler(self):
+        if self._scaler is None:
+            import joblib
+            self._scaler = joblib.load(os.path.join(self.path, "scaler.pkl"))
+        return self._scaler
+
+    def _index(self, dates_ns) -> pd.DatetimeIndex:
+        index = pd.DatetimeIndex(np.asarray(dates_ns).view("datetime64[ns]"))
+        tz = self.manifest.get("timezone")
+        return index.tz_localize("UTC").tz_convert(tz) if tz else index
+
+    def feature_index(self) -> pd.DatetimeIndex:
+        return self._index(self.dates)
+
+    def bar_index(self) -> pd.DatetimeIndex:
+        return self._index(self.bar_dates)
+
+    def period_start(self, period: str):
+        """
+        Awal period relatif ke bar terakhir snapshot (None untuk max);
+        ValueError jika bar snapshot tidak mencakup period tersebut
+        """
+        from market_data import period_start
+        index = self.bar_index()
+        start = period_start(period, index[-1])
+        if start is None:
+            return None
+        if index.tz is not None and start.tz is None:
+            start = start.tz_localize(index.tz)
+        # Bar pertama jatuh di hari bursa pertama setelah start (akhir pekan/libur panjang)
+        if index[0] > start + pd.Timedelta(days=7):
+            raise ValueError(f"Snapshot {self.manifest['name']} mulai {index[0].date()}, tidak mencakup "
+                             f"period {period} (sejak {start.date()}); build snapshot dengan period lebih panjang")
+        return start
+
+    def frame(self, period: str = None, start=None) -> pd.DataFrame:
+        """
+        Bar OHLCV sebagai DataFrame (salinan kecil), opsional hanya period terakhir
+        relatif ke bar terakhir snapshot atau sejak tanggal start
+        """
+        from market_data import period_start
+        index = self._index(self.bar_dates)
+        if period:
+            start = period_start(period, index[-1])
+        elif start is not None:
+            start = pd.Timestamp(start)
+            if index.tz is not None and start.tz is None:
+                start = start.tz_localize(index.tz)
+        lo = int(index.searchsorted(start)) if start is not None else 0
+        return pd.DataFrame(np.asarray(self.bars[lo:]), index=index[lo:], columns=OHLCV)
+
+    def uses_scaler(self, scaler) -> bool:
+        """True jika scaler identik dengan scaler snapshot (scaled.npy bisa dipakai langsung)"""
+        ref = self.scaler
+        return (getattr(scaler, "n_features_in_", None) == ref.n_features_in_
+                and np.allclose(scaler.data_min_, ref.data_min_) and np.allclose(scaler.data_max_, ref.data_max_))
+
+    def check_seq_len(self, seq_len: int):
+        if seq_len != self.seq_len:
+            raise ValueError(f"Snapshot {self.manifest['name']} dibangun untuk seq_len={self.seq_len}, "
+                             f"bukan {seq_len}; build ulang dengan --seq-len {seq_len}")
+
+    def split(self, train_ratio: float = 0.8) -> tuple:
+        """(start, train_end, end) untuk make_window_dataset: window train [start, train_end), test [train_end, end)"""
+        n_train = int(len(self.windows) * train_ratio)
+        start, end = int(self.windows[0]), int(self.windows[-1]) + 1
+        return start, start + n_train, end
+
+
+def load_snapshot(ref: str = None, root: str = DATASET_DIR) -> DatasetSnapshot:
+    """Memory-map snapshot (ref default dari env DATASET_SNAPSHOT)"""
+    ref = ref or DATASET_SNAPSHOT
+    if not ref:
+        raise ValueError("Snapshot tidak diset (--snapshot atau DATASET_SNAPSHOT)")
+    snapshot = DatasetSnapshot(resolve_snapshot(ref, root))
+    logger.info(f"Snapshot {snapshot.manifest['name']} dimuat (memory-map): "
+                f"{snapshot.manifest['rows']} baris, {snapshot.manifest['first_date']} → "
+                f"{snapshot.manifest['last_date']}")
+    return snapshot
+
+
+def list_snapshots(root: str = DATASET_DIR) -> list:
+    if not os.path.isdir(root):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name, "manifest.json")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build snapshot dataset ter-versi untuk training")
+    parser.add_argument("--ticker", nargs="+", default=["GGRM.JK"])
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--seq-len", type=int, default=SEQ_LEN)
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    parser.add_argument("--root", default=DATASET_DIR)
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.list:
+        for m in list_snapshots(args.root):
+            print(f"{m['name']}  {m['ticker']}  {m['first_date']} → {m['last_date']}  "
+                  f"{m['rows']} baris, seq_len {m['seq_len']}")
+        return 0
+
+    failed = 0
+    for ticker in args.ticker:
+        try:
+            print(build_snapshot(ticker, args.period, args.root, args.seq_len, args.horizon))
+        except Exception as e:
+            logger.error(f"❌ Snapshot {ticker} gagal: {e}")
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
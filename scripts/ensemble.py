@@ -0,0 +1,158 @@
+"""
+Ensemble beberapa versi model yang dievaluasi paralel pada input yang sama
+Member dijalankan bersamaan di thread pool (TensorFlow dan BLAS melepas GIL),
+lalu digabung dengan rata-rata berbobot; spread antar member ikut dilaporkan
+Konfigurasi: ENSEMBLE_MODELS="models/stock_model.keras:0.6,models/v2.keras:0.4:models/scaler_v2.pkl"
+Member dengan scaler sendiri menerima input yang di-scale ulang dari scaler model default,
+dan outputnya dikembalikan ke skala scaler default sebelum digabung
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger("ensemble")
+
+def _as_weight(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_ensemble_spec(spec: str) -> list:
+    """'path[:weight[:scaler]],...' -> [(path, weight, scaler_path atau None)]"""
+    members = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        parts = item.split(":")
+        if len(parts) >= 2 and _as_weight(parts[-1]) is not None:
+            members.append((":".join(parts[:-1]), _as_weight(parts[-1]), None))
+        elif len(parts) >= 3 and _as_weight(parts[-2]) is not None:
+            members.append((":".join(parts[:-2]), _as_weight(parts[-2]), parts[-1]))
+        else:
+            members.append((item, 1.0, None))
+    return members
+
+
+def _rescale_maps(base_scaler, scaler):
+    """
+    Affine map MinMaxScaler per member: input skala base -> skala member (per fitur),
+    output Close skala member -> skala base. None jika scaler sama (tanpa konversi)
+    """
+    if scaler is None or base_scaler is None or scaler is base_scaler:
+        return None
+    for s in (base_scaler, scaler):
+        if not (hasattr(s, "scale_") and hasattr(s, "min_")):
+            raise ValueError(f"{type(s).__name__} bukan MinMaxScaler yang sudah di-fit")
+    if np.shape(scaler.scale_) != np.shape(base_scaler.scale_):
+        raise ValueError(f"Jumlah fitur scaler {np.shape(scaler.scale_)} != {np.shape(base_scaler.scale_)}")
+    if np.allclose(scaler.scale_, base_scaler.scale_) and np.allclose(scaler.min_, base_scaler.min_):
+        return None
+    # raw = (x - min_) / scale_  =>  x_member = x_base * in_a + in_b
+    in_a = (scaler.scale_ / base_scaler.scale_).astype(np.float32)
+    in_b = (scaler.min_ - base_scaler.min_ * in_a).astype(np.float32)
+    out_a = base_scaler.scale_[0] / scaler.scale_[0]
+    out_b = base_scaler.min_[0] - scaler.min_[0] * out_a
+    return in_a, in_b, np.float32(out_a), np.float32(out_b)
+
+
+def _input_shape(model):
+    shape = getattr(model, "input_shape", None)
+    return tuple(shape[1:]) if shape is not None else None
+
+
+def _forward(model, X, rescale=None):
+    """Forward pass satu member; model Keras dipanggil langsung (lebih ringan dari predict untuk batch kecil)"""
+    if rescale is not None:
+        X = X * rescale[0] + rescale[1]
+    if hasattr(model, "predict_on_batch"):
+        out = np.asarray(model(X, training=False), dtype=np.float32)
+    else:
+        out = np.asarray(model.predict(X, verbose=0), dtype=np.float32)
+    return out if rescale is None else out * rescale[2] + rescale[3]
+
+
+class EnsembleModel:
+    """
+    Kumpulan member (name, model, weight[, scaler]) dengan input shape yang sama.
+    Input dan output dalam skala base_scaler (scaler model default); member dengan scaler lain
+    dikonversi di _forward. predict() mengembalikan rata-rata berbobot sehingga bisa dipakai
+    di mana pun model tunggal dipakai.
+    """
+
+    def __init__(self, members: list, max_workers: int = None, base_scaler=None):
+        if not members:
+            raise ValueError("Ensemble membutuhkan minimal satu member")
+        reference = _input_shape(members[0][1])
+        kept, rescales = [], []
+        for name, model, weight, *scaler in members:
+            shape = _input_shape(model)
+            if reference is not None and shape is not None and shape != reference:
+                logger.warning(f"Member {name} di-skip: input shape {shape} != {reference}")
+                continue
+            try:
+                rescale = _rescale_maps(base_scaler, scaler[0] if scaler else None)
+            except ValueError as e:
+                logger.warning(f"Member {name} di-skip: scaler tidak cocok ({e})")
+                continue
+            kept.append((name, model, float(weight)))
+            rescales.append(rescale)
+        if not kept:
+            raise ValueError("Tidak ada member ensemble yang cocok dengan model default")
+
+        self.members = kept
+        self.rescales = rescales
+        self.names = [name for name, _, _ in kept]
+        weights = np.array([w for _, _, w in kept], dtype=np.float64)
+        self.weights = weights / weights.sum()
+        self.input_shape = (None,) + reference if reference is not None else None
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or len(kept), thread_name_prefix="ensemble")
+        logger.info(f"Ensemble {len(kept)} member: " +
+                    ", ".join(f"{n} ({w:.2f})" for n, w in zip(self.names, self.weights)))
+
+    def get_weights(self) -> list:
+        return [w for _, model, _ in self.members for w in model.get_weights()]
+
+    def member_predictions(self, X) -> np.ndarray:
+        """Output semua member: (n_members, n_inputs)"""
+        X = np.asarray(X, dtype=np.float32)
+        jobs = [(model, rescale) for (_, model, _), rescale in zip(self.members, self.rescales)]
+        if len(jobs) > 1:
+            try:
+                futures = [self._pool.submit(_forward, model, X, rescale) for model, rescale in jobs]
+                return np.stack([f.result().reshape(len(X)) for f in futures])
+            except RuntimeError:
+                # Pool sudah ditutup (entry di-evict saat request ini berjalan): jalankan berurutan
+                pass
+        return np.stack([_forward(model, X, rescale).reshape(len(X)) for model, rescale in jobs])
+
+    def predict_with_spread(self, X) -> tuple:
+        """(mean berbobot (n, 1), std berbobot antar member (n,), prediksi per member (n_members, n))"""
+        preds = self.member_predictions(X)
+        mean = self.weights @ preds
+        spread = np.sqrt(self.weights @ (preds - mean) ** 2)
+        return mean.reshape(-1, 1), spread, preds
+
+    def predict(self, X, batch_size: int = None, verbose=0):
+        return self.predict_with_spread(X)[0]
+
+    def close(self):
+        """Hentikan thread pool member (dipanggil registry saat entry di-evict/diganti)"""
+        self._pool.shutdown(wait=False)
+
+
+def load_ensemble(spec: str, loader=None, base_scaler=None) -> EnsembleModel:
+    """Muat semua member (dan scaler per member jika ada) dari spec; member yang gagal dimuat di-skip"""
+    if loader is None:
+        from model_registry import load_model_file as loader
+    import joblib
+    members = []
+    for path, weight, scaler_path in parse_ensemble_spec(spec):
+        try:
+            scaler = joblib.load(scaler_path) if scaler_path else None
+            members.append((os.path.basename(path), loader(path), weight, scaler))
+        except Exception as e:
+            logger.warning(f"Member ensemble {path} gagal dimuat: {e}")
+    return EnsembleModel(members, base_scaler=base_scaler)
@@ -0,0 +1,234 @@
+"""
+Ring buffer per ticker berisi SEQ_LEN baris fitur yang sudah di-scale
+Buffer di-seed sekali dari data historis; setelah itu setiap bar baru cukup
+menghitung fitur incremental (return1, ma7, ma21, std7) dan men-scale satu baris,
+jadi prediksi tidak perlu download ulang maupun pandas
+"""
+
+import os
+import time
+import logging
+import itertools
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("feature_buffer")
+
+FEATURE_COLS = ['Close', 'Open', 'High', 'Low', 'Volume', 'return1', 'ma7', 'ma21', 'std7']
+OHLCV_COLS = ['Open', 'High', 'Low', 'Close', 'Volume']
+SEQ_LEN = 60
+MA_LONG = 21
+MA_SHORT = 7
+
+# Umur buffer sebelum dicek ulang ke data provider (detik) dan jumlah ticker maksimum
+FEATURE_BUFFER_TTL = float(os.getenv("FEATURE_BUFFER_TTL", "900"))
+FEATURE_BUFFER_MAX_TICKERS = int(os.getenv("FEATURE_BUFFER_MAX_TICKERS", "64"))
+SEED_PERIOD = "6mo"      # 3mo (~62 bar bursa) kurang untuk SEQ_LEN + warm-up ma21
+REFRESH_PERIOD = "5d"
+
+# Versi global (unik lintas buffer) supaya buffer baru tidak mewarisi versi buffer lama
+_versions = itertools.count(1)
+
+
+def ohlcv_rows(df: pd.DataFrame):
+    """(dates, array (n, 5) Open/High/Low/Close/Volume) dari DataFrame yfinance"""
+    df = df[OHLCV_COLS].dropna()
+    return df.index, df.to_numpy(dtype=float).reshape(len(df), -1)[:, :len(OHLCV_COLS)]
+
+
+class TickerFeatureBuffer:
+    """Window (SEQ_LEN, n_features) float32 ter-scale untuk satu ticker, di-update in place"""
+
+    def __init__(self, ticker: str, scaler, seq_len: int = SEQ_LEN):
+        self.ticker = ticker
+        self.scaler = scaler
+        self.seq_len = seq_len
+        self.scaled = np.zeros((seq_len, len(FEATURE_COLS)), dtype=np.float32)
+        self.raw = np.zeros((seq_len, len(FEATURE_COLS)), dtype=np.float64)
+        self.pos = 0          # slot yang akan ditulis berikutnya
+        self.filled = 0
+        self.closes = deque(maxlen=MA_LONG)
+        self.last_date = None
+        self.last_refresh = 0.0
+        self.version = 0      # berubah setiap isi buffer berubah (seed/push_bar), kunci cache prediksi
+        self.lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.filled >= self.seq_len
+
+    def _feature_row(self, o, h, l, c, v) -> np.ndarray:
+        """Fitur satu bar dari closes terakhir (closes sudah memuat c)"""
+        closes = np.fromiter(self.closes, dtype=float)
+        short = closes[-MA_SHORT:]
+        return np.array([
+            c, o, h, l, v,
+            c / closes[-2] - 1,
+            short.mean(),
+            closes.mean(),
+            short.std(ddof=1),
+        ])
+
+    def _write(self, slot: int, row: np.ndarray):
+        self.raw[slot] = row
+        self.scaled[slot] = self.scaler.transform(row.reshape(1, -1))[0]
+
+    def seed(self, dates, ohlcv: np.ndarray):
+        """Isi ulang buffer dari bar historis (sama dengan engineer_features + scaler.transform)"""
+        needed = self.seq_len + MA_LONG - 1
+        if len(ohlcv) < needed:
+            raise ValueError(f"Insufficient data: {len(ohlcv)} < {needed}")
+
+        closes = ohlcv[:, 3]
+        windows_short = np.lib.stride_tricks.sliding_window_view(closes, MA_SHORT)[-self.seq_len:]
+        windows_long = np.lib.stride_tricks.sliding_window_view(closes, MA_LONG)[-self.seq_len:]
+        tail = ohlcv[-self.seq_len:]
+        raw = np.column_stack([
+            tail[:, 3], tail[:, 0], tail[:, 1], tail[:, 2], tail[:, 4],
+            closes[-self.seq_len:] / closes[-self.seq_len - 1:-1] - 1,
+            windows_short.mean(axis=1),
+            windows_long.mean(axis=1),
+            windows_short.std(axis=1, ddof=1),
+        ])
+
+        self.raw[:] = raw
+        self.scaled[:] = self.scaler.transform(raw)
+        self.pos = 0
+        self.filled = self.seq_len
+        self.closes.clear()
+        self.closes.extend(closes[-MA_LONG:])
+        self.last_date = pd.Timestamp(dates[-1])
+        self.last_refresh = time.time()
+        self.version = next(_versions)
+
+    def push_bar(self, date, o, h, l, c, v) -> bool:
+        """
+        Tambahkan satu bar. Bar dengan tanggal yang sama dengan bar terakhir
+        (bar hari ini yang belum final) menimpa slot terakhir; jika OHLCV-nya identik
+        (refresh tanpa bar baru) buffer dan version tidak disentuh, jadi cache prediksi tetap valid.
+        Returns: True jika buffer berubah
+        """
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date < self.last_date:
+            return False
+        if date == self.last_date:
+            slot = (self.pos - 1) % self.seq_len
+            if np.array_equal(self.raw[slot, :5], (c, o, h, l, v)):
+                return False
+            self.closes[-1] = c
+        else:
+            self.closes.append(c)
+            slot = self.pos
+            self.pos = (self.pos + 1) % self.seq_len
+            self.filled = min(self.filled + 1, self.seq_len)
+        self._write(slot, self._feature_row(o, h, l, c, v))
+        self.last_date = date
+        self.version = next(_versions)
+        return True
+
+    def clone(self) -> "TickerFeatureBuffer":
+        """Salinan independen (untuk simulasi forecast multi-step tanpa mengubah buffer asli)"""
+        other = TickerFeatureBuffer(self.ticker, self.scaler, self.seq_len)
+        other.scaled[:] = self.scaled
+        other.raw[:] = self.raw
+        other.pos, other.filled = self.pos, self.filled
+        other.closes.extend(self.closes)
+        other.last_date, other.last_refresh = self.last_date, self.last_refresh
+        other.version = self.version
+        return other
+
+    def window(self) -> np.ndarray:
+        """Sequence terurut (lama → baru), shape (seq_len, n_features) float32"""
+        return np.concatenate([self.scaled[self.pos:], self.scaled[:self.pos]])
+
+    def latest_raw(self) -> np.ndarray:
+        """Fitur unscaled dari bar terakhir"""
+        return self.raw[(self.pos - 1) % self.seq_len]
+
+
+class FeatureBufferStore:
+    """
+    Buffer per ticker (LRU). fetch_fn(ticker, period) -> DataFrame OHLCV dipakai untuk
+    seed awal dan refresh kecil (REFRESH_PERIOD) setelah TTL lewat
+    """
+
+    def __init__(self, fetch_fn, ttl=FEATURE_BUFFER_TTL, max_tickers=FEATURE_BUFFER_MAX_TICKERS,
+                 seq_len=SEQ_LEN):
+        self.fetch_fn = fetch_fn
+        self.ttl = ttl
+        self.max_tickers = max_tickers
+        self.seq_len = seq_len
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+        self.seeds = 0
+        self.refreshes = 0
+
+    def _seed(self, buffer: TickerFeatureBuffer):
+        dates, ohlcv = ohlcv_rows(self.fetch_fn(buffer.ticker, SEED_PERIOD))
+        buffer.seed(dates, ohlcv)
+        self.seeds += 1
+        logger.info(f"Feature buffer {buffer.ticker} di-seed ({len(ohlcv)} bar)")
+
+    def _refresh(self, buffer: TickerFeatureBuffer):
+        dates, ohlcv = ohlcv_rows(self.fetch_fn(buffer.ticker, REFRESH_PERIOD))
+        if not len(dates):
+            buffer.last_refresh = time.time()
+            return
+        # Ada bar yang terlewat (jeda lebih panjang dari REFRESH_PERIOD) → seed ulang
+        if pd.Timestamp(dates[0]) > buffer.last_date:
+            self._seed(buffer)
+            return
+        new = dates >= buffer.last_date
+        for date, row in zip(dates[new], ohlcv[new]):
+            buffer.push_bar(date, *row)
+        buffer.last_refresh = time.time()
+        self.refreshes += 1
+
+    def get(self, ticker: str, scaler, force_refresh: bool = False) -> TickerFeatureBuffer:
+        """Buffer siap pakai untuk ticker; seed ulang jika scaler berganti (model di-reload)"""
+        with self._lock:
+            buffer = self._buffers.get(ticker)
+            if buffer is None or buffer.scaler is not scaler:
+                buffer = TickerFeatureBuffer(ticker, scaler, self.seq_len)
+                self._buffers[ticker] = buffer
+            self._buffers.move_to_end(ticker)
+            while len(self._buffers) > self.max_tickers:
+                self._buffers.popitem(last=False)
+
+        with buffer.lock:
+            if not buffer.ready:
+                self._seed(buffer)
+            elif force_refresh or time.time() - buffer.last_refresh > self.ttl:
+                self._refresh(buffer)
+        return buffer
+
+    def shed(self, fraction: float) -> int:
+        """Buang fraksi buffer LRU (di-seed ulang saat dipakai lagi)"""
+        with self._lock:
+            n = int(len(self._buffers) * fraction + 0.999) if self._buffers else 0
+            for _ in range(n):
+                self._buffers.popitem(last=False)
+        return n
+
+    def memory_usage(self) -> dict:
+        with self._lock:
+            buffers = list(self._buffers.values())
+        return {"entries": len(buffers), "bytes": sum(b.scaled.nbytes + b.raw.nbytes for b in buffers)}
+
+    def report(self) -> dict:
+        with self._lock:
+            buffers = list(self._buffers.values())
+        return {
+            "tickers": len(buffers),
+            "seeds": self.seeds,
+            "refreshes": self.refreshes,
+            "ttl_sec": self.ttl,
+            "buffers": [
+                {"ticker": b.ticker, "last_date": str(b.last_date.date()) if b.last_date is not None else None,
+                 "age_sec": round(time.time() - b.last_refresh, 1)}
+                for b in buffers
+            ],
+        }
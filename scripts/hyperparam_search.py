@@ -0,0 +1,308 @@
+"""
+Hyperparameter search paralel untuk model LSTM GGRM
+Trial dijalankan di process pool (thread TensorFlow dibatasi per worker) dan
+semua worker membaca satu dataset yang di-memory-map dari disk.
+Usage: python hyperparam_search.py --mode random --trials 20 --workers 4
+"""
+
+import os
+import csv
+import json
+import time
+import random
+import logging
+import argparse
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TICKER = "GGRM.JK"
+PERIOD = "5y"
+SEARCH_DIR = "hparam_search"
+SEARCH_EPOCHS = 30
+SEARCH_PATIENCE = 5
+FEATURES = ['Close', 'Open', 'High', 'Low', 'Volume', 'return1', 'ma7', 'ma21', 'std7']
+
+# Search space
+SEARCH_SPACE = {
+    "units": [(128, 64, 32), (64, 32), (50, 50), (64, 64, 32), (32,)],
+    "seq_len": [30, 60, 90],
+    "dropout": [0.1, 0.2, 0.3],
+    "batch_size": [16, 32, 64],
+}
+
+# Pruning: trial dihentikan jika val_loss > PRUNE_RATIO x val_loss terbaik trial lain di epoch yang sama
+PRUNE_WARMUP_EPOCHS = 3
+PRUNE_RATIO = 1.5
+
+
+def prepare_shared_dataset(out_dir, ticker=TICKER, period=PERIOD):
+    """
+    Download data, engineer features, scale, lalu simpan ke .npy
+    supaya semua worker bisa memory-map satu salinan yang sama
+    """
+    from sklearn.preprocessing import MinMaxScaler
+    from market_data import fetch_history
+
+    logger.info(f"Menyiapkan dataset bersama untuk {ticker} ({period})...")
+    df = fetch_history(ticker, period)
+
+    df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+    df['return1'] = df['Close'].pct_change(1)
+    df['ma7'] = df['Close'].rolling(7).mean()
+    df['ma21'] = df['Close'].rolling(21).mean()
+    df['std7'] = df['Close'].rolling(7).std()
+    df = df.dropna()
+
+    data_scaled = MinMaxScaler().fit_transform(df[FEATURES].values.astype(float)).astype(np.float32)
+
+    # Target: Close ter-scale di bar berikutnya (NaN untuk bar terakhir)
+    targets = np.full(len(data_scaled), np.nan, dtype=np.float32)
+    targets[:-1] = data_scaled[1:, 0]
+
+    os.makedirs(out_dir, exist_ok=True)
+    features_path = os.path.join(out_dir, "features.npy")
+    targets_path = os.path.join(out_dir, "targets.npy")
+    np.save(features_path, data_scaled)
+    np.save(targets_path, targets)
+    logger.info(f"Dataset disimpan: {data_scaled.shape} → {out_dir}")
+    return features_path, targets_path
+
+
+def snapshot_dataset(ref):
+    """Path scaled.npy + next_close_scaled.npy dari snapshot dataset_snapshot.py (tanpa download)"""
+    from dataset_snapshot import load_snapshot
+    snapshot = load_snapshot(ref)
+    if snapshot.horizon != 1:
+        raise ValueError(f"Search butuh snapshot dengan horizon 1, bukan {snapshot.horizon}")
+    return (os.path.join(snapshot.path, "scaled.npy"),
+            os.path.join(snapshot.path, "next_close_scaled.npy"))
+
+
+def generate_trials(mode="random", n_trials=20, seed=42):
+    """Daftar kombinasi parameter (grid penuh atau sampel random)"""
+    keys = list(SEARCH_SPACE)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(SEARCH_SPACE[k] for k in keys))]
+    if mode == "grid":
+        return grid
+    rng = random.Random(seed)
+    return rng.sample(grid, min(n_trials, len(grid)))
+
+
+def build_lstm(seq_len, n_features, units, dropout, dense_units=16):
+    """LSTM bertumpuk dengan Dropout setelah tiap layer (arsitektur train_model.py)"""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense, Dropout, Input
+
+    layers = [Input(shape=(seq_len, n_features))]
+    for i, u in enumerate(units):
+        layers.append(LSTM(u, return_sequences=i < len(units) - 1))
+        layers.append(Dropout(dropout))
+    layers.append(Dense(dense_units, activation='relu'))
+    layers.append(Dense(1))
+
+    model = Sequential(layers)
+    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+    return model
+
+
+# State per worker process (diisi oleh _init_worker)
+_shared = {}
+
+
+def _init_worker(threads, best_by_epoch, lock):
+    """Batasi thread TensorFlow sebelum TF di-import di worker"""
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    _shared["best_by_epoch"] = best_by_epoch
+    _shared["lock"] = lock
+
+
+def _make_pruning_callback(trial_id):
+    import tensorflow as tf
+
+    class SharedPruning(tf.keras.callbacks.Callback):
+        """Bandingkan val_loss dengan trial terbaik lain pada epoch yang sama"""
+
+        def __init__(self):
+            super().__init__()
+            self.pruned_at = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            val_loss = (logs or {}).get("val_loss")
+            if val_loss is None or not np.isfinite(val_loss):
+                return
+            best_by_epoch, lock = _shared["best_by_epoch"], _shared["lock"]
+            with lock:
+                best = best_by_epoch.get(epoch)
+                if best is None or val_loss < best:
+                    best_by_epoch[epoch] = float(val_loss)
+            if best is not None and epoch + 1 >= PRUNE_WARMUP_EPOCHS and val_loss > PRUNE_RATIO * best:
+                logger.info(f"Trial {trial_id} di-prune pada epoch {epoch + 1} "
+                            f"(val_loss {val_loss:.6f} > {PRUNE_RATIO} x {best:.6f})")
+                self.pruned_at = epoch + 1
+                self.model.stop_training = True
+
+    return SharedPruning()
+
+
+def validation_start(n_rows: int, train_ratio: float = 0.8) -> int:
+    """
+    Baris target validasi pertama, sama untuk semua trial: dihitung dari seq_len terbesar
+    di SEARCH_SPACE agar val_loss antar seq_len (dan tabel pruning per epoch) membandingkan
+    target yang sama, bukan periode validasi yang berbeda
+    """
+    max_seq_len = max(SEARCH_SPACE["seq_len"])
+    return max_seq_len + int((n_rows - 1 - max_seq_len) * train_ratio)
+
+
+def run_trial(trial_id, params, features_path, targets_path, epochs=SEARCH_EPOCHS):
+    """Jalankan satu trial di worker process"""
+    import tensorflow as tf
+    from training_pipeline import make_window_dataset
+
+    start_time = time.perf_counter()
+    result = {"trial_id": trial_id, **params, "units": list(params["units"])}
+    try:
+        # Memory-map: semua worker berbagi page cache yang sama, tanpa salinan per proses
+        features = np.load(features_path, mmap_mode="r")
+        targets = np.load(targets_path, mmap_mode="r")
+        seq_len = params["seq_len"]
+
+        windows_end = len(features) - 1
+        train_end = validation_start(len(features))
+
+        train_ds = make_window_dataset(features, targets, seq_len, seq_len, train_end,
+                                       batch_size=params["batch_size"], shuffle=True, seed=trial_id)
+        val_ds = make_window_dataset(features, targets, seq_len, train_end, windows_end,
+                                     batch_size=params["batch_size"])
+
+        model = build_lstm(seq_len, features.shape[1], params["units"], params["dropout"])
+        pruning = _make_pruning_callback(trial_id)
+        history = model.fit(
+            train_ds,
+            epochs=epochs,
+            validation_data=val_ds,
+            callbacks=[
+                tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=SEARCH_PATIENCE),
+                pruning,
+            ],
+            verbose=0
+        )
+
+        val_loss = history.history["val_loss"]
+        best_epoch = int(np.argmin(val_loss))
+        result.update({
+            "status": "pruned" if pruning.pruned_at else "completed",
+            "best_val_loss": float(val_loss[best_epoch]),
+            "best_val_mae": float(history.history["val_mae"][best_epoch]),
+            "best_epoch": best_epoch + 1,
+            "epochs_run": len(val_loss),
+            "params": int(model.count_params()),
+        })
+    except Exception as e:
+        result.update({"status": "failed", "error": str(e)})
+    result["duration_sec"] = time.perf_counter() - start_time
+    return result
+
+
+def write_leaderboard(results, out_dir):
+    """Simpan hasil trial terurut val_loss ke JSON dan CSV"""
+    ranked = sorted(results, key=lambda r: (r.get("status") != "completed", r.get("best_val_loss", np.inf)))
+    for rank, r in enumerate(ranked, start=1):
+        r["rank"] = rank
+
+    json_path = os.path.join(out_dir, "leaderboard.json")
+    with open(json_path, "w") as f:
+        json.dump({"generated": datetime.now().isoformat(), "ticker": TICKER, "trials": ranked}, f, indent=2)
+
+    csv_path = os.path.join(out_dir, "leaderboard.csv")
+    columns = ["rank", "trial_id", "status", "best_val_loss", "best_val_mae", "best_epoch", "epochs_run",
+               "units", "seq_len", "dropout", "batch_size", "params", "duration_sec", "error"]
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for r in ranked:
+            writer.writerow({**r, "units": "-".join(str(u) for u in r["units"])})
+
+    logger.info(f"Leaderboard disimpan ke {json_path} dan {csv_path}")
+    return ranked
+
+
+def run_search(mode="random", n_trials=20, workers=None, threads_per_worker=None,
+               epochs=SEARCH_EPOCHS, out_dir=SEARCH_DIR, snapshot=None):
+    """Jalankan seluruh search dan kembalikan leaderboard (snapshot = pakai dataset_snapshot.py)"""
+    cpu = os.cpu_count() or 1
+    workers = workers or max(1, cpu // 2)
+    threads_per_worker = threads_per_worker or max(1, cpu // workers)
+
+    if snapshot:
+        features_path, targets_path = snapshot_dataset(snapshot)
+    else:
+        features_path, targets_path = prepare_shared_dataset(os.path.join(out_dir, "dataset"))
+    trials = generate_trials(mode, n_trials)
+    logger.info(f"{len(trials)} trial, {workers} worker x {threads_per_worker} thread")
+
+    # spawn: worker mulai bersih sehingga konfigurasi thread TF berlaku
+    ctx = mp.get_context("spawn")
+    manager = ctx.Manager()
+    best_by_epoch, lock = manager.dict(), manager.Lock()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(threads_per_worker, best_by_epoch, lock)) as pool:
+        futures = [pool.submit(run_trial, i, params, features_path, targets_path, epochs)
+                   for i, params in enumerate(trials)]
+        for future in as_completed(futures):
+            r = future.result()
+            results.append(r)
+            logger.info(f"Trial {r['trial_id']} {r['status']}: val_loss={r.get('best_val_loss')} "
+                        f"({r['duration_sec']:.1f}s)")
+
+    manager.shutdown()
+    return write_leaderboard(results, out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter search LSTM GGRM")
+    parser.add_argument("--mode", choices=["grid", "random"], default="random")
+    parser.add_argument("--trials", type=int, default=20, help="Jumlah trial untuk mode random")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=SEARCH_EPOCHS)
+    parser.add_argument("--output", default=SEARCH_DIR)
+    parser.add_argument("--snapshot", default=os.getenv("DATASET_SNAPSHOT") or None,
+                        help="Snapshot dari dataset_snapshot.py (path, nama, atau ticker) sebagai ganti download")
+    args = parser.parse_args()
+
+    try:
+        ranked = run_search(args.mode, args.trials, args.workers, args.threads_per_worker,
+                            args.epochs, args.output, args.snapshot)
+        best = ranked[0] if ranked else None
+        if best and best.get("status") == "completed":
+            logger.info(f"✅ Konfigurasi terbaik: {best}")
+        return 0
+    except Exception as e:
+        logger.error(f"❌ Search gagal: {e}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,664 @@
+"""
+Layer market data: provider yang bisa dipilih (yfinance, Firestore stock_data, file lokal),
+cache stale-while-revalidate dan circuit breaker
+Data terakhir yang valid langsung dikembalikan (ditandai stale jika sudah lewat TTL)
+sementara refresh berjalan di background; setelah beberapa kegagalan berturut-turut
+upstream tidak dipanggil dulu sampai cool-down selesai
+Usage (export data ke file lokal untuk offline): python market_data.py --export GGRM.JK --period 5y
+"""
+
+import os
+import re
+import time
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import pandas as pd
+
+logger = logging.getLogger("market_data")
+
+# Provider: yfinance | firestore | local
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+MARKET_DATA_DIR = os.getenv("MARKET_DATA_DIR", "market_data")
+STOCK_DATA_COLLECTION = "stock_data"
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+# Interval yang diturunkan lokal dari bar yang lebih halus: interval -> (interval dasar, argumen resample)
+RESAMPLE_RULES = {
+    "1wk": ("1d", {"rule": "W-MON", "label": "left", "closed": "left"}),
+    "1mo": ("1d", {"rule": "MS"}),
+    "3mo": ("1d", {"rule": "QS"}),
+    "15m": ("5m", {"rule": "15min"}),
+    "30m": ("5m", {"rule": "30min"}),
+    "60m": ("5m", {"rule": "60min"}),
+    "1h": ("5m", {"rule": "60min"}),
+    "90m": ("5m", {"rule": "90min"}),
+}
+# Yahoo hanya menyediakan bar intraday < 1h untuk ~60 hari terakhir
+INTRADAY_BASE_MAX_DAYS = 60
+
+MARKET_DATA_TTL = float(os.getenv("MARKET_DATA_TTL", "300"))
+MARKET_DATA_FETCH_TIMEOUT = float(os.getenv("MARKET_DATA_FETCH_TIMEOUT", "15"))
+MARKET_DATA_CACHE_MAX_ENTRIES = int(os.getenv("MARKET_DATA_CACHE_MAX_ENTRIES", "256"))
+MARKET_DATA_REFRESH_WORKERS = int(os.getenv("MARKET_DATA_REFRESH_WORKERS", "4"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_COOLDOWN_SEC = float(os.getenv("BREAKER_COOLDOWN_SEC", "60"))
+
+
+def period_start(period: str, end) -> pd.Timestamp:
+    """Tanggal awal untuk period gaya yfinance (5d, 1mo, 1y, ytd, max) relatif ke end"""
+    end = pd.Timestamp(end)
+    if period in (None, "max"):
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=end.year, month=1, day=1)
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not match:
+        raise ValueError(f"Period tidak dikenal: {period}")
+    n, unit = int(match.group(1)), match.group(2)
+    offset = {"d": pd.DateOffset(days=n), "wk": pd.DateOffset(weeks=n),
+              "mo": pd.DateOffset(months=n), "y": pd.DateOffset(years=n)}[unit]
+    return end - offset
+
+
+def resample_ohlcv(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Turunkan bar interval lebih besar dari bar yang lebih halus:
+    Open first, High max, Low min, Close last, Volume sum; bucket kosong (libur/di luar sesi) dibuang
+    """
+    _, kwargs = RESAMPLE_RULES[interval]
+    out = df[OHLCV_COLUMNS].resample(**kwargs).agg(OHLCV_AGG)
+    return out.dropna(subset=["Close"])
+
+
+def resample_base(interval: str, period: str):
+    """Interval dasar untuk menurunkan interval ini secara lokal, atau None jika harus dari upstream"""
+    if interval not in RESAMPLE_RULES:
+        return None
+    base, _ = RESAMPLE_RULES[interval]
+    if base.endswith("m"):
+        now = pd.Timestamp.now()
+        try:
+            first = period_start(period, now)
+        except ValueError:
+            return None
+        if first is None or (now - first).days > INTRADAY_BASE_MAX_DAYS:
+            return None
+    return base
+
+
+def normalize_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bentuk standar semua provider: kolom Open/High/Low/Close/Volume (tanpa MultiIndex),
+    DatetimeIndex tz-naive terurut tanpa duplikat
+    """
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    missing = [c for c in OHLCV_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+    df = df[OHLCV_COLUMNS].astype(float)
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.rename("Date")
+    df = df[~df.index.duplicated(keep="last")]
+    return df.sort_index()
+
+
+class MarketDataProvider:
+    """
+    Interface provider bar OHLCV. history() mengembalikan DataFrame normalize_ohlcv
+    untuk period (relatif ke hari ini) atau range [start, end); raise ValueError jika kosong
+    """
+
+    name = "base"
+
+    def history(self, ticker: str, period: str = "1y", interval: str = "1d",
+                start=None, end=None) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def history_many(self, tickers: list, period: str = "1y", interval: str = "1d") -> dict:
+        """ticker -> DataFrame; ticker yang gagal tidak ada di dict"""
+        frames = {}
+        for ticker in tickers:
+            try:
+                frames[ticker] = self.history(ticker, period, interval)
+            except Exception as e:
+                logger.warning(f"[{self.name}] {ticker} gagal: {e}")
+        return frames
+
+    @staticmethod
+    def _check(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
+        if df is None or df.empty:
+            raise ValueError(f"No data returned for {ticker}")
+        return df
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+
+    def history(self, ticker, period="1y", interval="1d", start=None, end=None):
+        import yfinance as yf
+        if start is not None:
+            df = yf.download(ticker, start=str(pd.Timestamp(start).date()),
+                             end=str(pd.Timestamp(end).date()) if end is not None else None,
+                             interval=interval, progress=False)
+        else:
+            df = yf.download(ticker, period=period, interval=interval, progress=False)
+        return normalize_ohlcv(self._check(df, ticker))
+
+    def history_many(self, tickers, period="1y", interval="1d"):
+        """Satu request yf.download untuk semua ticker"""
+        import yfinance as yf
+        raw = yf.download(tickers, period=period, interval=interval, group_by="ticker", progress=False)
+        frames = {}
+        for ticker in tickers:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if ticker not in raw.columns.get_level_values(0):
+                    continue
+                df = raw[ticker]
+            else:
+                df = raw
+            df = df.dropna(how="all")
+            if not df.empty:
+                frames[ticker] = normalize_ohlcv(df)
+        return frames
+
+
+def default_firestore_client():
+    """Firestore client dari Firebase app yang ada, atau init dari FIREBASE_CREDENTIALS"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if not firebase_admin._apps:
+        cred_path = os.getenv("FIREBASE_CREDENTIALS") or os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        if cred_path and os.path.exists(cred_path):
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()
+    return firestore.client()
+
+
+class FirestoreProvider(MarketDataProvider):
+    """
+    Baca bar harian dari koleksi stock_data yang diisi scrape_to_firebase.py
+    (dokumen: ticker, date "YYYY-MM-DD", open/high/low/close/volume).
+    Range query ticker == X dan date dalam range butuh composite index (ticker, date).
+    """
+
+    name = "firestore"
+
+    def __init__(self, client=None, collection=STOCK_DATA_COLLECTION):
+        self._client = client
+        self.collection = collection
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = default_firestore_client()
+        return self._client
+
+    def history(self, ticker, period="1y", interval="1d", start=None, end=None):
+        if interval != "1d":
+            raise ValueError(f"Firestore {self.collection} hanya menyimpan bar harian (interval={interval})")
+        end_ts = pd.Timestamp(end) if end is not None else pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        start_ts = pd.Timestamp(start) if start is not None else period_start(period, end_ts)
+
+        query = self.client.collection(self.collection).where("ticker", "==", ticker)
+        if start_ts is not None:
+            query = query.where("date", ">=", start_ts.strftime("%Y-%m-%d"))
+        query = query.where("date", "<", end_ts.strftime("%Y-%m-%d")).order_by("date")
+
+        rows = [doc.to_dict() for doc in query.stream()]
+        if not rows:
+            raise ValueError(f"No data returned for {ticker}")
+        df = pd.DataFrame(rows)
+        df.index = pd.to_datetime(df["date"])
+        df = df.rename(columns={c.lower(): c for c in OHLCV_COLUMNS})
+        return normalize_ohlcv(df)
+
+
+class LocalFileProvider(MarketDataProvider):
+    """
+    Bar dari file lokal {data_dir}/{ticker}.parquet atau .csv (kolom Date + OHLCV).
+    Period dihitung relatif ke bar terakhir di file, sehingga hasilnya deterministik untuk test offline.
+    """
+
+    name = "local"
+
+    def __init__(self, data_dir=MARKET_DATA_DIR):
+        self.data_dir = data_dir
+        self._frames = {}
+
+    def path(self, ticker: str, ext: str) -> str:
+        return os.path.join(self.data_dir, f"{ticker}.{ext}")
+
+    def _load(self, ticker: str) -> pd.DataFrame:
+        for ext in ("parquet", "csv"):
+            path = self.path(ticker, ext)
+            if not os.path.exists(path):
+                continue
+            mtime = os.path.getmtime(path)
+            cached = self._frames.get(ticker)
+            if cached is not None and cached[0] == (path, mtime):
+                return cached[1]
+            if ext == "parquet":
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_csv(path, index_col=0, parse_dates=True)
+            if not isinstance(df.index, pd.DatetimeIndex):
+                df = df.set_index(pd.to_datetime(df.pop("Date")))
+            df = normalize_ohlcv(df)
+            self._frames[ticker] = ((path, mtime), df)
+            return df
+        raise FileNotFoundError(f"Tidak ada file data untuk {ticker} di {self.data_dir}")
+
+    def history(self, ticker, period="1y", interval="1d", start=None, end=None):
+        if interval != "1d":
+            raise ValueError(f"File lokal hanya menyimpan bar harian (interval={interval})")
+        df = self._load(ticker)
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+            if end is not None:
+                df = df[df.index < pd.Timestamp(end)]
+        elif len(df):
+            first = period_start(period, df.index[-1])
+            if first is not None:
+                df = df[df.index > first]
+        return self._check(df, ticker).copy()
+
+    def save(self, ticker: str, df: pd.DataFrame, fmt: str = "parquet") -> str:
+        """Simpan bar ke file lokal (parquet butuh pyarrow, selain itu pakai csv)"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        df = normalize_ohlcv(df)
+        if fmt == "parquet":
+            try:
+                path = self.path(ticker, "parquet")
+                df.to_parquet(path)
+                return path
+            except ImportError:
+                logger.warning("pyarrow tidak tersedia, simpan sebagai CSV")
+        path = self.path(ticker, "csv")
+        df.to_csv(path)
+        return path
+
+
+PROVIDERS = {
+    "yfinance": YFinanceProvider,
+    "firestore": FirestoreProvider,
+    "local": LocalFileProvider,
+}
+_provider_instances = {}
+
+
+def get_provider(name: str = None, **kwargs) -> MarketDataProvider:
+    """Provider sesuai nama / MARKET_DATA_PROVIDER (satu instance per nama jika tanpa argumen)"""
+    name = (name or MARKET_DATA_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"MARKET_DATA_PROVIDER tidak dikenal: {name} (pilihan: {', '.join(PROVIDERS)})")
+    if kwargs:
+        return PROVIDERS[name](**kwargs)
+    if name not in _provider_instances:
+        _provider_instances[name] = PROVIDERS[name]()
+    return _provider_instances[name]
+
+
+def fetch_history(ticker: str, period: str = "1y", interval: str = "1d", start=None, end=None,
+                  provider: str = None) -> pd.DataFrame:
+    """Shortcut: bar OHLCV dari provider yang dikonfigurasi"""
+    return get_provider(provider).history(ticker, period, interval, start=start, end=end)
+
+
+class CircuitOpenError(RuntimeError):
+    """Upstream sedang di-skip karena circuit breaker terbuka"""
+
+
+class MarketDataUnavailable(RuntimeError):
+    """Tidak ada data di cache dan upstream gagal / tidak bisa dipanggil"""
+
+
+class CircuitBreaker:
+    """
+    closed: panggilan normal; open: semua panggilan ditolak sampai cooldown lewat;
+    half_open: satu panggilan percobaan, sukses → closed, gagal → open lagi
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN_SEC):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.time() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Circuit breaker closed, upstream pulih")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                    logger.warning(f"Circuit breaker open setelah {self.failures} kegagalan, "
+                                   f"cool-down {self.cooldown:.0f}s")
+                self.state = "open"
+                self.opened_at = time.time()
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError("Upstream market data sedang tidak tersedia (circuit open)")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "retry_in_sec": max(0.0, round(self.opened_at + self.cooldown - time.time(), 1))
+                if self.state == "open" else 0.0,
+            }
+
+
+class CacheEntry:
+    def __init__(self, data, fetched_at):
+        self.data = data
+        self.fetched_at = fetched_at
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class MarketDataCache:
+    """
+    Cache (ticker, period, interval) -> DataFrame dengan stale-while-revalidate.
+    fetch_fn(ticker, period, interval) harus raise jika upstream gagal / data kosong.
+    fetch_many_fn(tickers, period, interval) -> {ticker: DataFrame} (opsional) dipakai get_many
+    untuk mengambil semua ticker yang cold/expired dalam satu request upstream.
+    """
+
+    def __init__(self, fetch_fn, ttl=MARKET_DATA_TTL, fetch_timeout=MARKET_DATA_FETCH_TIMEOUT,
+                 max_entries=MARKET_DATA_CACHE_MAX_ENTRIES, breaker=None, workers=MARKET_DATA_REFRESH_WORKERS,
+                 fetch_many_fn=None):
+        self.fetch_fn = fetch_fn
+        self.fetch_many_fn = fetch_many_fn
+        self.ttl = ttl
+        self.fetch_timeout = fetch_timeout
+        self.max_entries = max_entries
+        self.breaker = breaker or CircuitBreaker()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="market-data")
+        self._resampled = OrderedDict()
+        self.stats = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "refresh_errors": 0,
+                      "resample_hits": 0, "resample_builds": 0}
+
+    def _store(self, key, data, fetched_at):
+        """Simpan entry (dipanggil dengan self._lock dipegang)"""
+        self._entries[key] = CacheEntry(data, fetched_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _fetch(self, key):
+        try:
+            data = self.breaker.call(self.fetch_fn, *key)
+            with self._lock:
+                self._store(key, data, time.time())
+            return data
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            if not isinstance(e, CircuitOpenError):
+                logger.warning(f"Refresh market data {key} gagal: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _refresh(self, key):
+        """Future refresh untuk key (refresh yang sedang berjalan dipakai bersama)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch, key)
+                self._inflight[key] = future
+        return future
+
+    def get(self, ticker: str, period: str = "1y", interval: str = "1d"):
+        """
+        Returns: (data, info) dengan info = {data_age_seconds, stale, source}
+        Raise MarketDataUnavailable jika belum ada data sama sekali dan upstream gagal
+        """
+        key = (ticker, period, interval)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and entry.age < self.ttl:
+            self.stats["fresh_hits"] += 1
+            return entry.data, self._info(entry, stale=False, source="cache")
+
+        if entry is not None:
+            # Stale: langsung layani data lama, refresh di background (kecuali circuit open)
+            self.stats["stale_hits"] += 1
+            if self.breaker.state != "open":
+                self._refresh(key)
+            return entry.data, self._info(entry, stale=True, source="stale-cache")
+
+        self.stats["misses"] += 1
+        try:
+            data = self._refresh(key).result(timeout=self.fetch_timeout)
+        except FutureTimeout:
+            raise MarketDataUnavailable(f"Timeout mengambil data {ticker} ({self.fetch_timeout:.0f}s)")
+        except Exception as e:
+            raise MarketDataUnavailable(f"Data {ticker} tidak tersedia: {e}") from e
+        return data, {"data_age_seconds": 0.0, "stale": False, "source": "upstream"}
+
+    def _call_many(self, tickers: list, period: str, interval: str) -> dict:
+        """Satu request upstream untuk banyak ticker; hasil kosong dihitung gagal oleh breaker"""
+        if self.fetch_many_fn is not None:
+            frames = self.fetch_many_fn(tickers, period, interval)
+        else:
+            frames = {}
+            for ticker in tickers:
+                try:
+                    frames[ticker] = self.fetch_fn(ticker, period, interval)
+                except Exception as e:
+                    logger.warning(f"Market data {ticker} gagal: {e}")
+        if not frames:
+            raise ValueError(f"Upstream tidak mengembalikan data untuk {len(tickers)} ticker")
+        return frames
+
+    def _fetch_many(self, pending: dict, period: str, interval: str):
+        """Refresh grup: pending = {ticker: Future} yang sudah terdaftar di _inflight"""
+        error = None
+        try:
+            frames = self.breaker.call(self._call_many, list(pending), period, interval)
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            if not isinstance(e, CircuitOpenError):
+                logger.warning(f"Refresh market data {len(pending)} ticker ({period}, {interval}) gagal: {e}")
+            frames, error = {}, e
+        now = time.time()
+        with self._lock:
+            for ticker in pending:
+                key = (ticker, period, interval)
+                if ticker in frames:
+                    self._store(key, frames[ticker], now)
+                self._inflight.pop(key, None)
+        for ticker, future in pending.items():
+            if ticker in frames:
+                future.set_result(frames[ticker])
+            else:
+                future.set_exception(error or ValueError(f"No data returned for {ticker}"))
+
+    def get_many(self, tickers: list, period: str = "1y", interval: str = "1d"):
+        """
+        Seperti get() untuk banyak ticker: entry fresh/stale dilayani dari cache, ticker yang
+        cold atau expired diambil bersama dalam satu panggilan upstream (stale di background).
+        Returns: (frames, infos, errors) per ticker; ticker gagal hanya ada di errors
+        """
+        frames, infos, errors = {}, {}, {}
+        waits, pending = {}, {}
+        with self._lock:
+            for ticker in dict.fromkeys(tickers):
+                key = (ticker, period, interval)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    stale = entry.age >= self.ttl
+                    self.stats["stale_hits" if stale else "fresh_hits"] += 1
+                    frames[ticker] = entry.data
+                    infos[ticker] = self._info(entry, stale=stale, source="stale-cache" if stale else "cache")
+                    if not stale or self.breaker.state == "open" or key in self._inflight:
+                        continue
+                else:
+                    self.stats["misses"] += 1
+                    if key in self._inflight:
+                        waits[ticker] = self._inflight[key]
+                        continue
+                future = self._inflight[key] = Future()
+                pending[ticker] = future
+                if entry is None:
+                    waits[ticker] = future
+        if pending:
+            self._executor.submit(self._fetch_many, pending, period, interval)
+
+        deadline = time.time() + self.fetch_timeout
+        for ticker, future in waits.items():
+            try:
+                frames[ticker] = future.result(timeout=max(0.0, deadline - time.time()))
+                infos[ticker] = {"data_age_seconds": 0.0, "stale": False, "source": "upstream"}
+            except FutureTimeout:
+                errors[ticker] = f"Timeout mengambil data {ticker} ({self.fetch_timeout:.0f}s)"
+            except Exception as e:
+                errors[ticker] = f"Data {ticker} tidak tersedia: {e}"
+        return frames, infos, errors
+
+    def get_interval(self, ticker: str, period: str = "1y", interval: str = "1d"):
+        """
+        Seperti get(), tetapi interval yang bisa diturunkan (1wk/1mo dari 1d, 15m-90m dari 5m)
+        di-resample dari bar dasar yang di-cache. Hasil resample di-cache per interval
+        dan dihitung ulang hanya jika bar dasar berganti.
+        """
+        base = resample_base(interval, period)
+        if base is None:
+            return self.get(ticker, period, interval)
+
+        data, info = self.get(ticker, period, base)
+        key = (ticker, period, interval)
+        with self._lock:
+            cached = self._resampled.get(key)
+        if cached is not None and cached[0] is data:
+            self.stats["resample_hits"] += 1
+            resampled = cached[1]
+        else:
+            resampled = resample_ohlcv(data, interval)
+            self.stats["resample_builds"] += 1
+            with self._lock:
+                self._resampled[key] = (data, resampled)
+                self._resampled.move_to_end(key)
+                while len(self._resampled) > self.max_entries:
+                    self._resampled.popitem(last=False)
+        return resampled, {**info, "source": f"{info['source']}+resampled:{base}"}
+
+    def shed(self, fraction: float) -> int:
+        """Buang fraksi entry LRU (hasil resample lebih dulu, lalu bar mentah); dipakai budget memori"""
+        with self._lock:
+            dropped = 0
+            for entries in (self._resampled, self._entries):
+                n = int(len(entries) * fraction + 0.999) if entries else 0
+                for _ in range(n):
+                    entries.popitem(last=False)
+                dropped += n
+        return dropped
+
+    def memory_usage(self) -> dict:
+        from memory_monitor import estimate_nbytes
+        with self._lock:
+            frames = [e.data for e in self._entries.values()] + [r for _, r in self._resampled.values()]
+        return {"entries": len(frames), "bytes": estimate_nbytes(frames)}
+
+    @staticmethod
+    def _info(entry: CacheEntry, stale: bool, source: str) -> dict:
+        return {"data_age_seconds": round(entry.age, 1), "stale": stale, "source": source}
+
+    def freshness(self, ticker: str) -> dict:
+        """Umur data paling baru yang di-cache untuk ticker (semua period/interval)"""
+        with self._lock:
+            ages = [e.age for k, e in self._entries.items() if k[0] == ticker]
+        if not ages:
+            return {"data_age_seconds": None, "stale": None}
+        age = min(ages)
+        return {"data_age_seconds": round(age, 1), "stale": age >= self.ttl}
+
+    def report(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+            inflight = len(self._inflight)
+        return {
+            "entries": entries,
+            "inflight_refreshes": inflight,
+            "ttl_sec": self.ttl,
+            **self.stats,
+            "breaker": self.breaker.report(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export bar OHLCV ke file lokal (LocalFileProvider)")
+    parser.add_argument("--export", nargs="+", required=True, metavar="TICKER")
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--source", default="yfinance", choices=[n for n in PROVIDERS if n != "local"])
+    parser.add_argument("--output", default=MARKET_DATA_DIR)
+    parser.add_argument("--format", default="parquet", choices=["parquet", "csv"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    source = get_provider(args.source)
+    target = LocalFileProvider(args.output)
+    for ticker in args.export:
+        df = source.history(ticker, args.period)
+        path = target.save(ticker, df, args.format)
+        logger.info(f"{ticker}: {len(df)} bar → {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Scheduler in-process yang sadar jam bursa IDX
+Setelah market tutup, job dijalankan sekali per hari bursa (refresh bar,
+precompute forecast, warm cache) sehingga request user dilayani dari memori
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime, time as dtime, timedelta, timezone
+
+logger = logging.getLogger("market_scheduler")
+
+try:
+    from zoneinfo import ZoneInfo
+    MARKET_TZ = ZoneInfo("Asia/Jakarta")
+except Exception:
+    # WIB tidak mengenal DST, offset tetap cukup jika tzdata tidak tersedia
+    MARKET_TZ = timezone(timedelta(hours=7), "WIB")
+
+ENABLE_SCHEDULER = os.getenv("ENABLE_SCHEDULER", "0") == "1"
+SCHEDULER_TICKERS = [t.strip() for t in os.getenv("SCHEDULER_TICKERS", "GGRM.JK").split(",") if t.strip()]
+
+# Jam perdagangan IDX (WIB) dan waktu job setelah penutupan
+MARKET_OPEN = dtime(9, 0)
+MARKET_CLOSE = dtime(16, 0)
+POST_CLOSE_RUN = dtime(*map(int, os.getenv("SCHEDULER_RUN_AT", "16:15").split(":")))
+RETRY_DELAY_SEC = int(os.getenv("SCHEDULER_RETRY_SEC", "600"))
+
+
+class PrecomputeError(RuntimeError):
+    """Job gagal untuk sebagian ticker; hanya ticker di `failed` yang perlu dicoba ulang"""
+
+    def __init__(self, failed, summary=None):
+        self.failed = list(failed)
+        self.summary = summary or {}
+        super().__init__(f"Job gagal untuk {len(self.failed)} ticker: {', '.join(self.failed)}")
+
+
+def market_now() -> datetime:
+    return datetime.now(MARKET_TZ)
+
+
+def is_trading_day(day) -> bool:
+    """Senin-Jumat (libur bursa nasional tidak dicek; job di hari libur hanya tidak menemukan bar baru)"""
+    return day.weekday() < 5
+
+
+def is_market_open(now: datetime = None) -> bool:
+    now = now or market_now()
+    return is_trading_day(now) and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def next_run_time(now: datetime = None, run_at: dtime = POST_CLOSE_RUN) -> datetime:
+    """Waktu job berikutnya: run_at di hari bursa berikutnya (hari ini jika belum lewat)"""
+    now = now or market_now()
+    candidate = now.replace(hour=run_at.hour, minute=run_at.minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    while not is_trading_day(candidate):
+        candidate += timedelta(days=1)
+    return candidate
+
+
+class MarketCloseScheduler:
+    """
+    Thread daemon yang memanggil job(tickers) setiap hari bursa setelah penutupan.
+    Saat start, job langsung dijalankan sekali untuk warm cache. Jika job gagal,
+    dicoba ulang setelah retry_delay hanya untuk ticker yang gagal (PrecomputeError.failed).
+    """
+
+    def __init__(self, job, tickers=None, run_at: dtime = POST_CLOSE_RUN, retry_delay=RETRY_DELAY_SEC):
+        self.job = job
+        self.tickers = list(tickers or SCHEDULER_TICKERS)
+        self.run_at = run_at
+        self.retry_delay = retry_delay
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+        self.next_run = None
+        self.retry_tickers = []
+
+    def run_once(self, tickers=None):
+        """Jalankan job untuk tickers (default semua); ticker yang gagal disimpan di retry_tickers"""
+        tickers = list(tickers or self.tickers)
+        started = market_now()
+        try:
+            self.last_result = self.job(tickers)
+            self.last_error = None
+            self.retry_tickers = []
+            logger.info(f"Job scheduler selesai untuk {len(tickers)} ticker")
+        except PrecomputeError as e:
+            self.last_result = e.summary
+            self.last_error = str(e)
+            self.retry_tickers = e.failed
+            logger.error(f"Job scheduler gagal: {e}")
+        except Exception as e:
+            self.last_error = str(e)
+            self.retry_tickers = tickers
+            logger.error(f"Job scheduler gagal: {e}", exc_info=True)
+        self.last_run = started
+        return self.last_error is None
+
+    def _loop(self):
+        ok = self.run_once()
+        while not self._stop.is_set():
+            now = market_now()
+            daily = next_run_time(now, self.run_at)
+            retry = now + timedelta(seconds=self.retry_delay)
+            # Retry parsial hanya jika datang sebelum run harian (yang toh memproses semua ticker)
+            retrying = not ok and retry < daily
+            self.next_run = retry if retrying else daily
+            wait = (self.next_run - now).total_seconds()
+            logger.info(f"Job scheduler berikutnya: {self.next_run.isoformat()}"
+                        + (f" (retry {', '.join(self.retry_tickers)})" if retrying else ""))
+            if self._stop.wait(max(0.0, wait)):
+                break
+            ok = self.run_once(self.retry_tickers if retrying else None)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="market-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Market scheduler aktif ({', '.join(self.tickers)}, run {self.run_at.strftime('%H:%M')} WIB)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def report(self) -> dict:
+        return {
+            "enabled": self._thread is not None and self._thread.is_alive(),
+            "tickers": self.tickers,
+            "market_open": is_market_open(),
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "last_error": self.last_error,
+            "retry_tickers": self.retry_tickers,
+            "last_result": self.last_result,
+        }
@@ -0,0 +1,314 @@
+"""
+Introspeksi memori worker dan penegakan budget memori
+- RSS proses, top alokasi tracemalloc per modul (jika MEMORY_TRACEMALLOC=1)
+- Ukuran cache/model yang terdaftar dan peak alokasi per request (per path)
+- MEMORY_BUDGET_MB: jika RSS melewati budget, cache yang terdaftar dibuang sebagian
+  (urutan pendaftaran = paling murah dibangun ulang lebih dulu) sebelum worker kena OOM kill
+"""
+
+import os
+import gc
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from model_registry import current_rss_bytes
+
+logger = logging.getLogger("memory_monitor")
+
+MEMORY_BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", "0"))          # 0 = tanpa budget
+MEMORY_TRACEMALLOC = os.getenv("MEMORY_TRACEMALLOC", "0") == "1"
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "1"))
+MEMORY_CHECK_INTERVAL_SEC = float(os.getenv("MEMORY_CHECK_INTERVAL_SEC", "5"))
+# Setelah shedding, turunkan RSS sampai fraksi budget ini agar tidak langsung terpicu lagi
+MEMORY_SHED_TARGET = float(os.getenv("MEMORY_SHED_TARGET", "0.85"))
+SHED_FRACTION = 0.5
+MAX_SHED_ROUNDS = 4
+
+
+def estimate_nbytes(obj, _seen=None, _depth=0) -> int:
+    """
+    Estimasi kasar memori objek: DataFrame/ndarray dihitung dari buffer datanya,
+    container dan atribut objek ditelusuri (objek yang sama hanya dihitung sekali)
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen or _depth > 4:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=False))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(v, seen, _depth + 1) for v in obj.values())
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(v, seen, _depth + 1) for v in obj)
+    attrs = getattr(obj, "__dict__", None)
+    if attrs is not None:
+        return sys.getsizeof(obj) + estimate_nbytes(attrs, seen, _depth + 1)
+    return sys.getsizeof(obj)
+
+
+def shed_mapping(mapping, fraction: float, lock=None) -> int:
+    """
+    Buang fraksi entry tertua dari dict / OrderedDict (urutan insert = urutan LRU).
+    lock: lock yang juga dipegang pemilik cache saat mengubah mapping
+    """
+    if lock is None:
+        return _shed_mapping(mapping, fraction)
+    with lock:
+        return _shed_mapping(mapping, fraction)
+
+
+def _shed_mapping(mapping, fraction: float) -> int:
+    n = int(len(mapping) * fraction + 0.999) if mapping else 0
+    for _ in range(n):
+        try:
+            if isinstance(mapping, OrderedDict):
+                mapping.popitem(last=False)
+            else:
+                mapping.pop(next(iter(mapping)))
+        except (KeyError, StopIteration, RuntimeError):
+            break
+    return n
+
+
+def _malloc_trim():
+    """Kembalikan memori bebas heap glibc ke OS agar RSS benar-benar turun"""
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _module_of(filename: str) -> str:
+    """Path file sumber -> nama package/modul untuk agregasi tracemalloc"""
+    path = filename.replace("\\", "/")
+    for marker in ("site-packages/", "dist-packages/"):
+        if marker in path:
+            return path.split(marker, 1)[1].split("/", 1)[0].replace(".py", "")
+    if path.startswith("<"):
+        return path
+    name = os.path.splitext(os.path.basename(path))[0]
+    stdlib = os.path.dirname(os.__file__).replace("\\", "/")
+    return f"stdlib:{name}" if path.startswith(stdlib) else name
+
+
+class MemoryMonitor:
+    """
+    Registry cache dengan fungsi ukuran dan shedding, plus statistik peak per request.
+    size_fn() -> {"entries": int, "bytes": int}; shed_fn(fraction) -> jumlah entry yang dibuang
+    """
+
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB, trace=MEMORY_TRACEMALLOC,
+                 check_interval=MEMORY_CHECK_INTERVAL_SEC):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.check_interval = check_interval
+        self._caches = OrderedDict()
+        self._requests = {}
+        self._lock = threading.Lock()
+        self._enforce_lock = threading.Lock()   # satu shedding sekaligus; request lain tidak menunggu
+        self._last_check = 0.0
+        self.peak_rss = 0
+        self.shed_events = 0
+        self.last_shed = None
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACEMALLOC_FRAMES)
+            logger.info(f"tracemalloc aktif ({MEMORY_TRACEMALLOC_FRAMES} frame)")
+
+    def register(self, name: str, size_fn, shed_fn=None):
+        self._caches[name] = (size_fn, shed_fn)
+
+    def cache_sizes(self) -> dict:
+        sizes = {}
+        for name, (size_fn, _) in self._caches.items():
+            try:
+                info = size_fn()
+                sizes[name] = {"entries": int(info.get("entries", 0)),
+                               "mb": round(info.get("bytes", 0) / 1024 / 1024, 3)}
+            except Exception as e:
+                sizes[name] = {"error": str(e)}
+        return sizes
+
+    def rss(self) -> int:
+        rss = current_rss_bytes()
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    # --- Budget ---
+
+    def over_budget(self, rss: int = None) -> bool:
+        return self.budget_bytes > 0 and (rss if rss is not None else self.rss()) > self.budget_bytes
+
+    def enforce_due(self) -> bool:
+        """Cek murah tanpa lock (boleh dari event loop): sudah waktunya cek budget?"""
+        return self.budget_bytes > 0 and time.monotonic() - self._last_check >= self.check_interval
+
+    def maybe_enforce(self):
+        """
+        Cek budget paling sering sekali per check_interval. Blocking (gc, malloc_trim, lock cache),
+        jadi dipanggil dari threadpool; jika shedding lain sedang berjalan langsung kembali
+        """
+        if self.budget_bytes <= 0 or not self._enforce_lock.acquire(blocking=False):
+            return None
+        try:
+            now = time.monotonic()
+            if now - self._last_check < self.check_interval:
+                return None
+            self._last_check = now
+            return self.enforce() if self.over_budget() else None
+        finally:
+            self._enforce_lock.release()
+
+    def enforce(self) -> dict:
+        """Buang cache bertahap (urutan registrasi) sampai RSS di bawah target budget"""
+        target = self.budget_bytes * MEMORY_SHED_TARGET
+        rss_before = self.rss()
+        shed = {}
+        for _ in range(MAX_SHED_ROUNDS):
+            dropped = 0
+            for name, (_, shed_fn) in self._caches.items():
+                if shed_fn is None:
+                    continue
+                try:
+                    n = shed_fn(SHED_FRACTION)
+                except Exception as e:
+                    logger.warning(f"Shedding {name} gagal: {e}")
+                    continue
+                shed[name] = shed.get(name, 0) + n
+                dropped += n
+                gc.collect()
+                _malloc_trim()
+                if self.rss() <= target:
+                    break
+            if dropped == 0 or self.rss() <= target:
+                break
+
+        rss_after = self.rss()
+        self.shed_events += 1
+        self.last_shed = {
+            "at": time.time(),
+            "rss_before_mb": round(rss_before / 1024 / 1024, 1),
+            "rss_after_mb": round(rss_after / 1024 / 1024, 1),
+            "shed_entries": {k: v for k, v in shed.items() if v},
+        }
+        logger.warning(f"RSS {self.last_shed['rss_before_mb']} MB melewati budget "
+                       f"{self.budget_bytes / 1024 / 1024:.0f} MB, cache dibuang: "
+                       f"{self.last_shed['shed_entries']} → {self.last_shed['rss_after_mb']} MB")
+        return self.last_shed
+
+    # --- Per request ---
+
+    def request_started(self) -> tuple:
+        """
+        Titik awal pengukuran request. Peak tracemalloc bersifat global untuk proses,
+        jadi pada request yang berjalan bersamaan angka peak mencakup alokasi request lain
+        """
+        traced = None
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        return self.rss(), traced
+
+    def request_finished(self, path: str, started: tuple):
+        rss_before, traced_before = started
+        rss_delta = self.rss() - rss_before
+        peak = None
+        if traced_before is not None and tracemalloc.is_tracing():
+            peak = max(0, tracemalloc.get_traced_memory()[1] - traced_before)
+        with self._lock:
+            stats = self._requests.setdefault(path, {"count": 0, "max_rss_delta": 0, "max_peak": 0,
+                                                     "last_peak": None})
+            stats["count"] += 1
+            stats["max_rss_delta"] = max(stats["max_rss_delta"], rss_delta)
+            if peak is not None:
+                stats["max_peak"] = max(stats["max_peak"], peak)
+                stats["last_peak"] = peak
+        return peak
+
+    # --- Laporan ---
+
+    def top_allocators(self, limit: int = 15) -> list:
+        """Top alokasi hidup tracemalloc, diagregasi per package/modul"""
+        if not tracemalloc.is_tracing():
+            return []
+        by_module = {}
+        for stat in tracemalloc.take_snapshot().statistics("filename"):
+            module = _module_of(stat.traceback[0].filename)
+            size, count = by_module.get(module, (0, 0))
+            by_module[module] = (size + stat.size, count + stat.count)
+        top = sorted(by_module.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [{"module": m, "mb": round(size / 1024 / 1024, 3), "blocks": count} for m, (size, count) in top]
+
+    def report(self, top: int = 15) -> dict:
+        rss = self.rss()
+        tracing = tracemalloc.is_tracing()
+        with self._lock:
+            requests = {
+                path: {
+                    "count": s["count"],
+                    "max_rss_delta_mb": round(s["max_rss_delta"] / 1024 / 1024, 3),
+                    "max_peak_mb": round(s["max_peak"] / 1024 / 1024, 3) if tracing else None,
+                    "last_peak_mb": round(s["last_peak"] / 1024 / 1024, 3) if s["last_peak"] is not None else None,
+                }
+                for path, s in self._requests.items()
+            }
+        return {
+            "rss_mb": round(rss / 1024 / 1024, 1),
+            "peak_rss_mb": round(self.peak_rss / 1024 / 1024, 1),
+            "budget_mb": round(self.budget_bytes / 1024 / 1024, 1) if self.budget_bytes else None,
+            "over_budget": self.over_budget(rss),
+            "shed_events": self.shed_events,
+            "last_shed": self.last_shed,
+            "caches": self.cache_sizes(),
+            "tracemalloc": {
+                "enabled": tracing,
+                "traced_mb": round(tracemalloc.get_traced_memory()[0] / 1024 / 1024, 1) if tracing else None,
+                "top_modules": self.top_allocators(top),
+            },
+            "requests": requests,
+        }
+
+
+class MemoryMonitorMiddleware:
+    """
+    Middleware ASGI murni (tanpa BaseHTTPMiddleware): ukur tiap request lalu cek budget memori.
+    Shedding dijalankan di threadpool agar event loop tidak ikut terblokir
+    """
+
+    def __init__(self, app, monitor: MemoryMonitor):
+        from starlette.concurrency import run_in_threadpool
+        self.app = app
+        self.monitor = monitor
+        self._run_in_threadpool = run_in_threadpool
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = self.monitor.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Template path (/history/{ticker}) agar statistik tidak tumbuh per ticker
+            route = scope.get("route")
+            self.monitor.request_finished(getattr(route, "path", "unmatched"), started)
+            if self.monitor.enforce_due():
+                await self._run_in_threadpool(self.monitor.maybe_enforce)
+
+
+def install_memory_monitor(app, monitor: MemoryMonitor):
+    """Pasang MemoryMonitorMiddleware pada app FastAPI/Starlette"""
+    app.add_middleware(MemoryMonitorMiddleware, monitor=monitor)
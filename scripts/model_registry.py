@@ -0,0 +1,297 @@
+"""
+Registry model per ticker dengan lazy loading dan LRU eviction
+Setiap ticker punya model, scaler dan metadata sendiri; ticker tanpa model
+memakai model default (GGRM)
+"""
+
+import os
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import joblib
+
+logger = logging.getLogger("model_registry")
+
+MODEL_DIR = os.getenv("MODEL_DIR", ".")
+DEFAULT_TICKER = "GGRM.JK"
+DEFAULT_MODEL_FILE = "stock_model.keras"
+DEFAULT_SCALER_FILE = "scaler_ggrm.pkl"
+DEFAULT_METADATA_FILE = "model_metadata.json"
+
+# Batas memori untuk model yang resident (MB) dan jumlah model maksimum
+MODEL_CACHE_MAX_MB = float(os.getenv("MODEL_CACHE_MAX_MB", "512"))
+MODEL_CACHE_MAX_MODELS = int(os.getenv("MODEL_CACHE_MAX_MODELS", "4"))
+
+# Backend inference: keras (TensorFlow), numpy (bobot .npz dari numpy_lstm.py, tanpa TensorFlow)
+# atau tflite (model terkuantisasi dari quantize_model.py, variant int8/fp16)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "keras")
+TFLITE_VARIANT = os.getenv("TFLITE_VARIANT", "int8")
+# Ensemble untuk ticker default: "path[:weight],..." (lihat ensemble.py), kosong = model tunggal
+ENSEMBLE_MODELS = os.getenv("ENSEMBLE_MODELS", "")
+
+
+def ticker_code(ticker: str) -> str:
+    """GGRM.JK -> ggrm (dipakai untuk penamaan file artifact)"""
+    return ticker.split(".")[0].lower()
+
+
+def current_rss_bytes() -> int:
+    """Resident set size proses saat ini (bytes)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss adalah peak RSS (KB di Linux), cukup sebagai fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def load_keras_model(path: str):
+    """Loader default: Keras model (TensorFlow di-import hanya saat dibutuhkan)"""
+    import tensorflow as tf
+    return tf.keras.models.load_model(path, compile=False)
+
+
+def load_numpy_model(path: str):
+    """Loader NumPy: forward pass LSTM dari bobot .npz (lihat numpy_lstm.py)"""
+    from numpy_lstm import load_numpy_model as _load
+    return _load(path)
+
+
+def load_tflite_model(path: str):
+    """Loader TFLite: interpreter tflite_runtime / tf.lite (lihat quantize_model.py)"""
+    from quantize_model import load_tflite_model as _load
+    return _load(path)
+
+
+# backend -> (akhiran file model, loader)
+MODEL_BACKENDS = {
+    "keras": (".keras", load_keras_model),
+    "numpy": (".npz", load_numpy_model),
+    "tflite": (f"_{TFLITE_VARIANT}.tflite", load_tflite_model),
+}
+
+
+def load_model_file(path: str):
+    """Loader berdasarkan ekstensi file (.keras/.h5, .npz, .tflite)"""
+    if path.endswith(".npz"):
+        return load_numpy_model(path)
+    if path.endswith(".tflite"):
+        return load_tflite_model(path)
+    return load_keras_model(path)
+
+
+def model_nbytes(model) -> int:
+    """Ukuran bobot model dalam bytes"""
+    if hasattr(model, "nbytes"):
+        return int(model.nbytes)
+    try:
+        return int(sum(np.asarray(w).nbytes for w in model.get_weights()))
+    except Exception:
+        return 0
+
+
+class ModelEntry:
+    """Model, scaler dan metadata yang sudah dimuat untuk satu ticker"""
+
+    def __init__(self, ticker, model, scaler, metadata, model_path, weights_bytes, rss_bytes):
+        self.ticker = ticker
+        self.model = model
+        self.scaler = scaler
+        self.metadata = metadata
+        self.model_path = model_path
+        self.weights_bytes = weights_bytes
+        self.rss_bytes = rss_bytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.hits = 0
+
+    @property
+    def resident_bytes(self) -> int:
+        """Estimasi memori yang dipakai entry ini"""
+        return max(self.weights_bytes, self.rss_bytes)
+
+    def info(self) -> dict:
+        return {
+            "ticker": self.ticker,
+            "model_path": self.model_path,
+            "weights_mb": round(self.weights_bytes / 1024 / 1024, 3),
+            "rss_mb": round(self.rss_bytes / 1024 / 1024, 3),
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "hits": self.hits,
+        }
+
+
+class ModelRegistry:
+    """
+    LRU registry untuk model per ticker.
+    Model dimuat saat pertama kali dipakai dan di-evict (least recently used)
+    jika jumlah atau total memori melebihi batas. Model default tidak pernah di-evict.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, default_ticker=DEFAULT_TICKER,
+                 max_bytes=MODEL_CACHE_MAX_MB * 1024 * 1024, max_models=MODEL_CACHE_MAX_MODELS,
+                 model_loader=None, backend=MODEL_BACKEND, ensemble_spec=ENSEMBLE_MODELS):
+        if backend not in MODEL_BACKENDS:
+            raise ValueError(f"MODEL_BACKEND tidak dikenal: {backend} (pilihan: {', '.join(MODEL_BACKENDS)})")
+        self.model_dir = model_dir
+        self.default_ticker = default_ticker
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self.backend = backend
+        self.model_ext, default_loader = MODEL_BACKENDS[backend]
+        self.model_loader = model_loader or default_loader
+        self.ensemble_spec = ensemble_spec
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def artifact_paths(self, ticker: str) -> dict:
+        """Path model/scaler/metadata untuk ticker"""
+        if ticker == self.default_ticker:
+            names = (DEFAULT_MODEL_FILE, DEFAULT_SCALER_FILE, DEFAULT_METADATA_FILE)
+        else:
+            code = ticker_code(ticker)
+            names = (f"stock_model_{code}.keras", f"scaler_{code}.pkl", f"model_metadata_{code}.json")
+        model_file = os.path.splitext(names[0])[0] + self.model_ext
+        return {
+            "model": os.path.join(self.model_dir, model_file),
+            "scaler": os.path.join(self.model_dir, names[1]),
+            "metadata": os.path.join(self.model_dir, names[2]),
+        }
+
+    def has_model(self, ticker: str) -> bool:
+        paths = self.artifact_paths(ticker)
+        if ticker == self.default_ticker and self.ensemble_spec:
+            return os.path.exists(paths["scaler"])
+        return os.path.exists(paths["model"]) and os.path.exists(paths["scaler"])
+
+    def resolve(self, ticker: str) -> str:
+        """Ticker yang artifact-nya dipakai (ticker sendiri atau default)"""
+        return ticker if self.has_model(ticker) else self.default_ticker
+
+    def _load(self, ticker: str) -> ModelEntry:
+        paths = self.artifact_paths(ticker)
+        logger.info(f"Loading model untuk {ticker} dari {paths['model']}...")
+
+        rss_before = current_rss_bytes()
+        scaler = joblib.load(paths["scaler"])
+        if ticker == self.default_ticker and self.ensemble_spec:
+            # Input/output ensemble dalam skala scaler default; member dengan scaler sendiri dikonversi
+            from ensemble import load_ensemble
+            model = load_ensemble(self.ensemble_spec, base_scaler=scaler)
+        else:
+            model = self.model_loader(paths["model"])
+        rss_after = current_rss_bytes()
+
+        metadata = {"info": "Model metadata tidak tersedia", "status": "loaded"}
+        if os.path.exists(paths["metadata"]):
+            try:
+                with open(paths["metadata"], "r") as f:
+                    metadata = json.load(f)
+            except Exception as e:
+                logger.warning(f"Could not load metadata {paths['metadata']}: {e}")
+                metadata = {"info": "Metadata file tidak valid", "status": "fallback"}
+
+        entry = ModelEntry(
+            ticker=ticker,
+            model=model,
+            scaler=scaler,
+            metadata=metadata,
+            model_path=paths["model"],
+            weights_bytes=model_nbytes(model),
+            rss_bytes=max(0, rss_after - rss_before),
+        )
+        logger.info(f"Model {ticker} dimuat ({entry.resident_bytes / 1024 / 1024:.2f} MB)")
+        return entry
+
+    def get(self, ticker: str = None) -> ModelEntry:
+        """
+        Ambil entry untuk ticker. Jika ticker tidak punya model sendiri,
+        kembalikan entry model default (entry.ticker != ticker berarti fallback).
+        """
+        ticker = ticker or self.default_ticker
+        key = self.resolve(ticker)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(key)
+                self._entries[key] = entry
+                self._evict()
+            self._entries.move_to_end(key)
+            entry.last_used = time.time()
+            entry.hits += 1
+
+        if key != ticker:
+            logger.debug(f"Model untuk {ticker} tidak ada, memakai model default {key}")
+        return entry
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e.resident_bytes for e in self._entries.values())
+
+    def _evict(self):
+        """Evict model LRU sampai di bawah batas (model default di-pin)"""
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_models or self.total_bytes() > self.max_bytes
+        ):
+            victim = next((k for k in self._entries if k != self.default_ticker), None)
+            if victim is None:
+                break
+            entry = self._entries.pop(victim)
+            self._close(entry)
+            self.evictions += 1
+            logger.info(f"Evict model {victim} ({entry.resident_bytes / 1024 / 1024:.2f} MB)")
+
+    def shed(self, fraction: float) -> int:
+        """Evict fraksi model LRU selain model default (dipakai budget memori)"""
+        with self._lock:
+            victims = [k for k in self._entries if k != self.default_ticker]
+            victims = victims[:int(len(victims) * fraction + 0.999)]
+            for key in victims:
+                entry = self._entries.pop(key)
+                self._close(entry)
+                self.evictions += 1
+                logger.info(f"Evict model {key} ({entry.resident_bytes / 1024 / 1024:.2f} MB) karena budget memori")
+        return len(victims)
+
+    def evict(self, ticker: str) -> bool:
+        """Keluarkan model ticker dari memori secara manual"""
+        with self._lock:
+            entry = self._entries.pop(ticker, None)
+            if entry is not None:
+                self._close(entry)
+            return entry is not None
+
+    @staticmethod
+    def _close(entry: ModelEntry):
+        """Lepas resource milik model (thread pool ensemble); request yang masih jalan tetap selesai"""
+        close = getattr(entry.model, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Gagal menutup model {entry.ticker}: {e}")
+
+    def report(self) -> dict:
+        """Status registry: model resident beserta ukurannya"""
+        with self._lock:
+            models = [e.info() for e in reversed(self._entries.values())]
+            total = self.total_bytes()
+        return {
+            "backend": self.backend,
+            "ensemble": self.ensemble_spec or None,
+            "resident_models": len(models),
+            "resident_mb": round(total / 1024 / 1024, 3),
+            "max_models": self.max_models,
+            "max_mb": round(self.max_bytes / 1024 / 1024, 3),
+            "evictions": self.evictions,
+            "models": models,
+        }
@@ -5,16 +5,202 @@ Monitor model performance dan data freshness
 
 import json
 import logging
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 import numpy as np
 
+from prediction_store import PredictionStore, PREDICTIONS_DB
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+FEATURE_COLS = ['Close', 'Open', 'High', 'Low', 'Volume', 'return1', 'ma7', 'ma21', 'std7']
+DRIFT_STATE_FILE = "feature_drift.json"
+DRIFT_BINS = 20
+DRIFT_REFERENCE_SIZE = 500      # fallback tanpa drift_reference di metadata: bar pertama yang jadi referensi
+DRIFT_DECAY = 0.995             # bobot histogram live meluruh, jadi mencerminkan traffic terbaru
+PSI_WARN = 0.1
+PSI_DRIFT = 0.25
+
+
+class FeatureDriftMonitor:
+    """
+    Drift monitor streaming untuk 9 fitur input model.
+    Memori tetap (histogram fixed-bin per fitur di atas range scaler + mean/variance Welford),
+    berapapun jumlah bar yang masuk. Referensi = histogram fitur training (drift_reference di
+    metadata model); model lama tanpa itu memakai reference_size observasi pertama.
+    """
+
+    def __init__(self, data_min, data_max, feature_names=FEATURE_COLS, n_bins=DRIFT_BINS,
+                 reference_size=DRIFT_REFERENCE_SIZE, decay=DRIFT_DECAY, reference_counts=None):
+        self.feature_names = list(feature_names)
+        self.data_min = np.asarray(data_min, dtype=float)
+        self.data_max = np.asarray(data_max, dtype=float)
+        self.n_bins = n_bins
+        self.reference_size = reference_size
+        self.decay = decay
+        n_features = len(self.feature_names)
+
+        # Edge interior per fitur; bin 0 = di bawah data_min_, bin terakhir = di atas data_max_
+        self.edges = np.linspace(self.data_min, self.data_max, n_bins + 1).T  # (n_features, n_bins + 1)
+        self.reference = np.zeros((n_features, n_bins + 2)) if reference_counts is None \
+            else np.asarray(reference_counts, dtype=float)
+        self.reference_frozen = reference_counts is not None
+        self.reference_source = "training" if self.reference_frozen else "live"
+        self.current = np.zeros((n_features, n_bins + 2))
+
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min_seen = np.full(n_features, np.inf)
+        self.max_seen = np.full(n_features, -np.inf)
+        self.below = np.zeros(n_features, dtype=np.int64)
+        self.above = np.zeros(n_features, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_scaler(cls, scaler, reference: dict = None, **kwargs):
+        """Range dari MinMaxScaler yang dipakai model; reference = drift_reference dari metadata model"""
+        if reference:
+            n_bins = int(reference.get("n_bins", DRIFT_BINS))
+            counts = np.asarray(reference.get("counts", []), dtype=float)
+            if counts.shape == (len(scaler.data_min_), n_bins + 2):
+                kwargs.update(n_bins=n_bins, reference_counts=counts)
+            else:
+                logger.warning(f"drift_reference {counts.shape} tidak cocok dengan scaler, pakai referensi live")
+        return cls(scaler.data_min_, scaler.data_max_, **kwargs)
+
+    @classmethod
+    def training_reference(cls, scaler, features, n_bins=DRIFT_BINS) -> dict:
+        """
+        Histogram fitur training (unscaled) di atas range scaler, untuk disimpan sebagai
+        drift_reference di metadata model oleh script training
+        """
+        monitor = cls.from_scaler(scaler, n_bins=n_bins)
+        rows = np.asarray(features, dtype=float)
+        rows = rows[np.isfinite(rows).all(axis=1)]
+        idx = monitor._bin_index(rows)
+        counts = [np.bincount(idx[:, j], minlength=n_bins + 2).tolist() for j in range(idx.shape[1])]
+        return {"n_bins": n_bins, "rows": int(len(rows)), "counts": counts}
+
+    def _bin_index(self, rows):
+        """Index bin (n_rows, n_features) untuk setiap nilai"""
+        idx = np.empty(rows.shape, dtype=np.int64)
+        for j in range(rows.shape[1]):
+            inner = np.clip(np.searchsorted(self.edges[j], rows[:, j], side="right"), 1, self.n_bins)
+            idx[:, j] = np.where(rows[:, j] < self.data_min[j], 0,
+                                 np.where(rows[:, j] > self.data_max[j], self.n_bins + 1, inner))
+        return idx
+
+    def update(self, rows):
+        """Tambahkan observasi (array (n, n_features) nilai asli, belum di-scale)"""
+        rows = np.atleast_2d(np.asarray(rows, dtype=float))
+        rows = rows[np.isfinite(rows).all(axis=1)]
+        if not len(rows):
+            return
+        idx = self._bin_index(rows)
+        one_hot = np.zeros((len(rows),) + self.current.shape)
+        one_hot[np.arange(len(rows))[:, None], np.arange(rows.shape[1])[None, :], idx] = 1
+
+        with self._lock:
+            for k, row in enumerate(rows):
+                # Welford untuk mean/variance
+                self.count += 1
+                delta = row - self.mean
+                self.mean += delta / self.count
+                self.m2 += delta * (row - self.mean)
+
+                if not self.reference_frozen and self.count <= self.reference_size:
+                    self.reference += one_hot[k]
+                    if self.count == self.reference_size:
+                        self.reference_frozen = True
+                self.current = self.current * self.decay + one_hot[k]
+
+            self.min_seen = np.minimum(self.min_seen, rows.min(axis=0))
+            self.max_seen = np.maximum(self.max_seen, rows.max(axis=0))
+            self.below += (rows < self.data_min).sum(axis=0)
+            self.above += (rows > self.data_max).sum(axis=0)
+
+    @staticmethod
+    def _normalize(counts, eps=1e-4):
+        total = counts.sum(axis=1, keepdims=True)
+        p = np.divide(counts, total, out=np.zeros_like(counts), where=total > 0)
+        return np.clip(p, eps, None)
+
+    def drift_scores(self):
+        """PSI dan KS (selisih CDF maksimum) antara histogram referensi dan live"""
+        ref = self._normalize(self.reference)
+        cur = self._normalize(self.current)
+        psi = ((cur - ref) * np.log(cur / ref)).sum(axis=1)
+        ks = np.abs(np.cumsum(ref, axis=1) / ref.sum(axis=1, keepdims=True)
+                    - np.cumsum(cur, axis=1) / cur.sum(axis=1, keepdims=True)).max(axis=1)
+        return psi, ks
+
+    def quantiles(self, qs=(0.05, 0.5, 0.95)):
+        """Estimasi quantile dari histogram live (interpolasi linear dalam bin)"""
+        result = np.full((len(self.feature_names), len(qs)), np.nan)
+        for j in range(len(self.feature_names)):
+            counts = self.current[j]
+            total = counts.sum()
+            if total <= 0:
+                continue
+            lo = min(self.min_seen[j], self.data_min[j])
+            hi = max(self.max_seen[j], self.data_max[j])
+            bounds = np.concatenate([[lo], self.edges[j], [hi]])
+            cdf = np.cumsum(counts) / total
+            for k, q in enumerate(qs):
+                b = min(int(np.searchsorted(cdf, q)), len(counts) - 1)
+                prev = cdf[b - 1] if b > 0 else 0.0
+                frac = (q - prev) / counts[b] * total if counts[b] > 0 else 0.0
+                result[j, k] = bounds[b] + frac * (bounds[b + 1] - bounds[b])
+        return result
+
+    def report(self) -> dict:
+        with self._lock:
+            if self.count == 0:
+                return {"observations": 0, "features": {}}
+            psi, ks = self.drift_scores() if self.reference_frozen else (np.zeros(len(self.mean)),) * 2
+            quantiles = self.quantiles()
+            std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.zeros_like(self.mean)
+            features = {}
+            for j, name in enumerate(self.feature_names):
+                status = "DRIFT" if psi[j] > PSI_DRIFT else "WARN" if psi[j] > PSI_WARN else "OK"
+                features[name] = {
+                    "mean": float(self.mean[j]),
+                    "std": float(std[j]),
+                    "min_seen": float(self.min_seen[j]),
+                    "max_seen": float(self.max_seen[j]),
+                    "scaler_min": float(self.data_min[j]),
+                    "scaler_max": float(self.data_max[j]),
+                    "below_range": int(self.below[j]),
+                    "above_range": int(self.above[j]),
+                    "out_of_range_rate": float((self.below[j] + self.above[j]) / self.count),
+                    "p05": float(quantiles[j, 0]),
+                    "p50": float(quantiles[j, 1]),
+                    "p95": float(quantiles[j, 2]),
+                    "psi": float(psi[j]),
+                    "ks": float(ks[j]),
+                    "status": status,
+                }
+            return {
+                "observations": self.count,
+                "reference_ready": self.reference_frozen,
+                "reference_source": self.reference_source,
+                "drifted_features": [n for n, f in features.items() if f["status"] == "DRIFT"],
+                "out_of_range_features": [n for n, f in features.items() if f["out_of_range_rate"] > 0],
+                "features": features,
+            }
+
+    def save(self, path=DRIFT_STATE_FILE):
+        """Simpan report terakhir agar bisa dibaca oleh monitor CLI"""
+        with open(path, "w") as f:
+            json.dump({"generated": datetime.now().isoformat(), **self.report()}, f, indent=2)
+
+
 class GGRMModelMonitor:
     """Monitor untuk GGRM stock prediction model"""
     
@@ -23,7 +209,9 @@ class GGRMModelMonitor:
         self.scaler_file = Path("scaler_ggrm.pkl")
         self.metadata_file = Path("model_metadata.json")
         self.test_results_file = Path("test_results.json")
-        self.predictions_file = Path("ggrm_predictions_history.json")
+        self.predictions_db = Path(PREDICTIONS_DB)
+        self.drift_file = Path(DRIFT_STATE_FILE)
+        self.ticker = "GGRM.JK"
     
     def check_files_exist(self):
         """Check jika semua files ada"""
@@ -115,49 +303,42 @@ class GGRMModelMonitor:
         print("\n🎯 PREDICTION ACCURACY")
         print("-" * 60)
         
-        if not self.predictions_file.exists():
+        if not self.predictions_db.exists():
             print("ℹ️ Predictions history belum ada")
             print("💡 Run: python daily_prediction.py")
             return None
         
-        with open(self.predictions_file, 'r') as f:
-            history = json.load(f)
-        
-        predictions = history.get('predictions', [])
+        store = PredictionStore(self.predictions_db)
+        total = store.count(self.ticker)
         
-        if not predictions:
+        if not total:
             print("ℹ️ No predictions yet")
             return None
         
-        # Find completed predictions
-        completed = [p for p in predictions if 'actual_price' in p]
+        # Agregat di-maintain incremental setiap actual price masuk (baca satu baris)
+        stats = store.running_stats(self.ticker)
         
-        if not completed:
+        if not stats:
             print("ℹ️ Predictions pending actual prices...")
             return None
         
-        # Calculate accuracy
-        direction_correct = sum([p.get('direction_accuracy', False) for p in completed])
-        direction_accuracy = (direction_correct / len(completed)) * 100
-        
-        # MAPE
-        mape_values = []
-        for p in completed:
-            mape = abs((p.get('actual_price', p['predicted_price']) - p['predicted_price']) / p['predicted_price']) * 100
-            mape_values.append(mape)
-        
-        avg_mape = np.mean(mape_values)
+        direction_accuracy = stats['direction_accuracy']
+        avg_mape = stats['avg_mape']
+        completed_count = stats['total_predictions']
         
         accuracy_status = "✅" if direction_accuracy > 55 else "⚠️" if direction_accuracy > 50 else "❌"
         mape_status = "✅" if avg_mape < 5 else "⚠️" if avg_mape < 10 else "❌"
         
         print(f"{accuracy_status} Direction Accuracy: {direction_accuracy:.2f}%")
         print(f"{mape_status} Avg MAPE: {avg_mape:.2f}%")
-        print(f"📈 Predictions evaluated: {len(completed)}/{len(predictions)}")
+        print(f"📈 Predictions evaluated: {completed_count}/{total}")
+        for window, w in stats['windows'].items():
+            print(f"   • Last {window}: Direction {w['direction_accuracy']:.2f}%, "
+                  f"MAPE {w['avg_mape']:.2f}% ({w['predictions']} predictions)")
         
         # Last 5 predictions
         print("\n📋 Last 5 Predictions:")
-        for p in completed[-5:]:
+        for p in store.latest(self.ticker, 5, resolved=True):
             date = p['date']
             direction = "↑" if p['direction'] == 'UP' else "↓"
             actual_direction = "↑" if p['actual_direction'] == 'UP' else "↓"
@@ -167,9 +348,30 @@ class GGRMModelMonitor:
         return {
             'direction_accuracy': direction_accuracy,
             'avg_mape': avg_mape,
-            'predictions_evaluated': len(completed)
+            'predictions_evaluated': completed_count,
+            'windows': stats['windows']
         }
     
+    def check_feature_drift(self):
+        """Check drift fitur input live terhadap range scaler (ditulis oleh API)"""
+        print("\n🌊 FEATURE DRIFT")
+        print("-" * 60)
+        
+        if not self.drift_file.exists():
+            print("ℹ️ Belum ada data drift (API belum melayani prediksi)")
+            return None
+        
+        with open(self.drift_file, 'r') as f:
+            drift = json.load(f)
+        
+        print(f"📈 Observations: {drift.get('observations', 0)} (generated {drift.get('generated', '-')})")
+        for name, feat in drift.get('features', {}).items():
+            status = "✅" if feat['status'] == "OK" else "⚠️" if feat['status'] == "WARN" else "❌"
+            print(f"{status} {name}: PSI={feat['psi']:.3f}, KS={feat['ks']:.3f}, "
+                  f"out of range={feat['out_of_range_rate'] * 100:.1f}%")
+        
+        return drift
+    
     def generate_health_score(self):
         """Generate overall health score"""
         print("\n" + "=" * 60)
@@ -253,6 +455,7 @@ class GGRMModelMonitor:
         self.check_model_freshness()
         self.check_test_results()
         self.check_prediction_accuracy()
+        self.check_feature_drift()
         health = self.generate_health_score()
         
         return health
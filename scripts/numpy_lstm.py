@@ -0,0 +1,203 @@
+"""
+Inference LSTM murni NumPy untuk serving tanpa TensorFlow
+Bobot Sequential Keras (LSTM bertumpuk, Dropout, Dense) diekspor ke .npz,
+lalu forward pass direproduksi secara batched dalam float32
+Usage:
+    python numpy_lstm.py --model stock_model.keras                 # export ke stock_model.npz + cek parity
+    python numpy_lstm.py --model stock_model.keras --check-only    # hanya cek parity
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+import numpy as np
+
+logger = logging.getLogger("numpy_lstm")
+
+PARITY_SAMPLES = 64
+PARITY_ATOL = 1e-4
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+def _hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+
+ACTIVATIONS = {
+    "sigmoid": _sigmoid,
+    "hard_sigmoid": _hard_sigmoid,
+    "tanh": np.tanh,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "linear": lambda x: x,
+}
+
+
+def weights_path_for(model_path: str) -> str:
+    """stock_model.keras -> stock_model.npz"""
+    return os.path.splitext(model_path)[0] + ".npz"
+
+
+def export_keras_weights(model, output_path: str) -> dict:
+    """
+    Simpan bobot layer LSTM/Dense ke .npz beserta spesifikasi arsitektur (JSON).
+    Dropout dan InputLayer diabaikan (tidak aktif saat inference).
+    """
+    layers, arrays = [], {}
+    for layer in model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        if kind in ("Dropout", "InputLayer"):
+            continue
+        if kind == "LSTM":
+            if config.get("go_backwards") or config.get("stateful"):
+                raise ValueError(f"Layer {layer.name}: go_backwards/stateful tidak didukung")
+            spec = {
+                "type": "lstm",
+                "units": config["units"],
+                "activation": config.get("activation", "tanh"),
+                "recurrent_activation": config.get("recurrent_activation", "sigmoid"),
+                "return_sequences": bool(config.get("return_sequences", False)),
+            }
+            weights = layer.get_weights()
+            names = ["kernel", "recurrent_kernel", "bias"][:len(weights)]
+        elif kind == "Dense":
+            spec = {"type": "dense", "units": config["units"], "activation": config.get("activation", "linear")}
+            weights = layer.get_weights()
+            names = ["kernel", "bias"][:len(weights)]
+        else:
+            raise ValueError(f"Layer {layer.name} ({kind}) tidak didukung oleh engine NumPy")
+
+        for activation in (spec["activation"], spec.get("recurrent_activation", "linear")):
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Layer {layer.name}: aktivasi {activation} tidak didukung")
+
+        prefix = f"layer{len(layers)}"
+        for name, w in zip(names, weights):
+            arrays[f"{prefix}_{name}"] = np.asarray(w, dtype=np.float32)
+        spec["weights"] = [f"{prefix}_{name}" for name in names]
+        layers.append(spec)
+
+    input_shape = [None if d is None else int(d) for d in model.input_shape]
+    spec = {"input_shape": input_shape, "layers": layers}
+    np.savez(output_path, __spec__=np.array(json.dumps(spec)), **arrays)
+    logger.info(f"Bobot {len(layers)} layer diekspor ke {output_path}")
+    return spec
+
+
+class NumpyLSTMModel:
+    """
+    Forward pass Sequential LSTM/Dense dalam NumPy float32.
+    Interface predict() sama dengan Keras sehingga bisa dipakai langsung oleh ModelRegistry.
+    """
+
+    def __init__(self, spec: dict, arrays: dict):
+        self.spec = spec
+        self.input_shape = tuple(spec["input_shape"])
+        self.layers = []
+        for layer in spec["layers"]:
+            weights = [np.ascontiguousarray(arrays[name], dtype=np.float32) for name in layer["weights"]]
+            self.layers.append((layer, weights))
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyLSTMModel":
+        with np.load(path, allow_pickle=False) as data:
+            spec = json.loads(str(data["__spec__"]))
+            arrays = {k: data[k] for k in data.files if k != "__spec__"}
+        return cls(spec, arrays)
+
+    def get_weights(self) -> list:
+        return [w for _, weights in self.layers for w in weights]
+
+    @staticmethod
+    def _lstm(x, layer, weights):
+        kernel, recurrent_kernel = weights[0], weights[1]
+        bias = weights[2] if len(weights) > 2 else 0.0
+        units = layer["units"]
+        act = ACTIVATIONS[layer["activation"]]
+        rec_act = ACTIVATIONS[layer["recurrent_activation"]]
+
+        batch, steps, _ = x.shape
+        # Proyeksi input untuk semua timestep sekaligus: (batch, steps, 4 * units)
+        x_proj = x @ kernel + bias
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        outputs = np.empty((batch, steps, units), dtype=np.float32) if layer["return_sequences"] else None
+
+        for t in range(steps):
+            z = x_proj[:, t] + h @ recurrent_kernel
+            # Urutan gate Keras: input, forget, cell, output
+            i = rec_act(z[:, :units])
+            f = rec_act(z[:, units:2 * units])
+            g = act(z[:, 2 * units:3 * units])
+            o = rec_act(z[:, 3 * units:])
+            c = f * c + i * g
+            h = o * act(c)
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for layer, weights in self.layers:
+            if layer["type"] == "lstm":
+                x = self._lstm(x, layer, weights)
+            else:
+                x = x @ weights[0]
+                if len(weights) > 1:
+                    x = x + weights[1]
+                x = ACTIVATIONS[layer["activation"]](x)
+        return x
+
+    def predict(self, x, batch_size: int = 1024, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        if len(x) <= batch_size:
+            return self(x)
+        return np.concatenate([self(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+
+
+def load_numpy_model(path: str) -> NumpyLSTMModel:
+    """Loader untuk ModelRegistry (MODEL_BACKEND=numpy)"""
+    return NumpyLSTMModel.load(path)
+
+
+def check_parity(keras_model, numpy_model, n_samples=PARITY_SAMPLES, atol=PARITY_ATOL, seed=0) -> dict:
+    """Bandingkan output Keras dan NumPy pada input acak di range scaler [0, 1]"""
+    _, seq_len, n_features = keras_model.input_shape
+    rng = np.random.default_rng(seed)
+    x = rng.random((n_samples, seq_len, n_features), dtype=np.float32)
+    expected = np.asarray(keras_model.predict(x, verbose=0), dtype=np.float32)
+    actual = numpy_model.predict(x)
+    max_abs = float(np.max(np.abs(expected - actual)))
+    return {"samples": n_samples, "max_abs_diff": max_abs, "atol": atol, "passed": max_abs <= atol}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export model Keras ke engine NumPy")
+    parser.add_argument("--model", default="stock_model.keras")
+    parser.add_argument("--output", default=None, help="Default: path model dengan ekstensi .npz")
+    parser.add_argument("--check-only", action="store_true")
+    parser.add_argument("--atol", type=float, default=PARITY_ATOL)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    import tensorflow as tf
+
+    output = args.output or weights_path_for(args.model)
+    keras_model = tf.keras.models.load_model(args.model, compile=False)
+    if not args.check_only:
+        export_keras_weights(keras_model, output)
+
+    parity = check_parity(keras_model, NumpyLSTMModel.load(output), atol=args.atol)
+    status = "✅" if parity["passed"] else "❌"
+    logger.info(f"{status} Parity Keras vs NumPy: max |diff| = {parity['max_abs_diff']:.2e} (atol {args.atol:g})")
+    return 0 if parity["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
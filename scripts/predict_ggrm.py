@@ -3,7 +3,6 @@ Script untuk prediksi harga GGRM 1-7 hari ke depan
 Menggunakan model yang sudah dilatih
 """
 
-import yfinance as yf
 import numpy as np
 import pandas as pd
 import tensorflow as tf
@@ -15,6 +14,8 @@ from datetime import datetime, timedelta
 import json
 import os
 
+from market_data import fetch_history
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -44,10 +45,7 @@ class GGRMPredictor:
         """Ambil data recent untuk input sequence"""
         try:
             logger.info(f"Downloading data untuk {ticker}...")
-            df = yf.download(ticker, period="1y", interval="1d", progress=False)
-            
-            if df.empty:
-                raise ValueError(f"No data returned for {ticker}")
+            df = fetch_history(ticker, period="1y")
             
             df = df[['Close']].dropna()
             logger.info(f"✅ Downloaded {len(df)} rows")
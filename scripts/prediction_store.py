@@ -0,0 +1,292 @@
+"""
+Penyimpanan history prediksi berbasis SQLite (append-only, terindeks per ticker & tanggal)
+Pengganti ggrm_predictions_history.json: setiap write hanya menyentuh satu record
+dan query range tidak perlu memuat seluruh history
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from accuracy_stats import RunningAccuracy
+
+logger = logging.getLogger(__name__)
+
+PREDICTIONS_DB = os.getenv("PREDICTIONS_DB", "ggrm_predictions.db")
+LEGACY_PREDICTIONS_FILE = "ggrm_predictions_history.json"
+
+PREDICTION_COLUMNS = [
+    "ticker", "date", "base_date", "prediction_time", "current_price", "predicted_price",
+    "change", "change_percent", "direction", "confidence", "model_version",
+]
+ACTUAL_COLUMNS = [
+    "actual_price", "actual_change", "actual_change_percent", "actual_direction", "direction_accuracy",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    base_date TEXT,
+    prediction_time TEXT,
+    current_price REAL,
+    predicted_price REAL,
+    change REAL,
+    change_percent REAL,
+    direction TEXT,
+    confidence TEXT,
+    model_version TEXT,
+    actual_price REAL,
+    actual_change REAL,
+    actual_change_percent REAL,
+    actual_direction TEXT,
+    direction_accuracy INTEGER,
+    resolved_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_ticker_date ON predictions (ticker, date);
+CREATE INDEX IF NOT EXISTS idx_predictions_pending ON predictions (ticker, date) WHERE actual_price IS NULL;
+CREATE TABLE IF NOT EXISTS accuracy_stats (
+    ticker TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at TEXT,
+    PRIMARY KEY (ticker, model_version)
+);
+"""
+
+# model_version untuk agregat semua versi model
+ALL_VERSIONS = "*"
+
+
+def _row_to_dict(row) -> dict:
+    record = {k: row[k] for k in row.keys() if row[k] is not None}
+    if "direction_accuracy" in record:
+        record["direction_accuracy"] = bool(record["direction_accuracy"])
+    return record
+
+
+class PredictionStore:
+    """History prediksi di SQLite dengan index (ticker, date)"""
+
+    def __init__(self, path=PREDICTIONS_DB):
+        self.path = str(path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            needs_rebuild = (
+                conn.execute("SELECT COUNT(*) FROM accuracy_stats").fetchone()[0] == 0
+                and conn.execute("SELECT 1 FROM predictions WHERE actual_price IS NOT NULL LIMIT 1").fetchone()
+            )
+        if needs_rebuild:
+            self.rebuild_running_stats()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def append(self, prediction: dict, ticker: str = None) -> None:
+        """
+        Tambah satu prediksi. Prediksi ulang untuk ticker & tanggal yang sama
+        menimpa nilai prediksinya (actual yang sudah ada tidak disentuh)
+        """
+        record = {col: prediction.get(col) for col in PREDICTION_COLUMNS}
+        record["ticker"] = ticker or prediction.get("ticker")
+        if not record["ticker"] or not record["date"]:
+            raise ValueError("Prediksi harus punya ticker dan date")
+
+        columns = ", ".join(PREDICTION_COLUMNS)
+        placeholders = ", ".join(f":{c}" for c in PREDICTION_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in PREDICTION_COLUMNS if c not in ("ticker", "date"))
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO predictions ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT (ticker, date) DO UPDATE SET {updates}",
+                record,
+            )
+
+    def resolve(self, ticker: str, date: str, actual: dict) -> bool:
+        """Isi actual price untuk satu prediksi"""
+        return self.resolve_many([{**actual, "ticker": ticker, "date": date}]) > 0
+
+    def resolve_many(self, rows: list) -> int:
+        """
+        Isi actual price untuk banyak prediksi dalam satu transaksi.
+        Agregat akurasi (accuracy_stats) di-update O(1) per prediksi yang baru resolved.
+        """
+        if not rows:
+            return 0
+        resolved_at = datetime.now().isoformat()
+        sets = ", ".join(f"{c} = :{c}" for c in ACTUAL_COLUMNS + ["resolved_at"])
+        stats = {}
+        updated = 0
+
+        with self._connect() as conn:
+            for r in sorted(rows, key=lambda r: (r["ticker"], r["date"])):
+                existing = conn.execute(
+                    "SELECT predicted_price, model_version, actual_price FROM predictions "
+                    "WHERE ticker = ? AND date = ?", (r["ticker"], r["date"])
+                ).fetchone()
+                if existing is None:
+                    continue
+
+                params = {**{c: r.get(c) for c in ACTUAL_COLUMNS}, "ticker": r["ticker"], "date": r["date"],
+                          "direction_accuracy": int(bool(r.get("direction_accuracy"))), "resolved_at": resolved_at}
+                conn.execute(f"UPDATE predictions SET {sets} WHERE ticker = :ticker AND date = :date", params)
+                updated += 1
+
+                # Prediksi yang sudah pernah resolved tidak dihitung dua kali
+                if existing["actual_price"] is None and r.get("actual_price"):
+                    ape = abs((r["actual_price"] - existing["predicted_price"]) / r["actual_price"]) * 100
+                    for version in (existing["model_version"] or "", ALL_VERSIONS):
+                        key = (r["ticker"], version)
+                        if key not in stats:
+                            stats[key] = self._load_running(conn, *key)
+                        stats[key].update(ape, r.get("direction_accuracy"))
+
+            for (ticker, version), acc in stats.items():
+                conn.execute(
+                    "INSERT INTO accuracy_stats (ticker, model_version, state, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (ticker, model_version) DO UPDATE SET state = excluded.state, "
+                    "updated_at = excluded.updated_at",
+                    (ticker, version, json.dumps(acc.to_dict()), resolved_at),
+                )
+        return updated
+
+    @staticmethod
+    def _load_running(conn, ticker: str, model_version: str) -> RunningAccuracy:
+        row = conn.execute(
+            "SELECT state FROM accuracy_stats WHERE ticker = ? AND model_version = ?", (ticker, model_version)
+        ).fetchone()
+        return RunningAccuracy.from_dict(json.loads(row["state"])) if row else RunningAccuracy()
+
+    def running_stats(self, ticker: str, model_version: str = ALL_VERSIONS) -> dict:
+        """Agregat akurasi yang sudah dihitung (baca satu baris, tanpa scan history)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT state, updated_at FROM accuracy_stats WHERE ticker = ? AND model_version = ?",
+                (ticker, model_version),
+            ).fetchone()
+        if row is None:
+            return None
+        summary = RunningAccuracy.from_dict(json.loads(row["state"])).summary()
+        if summary:
+            summary["model_version"] = model_version
+            summary["last_updated"] = row["updated_at"]
+        return summary
+
+    def rebuild_running_stats(self) -> None:
+        """Hitung ulang accuracy_stats dari semua prediksi resolved (migrasi / perbaikan)"""
+        stats = {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT ticker, model_version, predicted_price, actual_price, direction_accuracy "
+                "FROM predictions WHERE actual_price IS NOT NULL ORDER BY ticker, date"
+            )
+            for r in rows:
+                ape = abs((r["actual_price"] - r["predicted_price"]) / r["actual_price"]) * 100
+                for version in (r["model_version"] or "", ALL_VERSIONS):
+                    stats.setdefault((r["ticker"], version), RunningAccuracy()).update(ape, r["direction_accuracy"])
+
+            now = datetime.now().isoformat()
+            conn.execute("DELETE FROM accuracy_stats")
+            conn.executemany(
+                "INSERT INTO accuracy_stats (ticker, model_version, state, updated_at) VALUES (?, ?, ?, ?)",
+                [(t, v, json.dumps(acc.to_dict()), now) for (t, v), acc in stats.items()],
+            )
+        logger.info(f"accuracy_stats dibangun ulang untuk {len(stats)} kombinasi ticker/model")
+
+    def range(self, ticker: str, start: str = None, end: str = None, limit: int = None,
+              resolved: bool = None, descending: bool = False) -> list:
+        """Prediksi untuk ticker dalam range tanggal [start, end] (memakai index ticker, date)"""
+        clauses, params = ["ticker = ?"], [ticker]
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        if resolved is True:
+            clauses.append("actual_price IS NOT NULL")
+        elif resolved is False:
+            clauses.append("actual_price IS NULL")
+
+        sql = f"SELECT * FROM predictions WHERE {' AND '.join(clauses)} ORDER BY date {'DESC' if descending else 'ASC'}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._connect() as conn:
+            return [_row_to_dict(r) for r in conn.execute(sql, params)]
+
+    def latest(self, ticker: str, n: int = 1, resolved: bool = None) -> list:
+        """n prediksi terbaru (urut lama → baru)"""
+        return list(reversed(self.range(ticker, limit=n, resolved=resolved, descending=True)))
+
+    def pending(self, ticker: str = None) -> list:
+        """Prediksi yang belum punya actual price"""
+        sql = "SELECT * FROM predictions WHERE actual_price IS NULL"
+        params = []
+        if ticker:
+            sql += " AND ticker = ?"
+            params.append(ticker)
+        with self._connect() as conn:
+            return [_row_to_dict(r) for r in conn.execute(sql + " ORDER BY ticker, date", params)]
+
+    def count(self, ticker: str = None, resolved: bool = None) -> int:
+        clauses, params = [], []
+        if ticker:
+            clauses.append("ticker = ?")
+            params.append(ticker)
+        if resolved is True:
+            clauses.append("actual_price IS NOT NULL")
+        elif resolved is False:
+            clauses.append("actual_price IS NULL")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM predictions{where}", params).fetchone()[0]
+
+    def accuracy_stats(self, ticker: str, last_n: int = None) -> dict:
+        """Direction accuracy dan MAPE dihitung di SQLite (opsional hanya n prediksi resolved terakhir)"""
+        subquery = ("SELECT * FROM predictions WHERE ticker = ? AND actual_price IS NOT NULL "
+                    "ORDER BY date DESC")
+        params = [ticker]
+        if last_n:
+            subquery += " LIMIT ?"
+            params.append(int(last_n))
+        sql = (
+            "SELECT COUNT(*) AS n, SUM(direction_accuracy) AS hits, "
+            "AVG(ABS((actual_price - predicted_price) / actual_price)) * 100 AS mape "
+            f"FROM ({subquery})"
+        )
+        with self._connect() as conn:
+            row = conn.execute(sql, params).fetchone()
+        if not row["n"]:
+            return None
+        return {
+            "total_predictions": row["n"],
+            "direction_accuracy": float(row["hits"] or 0) / row["n"] * 100,
+            "avg_mape": float(row["mape"]),
+        }
+
+    def import_json(self, path=LEGACY_PREDICTIONS_FILE, ticker: str = "GGRM.JK") -> int:
+        """Migrasi sekali dari ggrm_predictions_history.json (hanya jika store masih kosong)"""
+        if not Path(path).exists() or self.count() > 0:
+            return 0
+        with open(path, "r") as f:
+            predictions = json.load(f).get("predictions", [])
+        for p in predictions:
+            self.append(p, ticker=p.get("ticker", ticker))
+        resolved = [{**p, "ticker": p.get("ticker", ticker)} for p in predictions if "actual_price" in p]
+        self.resolve_many(resolved)
+        logger.info(f"Migrasi {len(predictions)} prediksi dari {path} ke {self.path}")
+        return len(predictions)
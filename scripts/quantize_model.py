@@ -0,0 +1,231 @@
+"""
+Export model Keras ke TFLite terkuantisasi (dynamic-range int8 dan float16)
+beserta laporan perbandingan latency, throughput, memori dan drift akurasi
+terhadap model float32 pada data validasi validate_ggrm_model.py
+Usage:
+    python quantize_model.py --export                  # stock_model_int8.tflite + stock_model_fp16.tflite
+    python quantize_model.py --compare                 # laporan ke quantization_report.json
+    python quantize_model.py --export --compare
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger("quantize_model")
+
+MODEL_PATH = "stock_model.keras"
+SCALER_PATH = "scaler_ggrm.pkl"
+REPORT_PATH = "quantization_report.json"
+VARIANTS = ("int8", "fp16")
+TFLITE_VARIANT = os.getenv("TFLITE_VARIANT", "int8")
+TFLITE_THREADS = int(os.getenv("TFLITE_THREADS", "1"))
+LATENCY_RUNS = 200
+THROUGHPUT_BATCH = 256
+
+
+def tflite_path_for(model_path: str, variant: str) -> str:
+    """stock_model.keras -> stock_model_int8.tflite"""
+    return f"{os.path.splitext(model_path)[0]}_{variant}.tflite"
+
+
+def export_tflite(keras_model, output_path: str, variant: str) -> int:
+    """
+    Konversi ke TFLite dengan kuantisasi post-training:
+    int8 = dynamic-range (bobot int8, aktivasi float), fp16 = bobot float16
+    Returns: ukuran file (bytes)
+    """
+    import tensorflow as tf
+
+    if variant not in VARIANTS:
+        raise ValueError(f"Variant tidak dikenal: {variant} (pilihan: {', '.join(VARIANTS)})")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "fp16":
+        converter.target_spec.supported_types = [tf.float16]
+    tflite_bytes = converter.convert()
+
+    with open(output_path, "wb") as f:
+        f.write(tflite_bytes)
+    logger.info(f"TFLite {variant} disimpan ke {output_path} ({len(tflite_bytes) / 1024:.1f} KB)")
+    return len(tflite_bytes)
+
+
+def _make_interpreter(path: str, num_threads: int):
+    """tflite_runtime jika ada (tanpa TensorFlow penuh), selain itu tf.lite"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        from tensorflow.lite import Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+
+class TFLiteModel:
+    """
+    Wrapper interpreter TFLite dengan interface predict() ala Keras untuk ModelRegistry.
+    Interpreter tidak thread-safe, jadi invoke diserialisasi dengan lock.
+    """
+
+    def __init__(self, path: str, num_threads: int = TFLITE_THREADS):
+        self.path = path
+        self.nbytes = os.path.getsize(path)
+        self.interpreter = _make_interpreter(path, num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in self._input["shape"][1:])
+        self._batch = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def get_weights(self) -> list:
+        return []
+
+    def predict(self, x, batch_size: int = None, verbose=0):
+        x = np.asarray(x, dtype=self._input["dtype"])
+        with self._lock:
+            if x.shape[0] != self._batch:
+                self.interpreter.resize_tensor_input(self._input["index"], x.shape)
+                self.interpreter.allocate_tensors()
+                self._batch = x.shape[0]
+            self.interpreter.set_tensor(self._input["index"], x)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"]).copy()
+
+
+def load_tflite_model(path: str) -> TFLiteModel:
+    """Loader untuk ModelRegistry (MODEL_BACKEND=tflite, variant dari TFLITE_VARIANT)"""
+    return TFLiteModel(path)
+
+
+def _measure(model, X: np.ndarray, runs: int = LATENCY_RUNS) -> dict:
+    """Latency single-sample (p50/p95) dan throughput batch"""
+    single = X[:1]
+    model.predict(single, verbose=0)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.predict(single, verbose=0)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    batch = X[:THROUGHPUT_BATCH]
+    model.predict(batch, verbose=0)
+    start = time.perf_counter()
+    model.predict(batch, verbose=0)
+    elapsed = time.perf_counter() - start
+    return {
+        "latency_ms_p50": float(np.percentile(timings, 50)),
+        "latency_ms_p95": float(np.percentile(timings, 95)),
+        "throughput_samples_per_sec": float(len(batch) / elapsed) if elapsed > 0 else None,
+    }
+
+
+def compare_variants(model_path=MODEL_PATH, scaler_path=SCALER_PATH, variants=VARIANTS,
+                     output_path=REPORT_PATH) -> dict:
+    """
+    Bandingkan model float32 dengan varian TFLite (dan engine NumPy jika .npz ada)
+    pada sequence validasi dari validate_ggrm_model.py
+    """
+    import joblib
+    import tensorflow as tf
+    from model_registry import current_rss_bytes
+    from numpy_lstm import NumpyLSTMModel, weights_path_for
+    from validate_ggrm_model import fetch_test_data, prepare_test_sequences
+
+    scaler = joblib.load(scaler_path)
+    X, y, _ = prepare_test_sequences(fetch_test_data(), scaler)
+    X = X.astype(np.float32)
+
+    def inverse_close(pred):
+        dummy = np.zeros((len(pred), scaler.n_features_in_))
+        dummy[:, 0] = np.asarray(pred).reshape(-1)
+        return scaler.inverse_transform(dummy)[:, 0]
+
+    loaders = {"float32": lambda: tf.keras.models.load_model(model_path, compile=False)}
+    files = {"float32": model_path}
+    for variant in variants:
+        path = tflite_path_for(model_path, variant)
+        if os.path.exists(path):
+            loaders[f"tflite_{variant}"] = lambda p=path: TFLiteModel(p)
+            files[f"tflite_{variant}"] = path
+        else:
+            logger.warning(f"{path} tidak ada, jalankan --export dulu")
+    npz_path = weights_path_for(model_path)
+    if os.path.exists(npz_path):
+        loaders["numpy"] = lambda: NumpyLSTMModel.load(npz_path)
+        files["numpy"] = npz_path
+
+    results, reference = {}, None
+    for name, loader in loaders.items():
+        rss_before = current_rss_bytes()
+        model = loader()
+        rss_delta = max(0, current_rss_bytes() - rss_before)
+
+        pred = inverse_close(model.predict(X, verbose=0))
+        if reference is None:
+            reference = pred
+        drift = np.abs(pred - reference)
+        results[name] = {
+            "file": files[name],
+            "file_kb": round(os.path.getsize(files[name]) / 1024, 1),
+            "load_rss_mb": round(rss_delta / 1024 / 1024, 2),
+            **_measure(model, X),
+            "mae": float(np.mean(np.abs(pred - y))),
+            "mape": float(np.mean(np.abs((pred - y) / y)) * 100),
+            "drift_vs_float_mae": float(drift.mean()),
+            "drift_vs_float_max": float(drift.max()),
+            "drift_vs_float_mape": float(np.mean(drift / np.abs(reference)) * 100),
+        }
+        logger.info(f"{name}: p50 {results[name]['latency_ms_p50']:.2f} ms, "
+                    f"MAPE {results[name]['mape']:.2f}%, drift MAE {results[name]['drift_vs_float_mae']:.4f}")
+
+    report = {
+        "generated": datetime.now().isoformat(),
+        "model_path": model_path,
+        "validation_samples": int(len(X)),
+        "throughput_batch": THROUGHPUT_BATCH,
+        "variants": results,
+    }
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Laporan disimpan ke {output_path}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export & bandingkan model TFLite terkuantisasi")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--scaler", default=SCALER_PATH)
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--export", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not (args.export or args.compare):
+        parser.error("Pilih --export dan/atau --compare")
+
+    try:
+        if args.export:
+            import tensorflow as tf
+            keras_model = tf.keras.models.load_model(args.model, compile=False)
+            for variant in args.variants:
+                export_tflite(keras_model, tflite_path_for(args.model, variant), variant)
+        if args.compare:
+            compare_variants(args.model, args.scaler, args.variants, args.output)
+        return 0
+    except Exception as e:
+        logger.error(f"❌ Gagal: {e}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Profiling on-demand per request dengan sampling profiler
+- Admin: header X-Profile: 1 atau query ?profile=1 → request itu diprofile
+- Mode sampling: PROFILE_SAMPLE_RATE=N → 1 dari N request ke endpoint @profiled diprofile
+Hasil disimpan sebagai folded stacks (format flame graph: "a;b;c count") di PROFILE_DIR
+yang dirotasi. Middleware ASGI murni: saat tidak aktif hanya scan header/query lalu app dipanggil langsung.
+"""
+
+import os
+import sys
+import time
+import logging
+import itertools
+import threading
+import functools
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from urllib.parse import parse_qs
+
+logger = logging.getLogger("request_profiler")
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))   # 0 = mode sampling mati
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+ADMIN_UIDS = {uid.strip() for uid in os.getenv("ADMIN_UIDS", "").split(",") if uid.strip()}
+PROFILE_HEADER = b"x-profile"
+
+_current_profile = ContextVar("current_profile", default=None)
+_request_counter = itertools.count(1)
+
+
+def is_admin(decoded_token) -> bool:
+    """Admin = UID ada di ADMIN_UIDS atau token punya custom claim admin"""
+    if not decoded_token:
+        return False
+    return decoded_token.get("uid") in ADMIN_UIDS or bool(decoded_token.get("admin"))
+
+
+class RequestProfile:
+    """
+    Sampling stack satu thread (thread handler request) ke folded stacks.
+    sample_rate=0: diminta admin (selalu diprofile); N > 0: kandidat mode sampling
+    """
+
+    def __init__(self, label: str, interval_ms: float = PROFILE_INTERVAL_MS, sample_rate: int = 0):
+        self.label = label
+        self.interval = interval_ms / 1000.0
+        self.sample_rate = sample_rate
+        self.counts = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration_ms = None
+        self._thread_id = None
+        self._stop = None
+        self._sampler = None
+
+    @property
+    def mode(self) -> str:
+        return "sampled" if self.sample_rate > 0 else "manual"
+
+    def selected(self) -> bool:
+        """Counter sampling hanya maju untuk request yang benar-benar masuk endpoint @profiled"""
+        return self.sample_rate <= 0 or next(_request_counter) % self.sample_rate == 0
+
+    def start(self):
+        """Dipanggil dari thread handler; mulai sampling thread tersebut"""
+        self._thread_id = threading.get_ident()
+        self.started_at = time.perf_counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        if self._stop is None:
+            return
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        if self.started_at is not None:
+            self.duration_ms = (time.perf_counter() - self.started_at) * 1000
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+
+def profiled(fn):
+    """
+    Decorator untuk endpoint sync: jika request ini diprofile (context dari middleware),
+    sampling dijalankan pada thread yang mengeksekusi handler. Keputusan mode sampling
+    diambil di sini agar hanya endpoint @profiled yang ikut dihitung
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None or not profile.selected():
+            return fn(*args, **kwargs)
+        profile.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.stop()
+    return wrapper
+
+
+def _rotate(directory: str, max_files: int):
+    files = sorted(
+        (os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".folded")),
+        key=os.path.getmtime
+    )
+    for path in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def save_profile(profile: RequestProfile, mode: str, directory: str = PROFILE_DIR) -> str:
+    """Simpan folded stacks; nama file memuat waktu, mode, path dan durasi"""
+    os.makedirs(directory, exist_ok=True)
+    slug = profile.label.strip("/").replace("/", "_").replace(" ", "_") or "root"
+    name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{mode}_{slug}_{(profile.duration_ms or 0):.0f}ms.folded"
+    with open(os.path.join(directory, name), "w") as f:
+        f.write(profile.folded())
+    _rotate(directory, PROFILE_MAX_FILES)
+    return name
+
+
+def _profile_requested(scope) -> bool:
+    """Header X-Profile: 1 atau query ?profile=1, langsung dari scope ASGI"""
+    if any(name == PROFILE_HEADER and value == b"1" for name, value in scope.get("headers", ())):
+        return True
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and parse_qs(query.decode("latin-1")).get("profile", [""])[-1] == "1"
+
+
+def _bearer_token(scope):
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" and token else None
+    return None
+
+
+class ProfilerMiddleware:
+    """
+    Middleware ASGI murni untuk profiling.
+    verify_token(token) -> decoded token Firebase (raise jika tidak valid)
+    """
+
+    def __init__(self, app, verify_token, sample_rate: int = PROFILE_SAMPLE_RATE, directory: str = PROFILE_DIR):
+        from starlette.concurrency import run_in_threadpool
+        self.app = app
+        self._run_in_threadpool = run_in_threadpool
+        self.verify_token = verify_token
+        self.sample_rate = sample_rate
+        self.directory = directory
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = _profile_requested(scope)
+        if not requested and self.sample_rate <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        if requested:
+            token = _bearer_token(scope)
+            try:
+                # verify_id_token bisa mengambil sertifikat lewat jaringan: jangan blokir event loop
+                decoded = await self._run_in_threadpool(self.verify_token, token) if token else None
+            except Exception:
+                decoded = None
+            if not is_admin(decoded):
+                from starlette.responses import JSONResponse
+                response = JSONResponse({"detail": "Profiling hanya untuk admin"}, status_code=403)
+                await response(scope, receive, send)
+                return
+
+        profile = RequestProfile(f"{scope['method']} {scope['path']}",
+                                 sample_rate=0 if requested else self.sample_rate)
+
+        async def send_with_profile(message):
+            # Handler sync sudah selesai (profile.stop) sebelum header response dikirim
+            if message["type"] == "http.response.start" and profile.samples:
+                name = save_profile(profile, profile.mode, self.directory)
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-profile-id", name.encode("latin-1")),
+                    (b"x-profile-samples", str(profile.samples).encode("latin-1")),
+                ]}
+                logger.info(f"Profile {profile.mode} {profile.label}: {profile.samples} sampel, "
+                            f"{profile.duration_ms or 0:.1f} ms → {name}")
+            await send(message)
+
+        context_token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _current_profile.reset(context_token)
+
+
+def install_profiler(app, verify_token, sample_rate: int = PROFILE_SAMPLE_RATE, directory: str = PROFILE_DIR):
+    """Pasang ProfilerMiddleware pada app FastAPI/Starlette"""
+    app.add_middleware(ProfilerMiddleware, verify_token=verify_token, sample_rate=sample_rate, directory=directory)
+
+
+def list_profiles(directory: str = PROFILE_DIR) -> list:
+    if not os.path.isdir(directory):
+        return []
+    files = sorted((f for f in os.listdir(directory) if f.endswith(".folded")), reverse=True)
+    return [{"id": f, "bytes": os.path.getsize(os.path.join(directory, f))} for f in files]
+
+
+def read_profile(profile_id: str, directory: str = PROFILE_DIR) -> str:
+    """Isi folded stacks; id dibatasi ke nama file di PROFILE_DIR"""
+    name = os.path.basename(profile_id)
+    path = os.path.join(directory, name)
+    if not name.endswith(".folded") or not os.path.exists(path):
+        raise FileNotFoundError(profile_id)
+    with open(path, "r") as f:
+        return f.read()
@@ -3,7 +3,6 @@ Script untuk retrain model GGRM dengan data terbaru dari Yahoo Finance
 Bisa dijalankan secara berkala (scheduled task) untuk update model
 """
 
-import yfinance as yf
 import numpy as np
 import pandas as pd
 import tensorflow as tf
@@ -13,9 +12,17 @@ from sklearn.preprocessing import MinMaxScaler
 import joblib
 import logging
 import json
-from datetime import datetime
+import argparse
+import os
+from datetime import datetime, timedelta
 import sys
 
+from market_data import fetch_history
+from dataset_snapshot import load_snapshot, DATASET_SNAPSHOT
+from training_pipeline import (
+    make_window_dataset, cache_target, ThroughputCallback, build_training_callbacks, TRAIN_DATASET_CACHE
+)
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -31,12 +38,24 @@ HORIZON = 1
 EPOCHS = 50
 BATCH_SIZE = 32
 
-def fetch_ggrm_data(ticker=TICKER, period=PERIOD):
-    """Fetch data GGRM dari Yahoo Finance"""
-    logger.info(f"Fetching {ticker} data untuk {period}...")
+# Konfigurasi mode incremental (fine-tuning dari model yang sudah ada)
+MODEL_PATH = "stock_model.keras"
+SCALER_PATH = "scaler_ggrm.pkl"
+METADATA_PATH = "model_metadata.json"
+INCREMENTAL_EPOCHS = 5
+REPLAY_BARS = 250  # ~1 tahun bursa sebagai replay window agar model tidak melupakan pola lama
+FINETUNE_LEARNING_RATE = 1e-4
+FEATURES = ['Close', 'Open', 'High', 'Low', 'Volume', 'return1', 'ma7', 'ma21', 'std7']
+
+def fetch_ggrm_data(ticker=TICKER, period=PERIOD, start=None):
+    """Fetch data GGRM dari market data provider (seluruh period, atau sejak tanggal start)"""
+    logger.info(f"Fetching {ticker} data untuk {start or period}...")
     
     try:
-        df = yf.download(ticker, period=period, interval="1d", progress=False)
+        if start is not None:
+            df = fetch_history(ticker, start=start)
+        else:
+            df = fetch_history(ticker, period)
         
         if df.empty:
             raise ValueError(f"No data returned for {ticker}")
@@ -52,8 +71,12 @@ def fetch_ggrm_data(ticker=TICKER, period=PERIOD):
         print(f"ERROR: {e}")
         raise
 
-def prepare_data(df, seq_len=SEQ_LEN, horizon=HORIZON):
-    """Prepare data untuk training LSTM"""
+def prepare_data(df, seq_len=SEQ_LEN, horizon=HORIZON, batch_size=BATCH_SIZE):
+    """
+    Prepare tf.data datasets untuk training LSTM
+    Window dibuat lazy dari series Close yang sudah di-scale
+    Returns: (train_ds, train_eval_ds, test_ds, scaler, n_train)
+    """
     logger.info("Preparing data...")
     
     # Gunakan Close price
@@ -63,23 +86,30 @@ def prepare_data(df, seq_len=SEQ_LEN, horizon=HORIZON):
     scaler = MinMaxScaler(feature_range=(0, 1))
     data_scaled = scaler.fit_transform(data)
     
-    # Create sequences
-    X, y = [], []
-    for i in range(len(data_scaled) - seq_len - horizon + 1):
-        X.append(data_scaled[i:(i + seq_len)])
-        y.append(data_scaled[i + seq_len + horizon - 1])
+    # Target untuk window yang berakhir di index i: Close ter-scale di i + horizon - 1
+    n_rows = len(data_scaled)
+    targets = np.full(n_rows, np.nan)
+    targets[:n_rows - horizon + 1] = data_scaled[horizon - 1:, 0]
     
-    X = np.array(X)
-    y = np.array(y)
+    # Split train-test (80-20) berdasarkan jumlah window
+    n_windows = n_rows - seq_len - horizon + 1
+    n_train = int(n_windows * 0.8)
+    train_end = seq_len + n_train
+    windows_end = seq_len + n_windows
     
-    # Split train-test (80-20)
-    split = int(len(X) * 0.8)
-    X_train, X_test = X[:split], X[split:]
-    y_train, y_test = y[:split], y[split:]
+    train_ds = make_window_dataset(
+        data_scaled, targets, seq_len, seq_len, train_end, batch_size=batch_size, shuffle=True,
+        cache=cache_target(TRAIN_DATASET_CACHE, "retrain_train", data_scaled, targets, seq_len, seq_len, train_end)
+    )
+    train_eval_ds = make_window_dataset(data_scaled, targets, seq_len, seq_len, train_end, batch_size=batch_size)
+    test_ds = make_window_dataset(
+        data_scaled, targets, seq_len, train_end, windows_end, batch_size=batch_size,
+        cache=cache_target(TRAIN_DATASET_CACHE, "retrain_test", data_scaled, targets, seq_len, train_end, windows_end)
+    )
     
-    logger.info(f"✅ Data prepared: X_train={X_train.shape}, X_test={X_test.shape}")
+    logger.info(f"✅ Data prepared: train windows={n_train}, test windows={n_windows - n_train}")
     
-    return X_train, X_test, y_train, y_test, scaler
+    return train_ds, train_eval_ds, test_ds, scaler, n_train
 
 def build_model(seq_len=SEQ_LEN, input_shape=1):
     """Build LSTM model"""
@@ -99,28 +129,30 @@ def build_model(seq_len=SEQ_LEN, input_shape=1):
     
     return model
 
-def train_model(model, X_train, y_train, X_test, y_test, epochs=EPOCHS, batch_size=BATCH_SIZE):
+def train_model(model, train_ds, test_ds, n_train, epochs=EPOCHS):
     """Train model"""
     logger.info(f"Training model for {epochs} epochs...")
     
+    throughput = ThroughputCallback(n_train)
+    callbacks, run_summary = build_training_callbacks("retrain_ggrm", epochs)
     history = model.fit(
-        X_train, y_train,
+        train_ds,
         epochs=epochs,
-        batch_size=batch_size,
-        validation_data=(X_test, y_test),
+        validation_data=test_ds,
+        callbacks=callbacks + [throughput],
         verbose=1
     )
     
-    logger.info("✅ Training completed")
-    return history
+    summary = {**run_summary.summary(), **throughput.summary()}
+    logger.info(f"✅ Training completed ({summary})")
+    return history, summary
 
-def evaluate_model(model, X_test, y_test):
+def evaluate_model(model, train_eval_ds, test_ds):
     """Evaluate model"""
     logger.info("Evaluasi model...")
     
-    test_loss, test_mae = model.evaluate(X_test, y_test, verbose=0)
-    train_loss, train_mae = model.evaluate(X_test[:int(len(X_test)*0.8)], 
-                                          y_test[:int(len(y_test)*0.8)], verbose=0)
+    test_loss, test_mae = model.evaluate(test_ds, verbose=0)
+    train_loss, train_mae = model.evaluate(train_eval_ds, verbose=0)
     
     metrics = {
         'train_loss': float(train_loss),
@@ -144,42 +176,180 @@ def save_model_and_scaler(model, scaler, model_path="stock_model.keras", scaler_
     logger.info(f"✅ Model saved to {model_path}")
     logger.info(f"✅ Scaler saved to {scaler_path}")
 
-def main():
+def load_trained_date(metadata_path=METADATA_PATH):
+    """Tanggal training terakhir dari model_metadata.json (trained_date atau trained_at)"""
+    with open(metadata_path, 'r') as f:
+        metadata = json.load(f)
+    trained = metadata.get('trained_date') or metadata.get('trained_at')
+    if not trained:
+        raise ValueError(f"trained_date tidak ada di {metadata_path}")
+    return datetime.fromisoformat(trained), metadata
+
+def build_feature_matrix(df, n_features):
+    """Matriks fitur sesuai input model: 1 fitur (Close) atau 9 fitur teknikal"""
+    df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+    if n_features == 1:
+        return df[['Close']].values.astype(float), df.index
+    
+    df['return1'] = df['Close'].pct_change(1)
+    df['ma7'] = df['Close'].rolling(7).mean()
+    df['ma21'] = df['Close'].rolling(21).mean()
+    df['std7'] = df['Close'].rolling(7).std()
+    df = df.dropna()
+    return df[FEATURES].values.astype(float), df.index
+
+def check_scaler_drift(scaler, new_data):
+    """
+    Cek apakah data baru keluar dari range yang dipakai saat fit scaler.
+    Jika ya, perluas range scaler dengan partial_fit (range lama tetap tercakup).
+    Returns: (scaler, refitted)
+    """
+    below = new_data < scaler.data_min_
+    above = new_data > scaler.data_max_
+    if not (below.any() or above.any()):
+        return scaler, False
+    
+    drifted = np.where((below | above).any(axis=0))[0].tolist()
+    logger.warning(f"⚠️ Data baru di luar range scaler pada kolom {drifted}, refit scaler")
+    scaler.partial_fit(new_data)
+    return scaler, True
+
+def incremental_update(model_path=MODEL_PATH, scaler_path=SCALER_PATH, metadata_path=METADATA_PATH,
+                       epochs=INCREMENTAL_EPOCHS, replay_bars=REPLAY_BARS, snapshot=None):
+    """
+    Fine-tune model yang sudah ada dengan bar baru sejak trained_date
+    ditambah replay window dari data sebelumnya (dari snapshot jika diberikan)
+    """
+    trained_date, metadata = load_trained_date(metadata_path)
+    model = tf.keras.models.load_model(model_path, compile=False)
+    scaler = joblib.load(scaler_path)
+    n_features = model.input_shape[-1]
+    seq_len = model.input_shape[1] or SEQ_LEN
+    
+    # Ambil cukup bar untuk replay + satu window + warm-up rolling feature (hari kalender ≈ 7/5 hari bursa)
+    lookback_bars = replay_bars + seq_len + 21
+    start = (trained_date - timedelta(days=int(lookback_bars * 7 / 5) + 10)).date()
+    df = snapshot.frame(start=start) if snapshot is not None else fetch_ggrm_data(TICKER, start=start)
+    
+    data, dates = build_feature_matrix(df, n_features)
+    index = dates.tz_localize(None) if dates.tz is not None else dates
+    new_mask = np.asarray(index > pd.Timestamp(trained_date.date()))
+    n_new = int(new_mask.sum())
+    if n_new == 0:
+        logger.info(f"✅ Tidak ada bar baru sejak {trained_date.date()}, model sudah up to date")
+        return None
+    logger.info(f"{n_new} bar baru sejak {trained_date.date()}, replay {replay_bars} bar")
+    
+    # Pertahankan scaler lama kecuali data baru keluar dari range-nya
+    scaler, scaler_refitted = check_scaler_drift(scaler, data[new_mask])
+    data_scaled = scaler.transform(data)
+    
+    # Window: replay + data baru; target = Close ter-scale di bar berikutnya
+    first_new = int(np.argmax(new_mask))
+    window_start = max(seq_len, first_new - replay_bars)
+    n_rows = len(data_scaled)
+    targets = np.full(n_rows, np.nan)
+    targets[:n_rows - HORIZON + 1] = data_scaled[HORIZON - 1:, 0]
+    windows_end = n_rows - HORIZON + 1
+    
+    # Validasi pada window terbaru
+    n_windows = windows_end - window_start
+    if n_windows < 2:
+        raise ValueError(f"Data tidak cukup untuk fine-tuning: {n_windows} window")
+    n_val = max(1, n_windows // 10)
+    val_start = windows_end - n_val
+    
+    train_ds = make_window_dataset(data_scaled, targets, seq_len, window_start, val_start,
+                                   batch_size=BATCH_SIZE, shuffle=True)
+    val_ds = make_window_dataset(data_scaled, targets, seq_len, val_start, windows_end, batch_size=BATCH_SIZE)
+    
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=FINETUNE_LEARNING_RATE),
+                  loss='mse', metrics=['mae'])
+    callbacks, run_summary = build_training_callbacks("retrain_ggrm_incremental", epochs, resume=False)
+    model.fit(train_ds, epochs=epochs, validation_data=val_ds, callbacks=callbacks, verbose=1)
+    
+    val_loss, val_mae = model.evaluate(val_ds, verbose=0)
+    save_model_and_scaler(model, scaler, model_path, scaler_path)
+    
+    now = datetime.now().isoformat()
+    update = {
+        'trained_at': now,
+        'base_trained_date': trained_date.isoformat(),
+        'new_bars': n_new,
+        'replay_bars': first_new - window_start,
+        'scaler_refitted': scaler_refitted,
+        'dataset_snapshot': snapshot.manifest['name'] if snapshot is not None else None,
+        'val_loss': float(val_loss),
+        'val_mae': float(val_mae),
+        'training_summary': run_summary.summary()
+    }
+    metadata['trained_date'] = now
+    metadata['trained_at'] = now
+    metadata['incremental_updates'] = (metadata.get('incremental_updates', []) + [update])[-30:]
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    
+    logger.info(f"✅ Incremental update selesai: {update}")
+    return update
+
+def main(argv=None):
     """Main training pipeline"""
+    parser = argparse.ArgumentParser(description="Retrain model GGRM")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fine-tune stock_model.keras dengan bar baru sejak trained_date")
+    parser.add_argument("--epochs", type=int, default=None, help="Jumlah epoch (override)")
+    parser.add_argument("--snapshot", default=DATASET_SNAPSHOT or None,
+                        help="Snapshot dari dataset_snapshot.py (path, nama, atau ticker) sebagai ganti download")
+    args = parser.parse_args(argv)
+    
     try:
         logger.info("="*60)
         logger.info("GGRM MODEL RETRAINING PIPELINE")
         logger.info("="*60)
         
-        # Fetch data
-        df = fetch_ggrm_data(TICKER, PERIOD)
+        snapshot = load_snapshot(args.snapshot) if args.snapshot else None
+        
+        if args.incremental:
+            if not (os.path.exists(MODEL_PATH) and os.path.exists(METADATA_PATH)):
+                raise FileNotFoundError(f"Mode incremental butuh {MODEL_PATH} dan {METADATA_PATH}")
+            incremental_update(epochs=args.epochs or INCREMENTAL_EPOCHS, snapshot=snapshot)
+            return
+        
+        epochs = args.epochs or EPOCHS
+        
+        # Fetch data (bar OHLCV dari snapshot tanpa download jika --snapshot)
+        df = snapshot.frame() if snapshot is not None else fetch_ggrm_data(TICKER, PERIOD)
         
         # Prepare data
-        X_train, X_test, y_train, y_test, scaler = prepare_data(df, SEQ_LEN, HORIZON)
+        train_ds, train_eval_ds, test_ds, scaler, n_train = prepare_data(df, SEQ_LEN, HORIZON, BATCH_SIZE)
         
         # Build model
         model = build_model(SEQ_LEN, input_shape=1)
         
         # Train model
-        history = train_model(model, X_train, y_train, X_test, y_test, EPOCHS, BATCH_SIZE)
+        history, training_summary = train_model(model, train_ds, test_ds, n_train, epochs)
         
         # Evaluate model
-        metrics = evaluate_model(model, X_test, y_test)
+        metrics = evaluate_model(model, train_eval_ds, test_ds)
         
         # Save model
-        save_model_and_scaler(model, scaler)
+        save_model_and_scaler(model, scaler, MODEL_PATH, SCALER_PATH)
         
         # Save metrics
-        with open('model_metadata.json', 'w') as f:
+        trained_at = datetime.now().isoformat()
+        with open(METADATA_PATH, 'w') as f:
             json.dump({
                 'ticker': TICKER,
-                'period': PERIOD,
+                'period': snapshot.manifest['period'] if snapshot is not None else PERIOD,
+                'dataset_snapshot': snapshot.manifest['name'] if snapshot is not None else None,
                 'seq_len': SEQ_LEN,
                 'horizon': HORIZON,
-                'epochs': EPOCHS,
+                'epochs': epochs,
                 'batch_size': BATCH_SIZE,
                 'metrics': metrics,
-                'trained_at': datetime.now().isoformat()
+                'training_summary': training_summary,
+                'trained_date': trained_at,
+                'trained_at': trained_at
             }, f, indent=2)
         
         logger.info("="*60)
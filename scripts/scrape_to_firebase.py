@@ -6,11 +6,12 @@ Usage: python scrape_to_firebase.py
 import os
 import firebase_admin
 from firebase_admin import credentials, firestore
-import yfinance as yf
 import pandas as pd
 import logging
 from datetime import datetime
 
+from market_data import get_provider
+
 # Setup logger
 logging.basicConfig(
     level=logging.INFO,
@@ -34,6 +35,9 @@ if not FIREBASE_CRED_PATH:
             FIREBASE_CRED_PATH = path
             break
 
+# Sumber data yang di-ingest ke Firestore (default yfinance)
+SCRAPER_SOURCE = os.getenv("SCRAPER_SOURCE", "yfinance")
+
 # Ticker yang akan di-scrape
 TICKERS = ["GGRM.JK", "BBRI.JK", "TLKM.JK", "UNVR.JK", "ASII.JK"]
 
@@ -52,13 +56,10 @@ def init_firebase():
     return firestore_client
 
 def fetch_stock_data(ticker: str, period: str = "1y") -> pd.DataFrame:
-    """Fetch stock data dari yfinance"""
+    """Fetch stock data dari provider sumber (default yfinance)"""
     try:
         logger.info(f"Fetching {ticker} data...")
-        df = yf.download(ticker, period=period, interval="1d", progress=False)
-        if df.empty:
-            logger.warning(f"No data for {ticker}")
-            return None
+        df = get_provider(SCRAPER_SOURCE).history(ticker, period)
         logger.info(f"Fetched {len(df)} rows for {ticker}")
         return df
     except Exception as e:
@@ -0,0 +1,321 @@
+"""
+Training satu model global untuk banyak ticker IDX
+- Per ticker: snapshot dataset_snapshot.py (scaler sendiri), di-memory-map
+- Input pipeline: window tiap ticker dibaca lazy dari memmap dan di-interleave dengan
+  tf.data.Dataset.sample_from_datasets, jadi tensor gabungan tidak pernah dimaterialisasi
+  (RAM terbatas walau ratusan ticker)
+- Opsional embedding ticker (--embedding-dim); untuk serving, embedding dilipat ke bias
+  Dense sehingga tiap ticker mendapat model Sequential biasa yang kompatibel dengan ModelRegistry
+Usage:
+    python train_global.py                                  # TICKERS dari scrape_to_firebase.py
+    python train_global.py --tickers-file idx.txt --embedding-dim 8 --output-dir models_global
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import joblib
+
+from dataset_snapshot import build_snapshot, load_snapshot, resolve_snapshot, DATASET_DIR
+from model_registry import ModelRegistry
+
+logger = logging.getLogger("train_global")
+
+PERIOD = "5y"
+SEQ_LEN = 60
+EPOCHS = 50
+BATCH_SIZE = 64
+TRAIN_RATIO = 0.8
+LSTM_UNITS = (128, 64, 32)
+DROPOUT = 0.2
+DENSE_UNITS = 16
+OUTPUT_DIR = os.getenv("GLOBAL_MODEL_DIR", "models_global")
+GLOBAL_MODEL_FILE = "stock_model_global.keras"
+SNAPSHOT_WORKERS = 4
+
+
+def load_ticker_list(tickers=None, tickers_file=None) -> list:
+    """Ticker dari argumen, file (satu per baris, # komentar), atau scrape_to_firebase.TICKERS"""
+    if tickers_file:
+        with open(tickers_file, "r") as f:
+            return [line.split("#")[0].strip() for line in f if line.split("#")[0].strip()]
+    if tickers:
+        return list(tickers)
+    from scrape_to_firebase import TICKERS
+    return list(TICKERS)
+
+
+def prepare_snapshots(tickers, period=PERIOD, seq_len=SEQ_LEN, root=DATASET_DIR, reuse=False) -> list:
+    """Build (atau pakai ulang) snapshot per ticker; ticker yang gagal di-skip"""
+    def _one(ticker):
+        if reuse:
+            try:
+                return load_snapshot(resolve_snapshot(ticker, root))
+            except FileNotFoundError:
+                pass
+        return load_snapshot(build_snapshot(ticker, period, root, seq_len))
+
+    snapshots = []
+    with ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS) as pool:
+        futures = {ticker: pool.submit(_one, ticker) for ticker in tickers}
+        for ticker, future in futures.items():
+            try:
+                snapshot = future.result()
+                snapshot.check_seq_len(seq_len)
+                snapshots.append(snapshot)
+            except Exception as e:
+                logger.warning(f"Ticker {ticker} di-skip: {e}")
+    if not snapshots:
+        raise RuntimeError("Tidak ada snapshot ticker yang bisa dipakai")
+    logger.info(f"{len(snapshots)}/{len(tickers)} ticker siap, "
+                f"{sum(len(s.windows) for s in snapshots)} window total")
+    return snapshots
+
+
+def ticker_window_dataset(snapshot, ticker_id, start, end, with_ticker_id=False, shuffle=False, seed=None):
+    """
+    Dataset window satu ticker tanpa batch: X = scaled[i - seq_len:i], y = next_close_scaled[i].
+    Yang di-shuffle adalah index (int64), bukan window, sehingga buffer shuffle tetap kecil
+    """
+    import tensorflow as tf
+
+    features, targets = snapshot.scaled, snapshot.next_close_scaled
+    seq_len, n_features = snapshot.seq_len, features.shape[1]
+
+    def _read_window(i):
+        i = int(i)
+        return np.asarray(features[i - seq_len:i], dtype=np.float32), np.float32(targets[i])
+
+    def _window(i):
+        x, y = tf.numpy_function(_read_window, [i], (tf.float32, tf.float32))
+        x.set_shape((seq_len, n_features))
+        y.set_shape(())
+        if with_ticker_id:
+            return (x, tf.constant(ticker_id, dtype=tf.int32)), y
+        return x, y
+
+    indices = tf.data.Dataset.range(start, end)
+    if shuffle:
+        indices = indices.shuffle(end - start, seed=seed, reshuffle_each_iteration=True)
+    return indices.map(_window, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def make_global_datasets(snapshots, batch_size=BATCH_SIZE, train_ratio=TRAIN_RATIO,
+                         with_ticker_id=False, seed=42) -> tuple:
+    """
+    Train/val dataset gabungan: sample_from_datasets dengan bobot sebanding jumlah window
+    tiap ticker; split per ticker secara kronologis (window awal train, akhir val)
+    Returns: (train_ds, val_ds, n_train, splits)
+    """
+    import tensorflow as tf
+
+    train_sources, val_sources, weights, splits = [], [], [], []
+    for ticker_id, snapshot in enumerate(snapshots):
+        start, train_end, end = snapshot.split(train_ratio)
+        splits.append((start, train_end, end))
+        train_sources.append(ticker_window_dataset(snapshot, ticker_id, start, train_end,
+                                                   with_ticker_id, shuffle=True, seed=seed + ticker_id))
+        val_sources.append(ticker_window_dataset(snapshot, ticker_id, train_end, end, with_ticker_id))
+        weights.append(train_end - start)
+
+    n_train = int(sum(weights))
+    probs = (np.asarray(weights, dtype=np.float64) / n_train).tolist()
+    train_ds = tf.data.Dataset.sample_from_datasets(train_sources, weights=probs, seed=seed)
+    # Validasi deterministik: semua window val, ticker demi ticker
+    val_ds = val_sources[0]
+    for source in val_sources[1:]:
+        val_ds = val_ds.concatenate(source)
+
+    train_ds = train_ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+    val_ds = val_ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+    return train_ds, val_ds, n_train, splits
+
+
+def build_global_model(seq_len, n_features, n_tickers=0, embedding_dim=0,
+                       units=LSTM_UNITS, dropout=DROPOUT, dense_units=DENSE_UNITS):
+    """
+    LSTM bertumpuk; jika embedding_dim > 0, embedding ticker di-concat ke output LSTM
+    sebelum Dense (bisa dilipat ke bias Dense saat export per ticker)
+    """
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    seq_in = layers.Input(shape=(seq_len, n_features), name="window")
+    x = seq_in
+    for i, n in enumerate(units):
+        x = layers.LSTM(n, return_sequences=i < len(units) - 1, name=f"lstm_{i}")(x)
+        x = layers.Dropout(dropout, name=f"dropout_{i}")(x)
+
+    inputs = seq_in
+    if embedding_dim > 0:
+        id_in = layers.Input(shape=(), dtype="int32", name="ticker_id")
+        emb = layers.Embedding(n_tickers, embedding_dim, name="ticker_embedding")(id_in)
+        x = layers.Concatenate(name="concat_ticker")([x, emb])
+        inputs = [seq_in, id_in]
+
+    x = layers.Dense(dense_units, activation="relu", name="dense_hidden")(x)
+    out = layers.Dense(1, name="dense_out")(x)
+
+    model = tf.keras.Model(inputs, out, name="global_lstm")
+    model.compile(optimizer="adam", loss="mse", metrics=["mae"])
+    return model
+
+
+def export_ticker_model(global_model, ticker_id=None):
+    """
+    Model Sequential satu ticker (input (seq_len, n_features) saja) dengan bobot global.
+    Dense(concat(h, e)) = W_h h + (b + W_e e), jadi embedding ticker dilipat ke bias dense_hidden.
+    """
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    lstm_layers = [l for l in global_model.layers if isinstance(l, layers.LSTM)]
+    dropout_layers = [l for l in global_model.layers if isinstance(l, layers.Dropout)]
+    hidden = global_model.get_layer("dense_hidden")
+    out = global_model.get_layer("dense_out")
+    _, seq_len, n_features = global_model.get_layer("window").output.shape
+
+    model = tf.keras.Sequential([layers.Input(shape=(seq_len, n_features))] + [
+        layer for lstm, drop in zip(lstm_layers, dropout_layers)
+        for layer in (layers.LSTM(lstm.units, return_sequences=lstm.return_sequences),
+                      layers.Dropout(drop.rate))
+    ] + [layers.Dense(hidden.units, activation="relu"), layers.Dense(1)])
+
+    for target, source in zip([l for l in model.layers if isinstance(l, layers.LSTM)], lstm_layers):
+        target.set_weights(source.get_weights())
+
+    kernel, bias = hidden.get_weights()
+    lstm_out = lstm_layers[-1].units
+    if ticker_id is not None and kernel.shape[0] > lstm_out:
+        embedding = global_model.get_layer("ticker_embedding").get_weights()[0][ticker_id]
+        bias = bias + embedding @ kernel[lstm_out:]
+    dense_layers = [l for l in model.layers if isinstance(l, layers.Dense)]
+    dense_layers[0].set_weights([kernel[:lstm_out], bias])
+    dense_layers[1].set_weights(out.get_weights())
+    return model
+
+
+def evaluate_per_ticker(global_model, snapshots, splits, with_ticker_id, batch_size=BATCH_SIZE) -> dict:
+    """MSE/MAE val (skala scaler masing-masing ticker) per ticker"""
+    metrics = {}
+    for ticker_id, (snapshot, (_, train_end, end)) in enumerate(zip(snapshots, splits)):
+        ds = ticker_window_dataset(snapshot, ticker_id, train_end, end, with_ticker_id).batch(batch_size)
+        loss, mae = global_model.evaluate(ds, verbose=0)
+        metrics[snapshot.ticker] = {"val_loss": float(loss), "val_mae": float(mae),
+                                    "val_windows": int(end - train_end)}
+    return metrics
+
+
+def save_artifacts(global_model, snapshots, splits, per_ticker, output_dir, summary, export_tickers=True):
+    """
+    Simpan model global + scaler, model dan metadata per ticker dengan penamaan ModelRegistry
+    (MODEL_DIR=output_dir langsung bisa dipakai backend). Metadata berisi drift_reference:
+    histogram fitur baris training ticker tersebut di atas range scaler-nya
+    """
+    from monitor import FeatureDriftMonitor
+
+    os.makedirs(output_dir, exist_ok=True)
+    global_path = os.path.join(output_dir, GLOBAL_MODEL_FILE)
+    global_model.save(global_path)
+    with_embedding = any(l.name == "ticker_embedding" for l in global_model.layers)
+
+    naming = ModelRegistry(model_dir=output_dir, backend="keras")
+    trained_at = datetime.now().isoformat()
+    for ticker_id, (snapshot, (_, train_end, _)) in enumerate(zip(snapshots, splits)):
+        paths = naming.artifact_paths(snapshot.ticker)
+        joblib.dump(snapshot.scaler, paths["scaler"])
+        if export_tickers:
+            export_ticker_model(global_model, ticker_id if with_embedding else None).save(paths["model"])
+        with open(paths["metadata"], "w") as f:
+            json.dump({
+                "ticker": snapshot.ticker,
+                "model_type": "global",
+                "global_model": GLOBAL_MODEL_FILE,
+                "ticker_id": ticker_id,
+                "ticker_embedding": with_embedding,
+                "dataset_snapshot": snapshot.manifest["name"],
+                "seq_len": snapshot.seq_len,
+                "metrics": per_ticker.get(snapshot.ticker),
+                "training_summary": summary,
+                "trained_date": trained_at,
+                "trained_at": trained_at,
+                "drift_reference": FeatureDriftMonitor.training_reference(
+                    snapshot.scaler, snapshot.features[:train_end]
+                ),
+            }, f, indent=2)
+
+    with open(os.path.join(output_dir, "global_model_metadata.json"), "w") as f:
+        json.dump({
+            "tickers": [s.ticker for s in snapshots],
+            "ticker_embedding": with_embedding,
+            "snapshots": {s.ticker: s.manifest["name"] for s in snapshots},
+            "metrics": per_ticker,
+            "training_summary": summary,
+            "trained_at": trained_at,
+        }, f, indent=2)
+    logger.info(f"✅ Model global dan artifact {len(snapshots)} ticker disimpan ke {output_dir}")
+
+
+def train_global(tickers, period=PERIOD, epochs=EPOCHS, batch_size=BATCH_SIZE, embedding_dim=0,
+                 output_dir=OUTPUT_DIR, snapshot_root=DATASET_DIR, reuse_snapshots=False, export_tickers=True):
+    from training_pipeline import ThroughputCallback, build_training_callbacks
+
+    snapshots = prepare_snapshots(tickers, period, SEQ_LEN, snapshot_root, reuse_snapshots)
+    with_ticker_id = embedding_dim > 0
+    train_ds, val_ds, n_train, splits = make_global_datasets(snapshots, batch_size, with_ticker_id=with_ticker_id)
+
+    n_features = snapshots[0].scaled.shape[1]
+    model = build_global_model(SEQ_LEN, n_features, len(snapshots), embedding_dim)
+    logger.info(f"Model global: {model.count_params()} parameter, {len(snapshots)} ticker, "
+                f"embedding {embedding_dim or 'off'}")
+
+    throughput = ThroughputCallback(n_train)
+    callbacks, run_summary = build_training_callbacks("train_global", epochs)
+    model.fit(train_ds, epochs=epochs, validation_data=val_ds, callbacks=callbacks + [throughput], verbose=1)
+
+    summary = {**run_summary.summary(), **throughput.summary(), "n_tickers": len(snapshots),
+               "train_windows": n_train, "embedding_dim": embedding_dim}
+    per_ticker = evaluate_per_ticker(model, snapshots, splits, with_ticker_id, batch_size)
+    save_artifacts(model, snapshots, splits, per_ticker, output_dir, summary, export_tickers)
+    return summary, per_ticker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Training model global multi-ticker")
+    parser.add_argument("--tickers", nargs="+", default=None)
+    parser.add_argument("--tickers-file", default=None, help="File daftar ticker (satu per baris)")
+    parser.add_argument("--period", default=PERIOD)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--embedding-dim", type=int, default=0, help="0 = tanpa embedding ticker")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--snapshot-root", default=DATASET_DIR)
+    parser.add_argument("--reuse-snapshots", action="store_true",
+                        help="Pakai snapshot terbaru per ticker jika ada (tanpa download)")
+    parser.add_argument("--no-export-tickers", action="store_true",
+                        help="Hanya simpan model global (tanpa model Sequential per ticker)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        tickers = load_ticker_list(args.tickers, args.tickers_file)
+        logger.info(f"Training global untuk {len(tickers)} ticker")
+        summary, per_ticker = train_global(
+            tickers, args.period, args.epochs, args.batch_size, args.embedding_dim,
+            args.output_dir, args.snapshot_root, args.reuse_snapshots, not args.no_export_tickers
+        )
+        logger.info(f"✅ Training global selesai: {summary}")
+        return 0
+    except Exception as e:
+        logger.error(f"❌ Training global gagal: {e}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
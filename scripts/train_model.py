@@ -1,4 +1,3 @@
-import yfinance as yf
 import numpy as np
 import pandas as pd
 import tensorflow as tf
@@ -7,8 +6,16 @@ from tensorflow.keras.layers import LSTM, Dense, Dropout
 from sklearn.preprocessing import MinMaxScaler
 import joblib
 import logging
+import argparse
 from datetime import datetime, timedelta
 
+from market_data import fetch_history
+from dataset_snapshot import load_snapshot, DATASET_SNAPSHOT
+from monitor import FeatureDriftMonitor
+from training_pipeline import (
+    make_window_dataset, cache_target, ThroughputCallback, build_training_callbacks, TRAIN_DATASET_CACHE
+)
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -21,20 +28,24 @@ TICKER = "GGRM.JK"   # saham Gudang Garam
 PERIOD = "5y"
 SEQ_LEN = 60
 HORIZON = 1
+EPOCHS = 50
+BATCH_SIZE = 32
 MAX_RETRIES = 3
 RETRY_DELAY = 2
 
 def fetch_and_prepare(ticker=TICKER, period=PERIOD):
     """
-    Fetch data GGRM dari Yahoo Finance dan prepare sequences untuk LSTM
-    dengan error handling dan retry logic
+    Fetch data GGRM dari Yahoo Finance dan prepare series untuk LSTM
+    dengan error handling dan retry logic.
+    Window (SEQ_LEN, features) dibuat lazy oleh training_pipeline.make_window_dataset:
+    sample ke-i memakai data_scaled[i-SEQ_LEN:i] dengan target targets[i]
     """
     logger.info(f"Fetching data untuk {ticker} dengan periode {period}...")
     
     df = None
     for attempt in range(MAX_RETRIES):
         try:
-            df = yf.download(ticker, period=period, interval="1d", progress=False)
+            df = fetch_history(ticker, period)
             if not df.empty:
                 logger.info(f"Data berhasil diunduh: {len(df)} rows")
                 break
@@ -85,37 +96,58 @@ def fetch_and_prepare(ticker=TICKER, period=PERIOD):
     targets = targets[idx]
     
     logger.info(f"Shapes → data: {data_scaled.shape}, targets: {targets.shape}")
+    return data_scaled, targets, df, scaler
 
-    # Create sequences
-    X, y = [], []
-    for i in range(SEQ_LEN, len(data_scaled)):
-        X.append(data_scaled[i-SEQ_LEN:i])
-        y.append(targets[i])
-    
-    X = np.array(X)
-    y = np.array(y)
-    
-    logger.info(f"Final shapes → X: {X.shape}, y: {y.shape}")
-    return X, y, df, scaler
+def load_prepared_snapshot(ref=None):
+    """
+    Seperti fetch_and_prepare, tetapi dari snapshot dataset_snapshot.py:
+    fitur ter-scale dan target di-memory-map (tanpa download dan tanpa copy)
+    Returns: (data_scaled, targets, windows_end, snapshot)
+    """
+    snapshot = load_snapshot(ref)
+    snapshot.check_seq_len(SEQ_LEN)
+    joblib.dump(snapshot.scaler, 'scaler_ggrm.pkl')
+    logger.info("Scaler snapshot disimpan ke scaler_ggrm.pkl")
+    # Baris terakhir tidak punya target; window valid berakhir di windows_end
+    return snapshot.scaled, snapshot.next_close, snapshot.split()[2], snapshot
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Training model LSTM GGRM")
+    parser.add_argument("--snapshot", default=DATASET_SNAPSHOT or None,
+                        help="Snapshot dari dataset_snapshot.py (path, nama, atau ticker) sebagai ganti download")
+    args = parser.parse_args()
+
     try:
         # Ambil data GGRM
-        X, y, df_full, scaler = fetch_and_prepare()
-        logger.info(f"Data siap untuk training: X={X.shape}, y={y.shape}")
-
-        # Split data
-        train_size = int(len(X) * 0.8)
-        X_train, X_test = X[:train_size], X[train_size:]
-        y_train, y_test = y[:train_size], y[train_size:]
-        
-        logger.info(f"Train shapes: X={X_train.shape}, y={y_train.shape}")
-        logger.info(f"Test shapes: X={X_test.shape}, y={y_test.shape}")
+        if args.snapshot:
+            data_scaled, targets, windows_end, snapshot = load_prepared_snapshot(args.snapshot)
+            data_rows, snapshot_name = snapshot.manifest['rows'], snapshot.manifest['name']
+        else:
+            data_scaled, targets, df_full, scaler = fetch_and_prepare()
+            windows_end = len(data_scaled)
+            data_rows, snapshot_name = len(df_full), None
+        n_windows = windows_end - SEQ_LEN
+        logger.info(f"Data siap untuk training: {n_windows} windows, {data_scaled.shape[1]} features")
+
+        # Split data (80% window pertama untuk training)
+        train_size = int(n_windows * 0.8)
+        train_end = SEQ_LEN + train_size
+        logger.info(f"Train windows: {train_size}, Test windows: {n_windows - train_size}")
+
+        train_ds = make_window_dataset(
+            data_scaled, targets, SEQ_LEN, SEQ_LEN, train_end, batch_size=BATCH_SIZE, shuffle=True,
+            cache=cache_target(TRAIN_DATASET_CACHE, "train", data_scaled, targets, SEQ_LEN, SEQ_LEN, train_end)
+        )
+        train_eval_ds = make_window_dataset(data_scaled, targets, SEQ_LEN, SEQ_LEN, train_end, batch_size=BATCH_SIZE)
+        test_ds = make_window_dataset(
+            data_scaled, targets, SEQ_LEN, train_end, windows_end, batch_size=BATCH_SIZE,
+            cache=cache_target(TRAIN_DATASET_CACHE, "test", data_scaled, targets, SEQ_LEN, train_end, windows_end)
+        )
 
         # Bangun model LSTM untuk GGRM
         logger.info("Building LSTM model untuk prediksi GGRM...")
         model = Sequential([
-            LSTM(128, return_sequences=True, input_shape=(X.shape[1], X.shape[2])),
+            LSTM(128, return_sequences=True, input_shape=(SEQ_LEN, data_scaled.shape[1])),
             Dropout(0.2),
             LSTM(64, return_sequences=True),
             Dropout(0.2),
@@ -130,34 +162,48 @@ if __name__ == "__main__":
 
         # Training model
         logger.info("Memulai training...")
+        throughput = ThroughputCallback(train_size)
+        callbacks, run_summary = build_training_callbacks("train_model_ggrm", EPOCHS)
         history = model.fit(
-            X_train, y_train,
-            epochs=50,
-            batch_size=32,
-            validation_data=(X_test, y_test),
+            train_ds,
+            epochs=EPOCHS,
+            validation_data=test_ds,
+            callbacks=callbacks + [throughput],
             verbose=1
         )
+        logger.info(f"Training summary: {run_summary.summary()}")
 
         # Evaluasi
         logger.info("Mengevaluasi model...")
-        train_loss, train_mae = model.evaluate(X_train, y_train, verbose=0)
-        test_loss, test_mae = model.evaluate(X_test, y_test, verbose=0)
+        train_loss, train_mae = model.evaluate(train_eval_ds, verbose=0)
+        test_loss, test_mae = model.evaluate(test_ds, verbose=0)
         
         logger.info(f"Train Loss: {train_loss:.6f}, MAE: {train_mae:.6f}")
         logger.info(f"Test Loss: {test_loss:.6f}, MAE: {test_mae:.6f}")
+        logger.info(f"Throughput: {throughput.summary()}")
 
         # Simpan model
         model.save("stock_model.keras", save_format="keras")
         logger.info("Model disimpan ke stock_model.keras")
         
+        # Referensi drift backend = histogram fitur baris training di atas range scaler
+        model_scaler = snapshot.scaler if args.snapshot else scaler
+        drift_reference = FeatureDriftMonitor.training_reference(
+            model_scaler, model_scaler.inverse_transform(np.asarray(data_scaled[:train_end], dtype=float))
+        )
+        
         # Simpan metadata
         metadata = {
             'ticker': TICKER,
             'trained_date': datetime.now().isoformat(),
-            'data_rows': len(df_full),
+            'data_rows': data_rows,
+            'dataset_snapshot': snapshot_name,
             'seq_len': SEQ_LEN,
             'train_loss': float(train_loss),
-            'test_loss': float(test_loss)
+            'test_loss': float(test_loss),
+            'throughput': throughput.summary(),
+            'training_summary': run_summary.summary(),
+            'drift_reference': drift_reference
         }
         import json
         with open('model_metadata.json', 'w') as f:
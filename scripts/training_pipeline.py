@@ -0,0 +1,308 @@
+"""
+Input pipeline tf.data untuk training LSTM
+Window dibuat lazy dari series dasar, jadi array X 3D (samples, SEQ_LEN, features)
+tidak perlu dimaterialisasi di memori
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+SHUFFLE_BUFFER = int(os.getenv("SHUFFLE_BUFFER", "2048"))
+# "" = tanpa cache, "memory" = cache di RAM, selain itu = direktori cache di disk
+TRAIN_DATASET_CACHE = os.getenv("TRAIN_DATASET_CACHE", "")
+
+# Early stopping & checkpointing (patience 0 = early stopping dimatikan)
+EARLY_STOPPING_PATIENCE = int(os.getenv("EARLY_STOPPING_PATIENCE", "8"))
+EARLY_STOPPING_MIN_DELTA = float(os.getenv("EARLY_STOPPING_MIN_DELTA", "0.0"))
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints")
+CHECKPOINT_EVERY_EPOCHS = int(os.getenv("CHECKPOINT_EVERY_EPOCHS", "5"))
+RESUME_TRAINING = os.getenv("RESUME_TRAINING", "1") == "1"
+FINGERPRINT_CHUNK_ROWS = 65536
+
+
+def data_fingerprint(features, targets, seq_len: int, start: int, end: int) -> str:
+    """
+    Hash pendek isi baris yang dipakai window [start, end): features[start - seq_len:end]
+    dan targets[start:end]. Dibaca per chunk agar memmap besar tidak disalin sekaligus
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    lo = max(int(start) - seq_len, 0)
+    for array, a, b in ((features, lo, int(end)), (targets, int(start), int(end))):
+        digest.update(f"{np.asarray(array).dtype}{np.shape(array)[1:]}".encode())
+        for i in range(a, b, FINGERPRINT_CHUNK_ROWS):
+            digest.update(np.ascontiguousarray(array[i:min(i + FINGERPRINT_CHUNK_ROWS, b)]).tobytes())
+    return digest.hexdigest()
+
+
+def cache_target(cache, name: str, features, targets, seq_len: int, start: int, end: int):
+    """
+    Terjemahkan konfigurasi cache ke argumen untuk make_window_dataset.
+    Nama file memuat parameter window dan fingerprint data (data_fingerprint) supaya cache lama
+    tidak terpakai untuk split lain atau setelah data berubah (download baru, scaler di-fit ulang).
+    """
+    if not cache:
+        return None
+    if cache == "memory":
+        return "memory"
+    os.makedirs(cache, exist_ok=True)
+    fingerprint = data_fingerprint(features, targets, seq_len, start, end)
+    return os.path.join(cache, f"{name}_seq{seq_len}_{start}_{end}_{fingerprint}")
+
+
+def make_window_dataset(features, targets, seq_len, start, end, batch_size=32,
+                        shuffle=False, shuffle_buffer=SHUFFLE_BUFFER, cache=None, seed=None):
+    """
+    Dataset (X, y) dengan X = features[i - seq_len:i] dan y = targets[i] untuk i di [start, end)
+
+    features: array 2D (rows, n_features); boleh np.memmap untuk data yang lebih besar dari RAM
+    targets: array 1D sepanjang rows
+    cache: None, "memory", atau path file cache di disk (lihat cache_target)
+    """
+    start = max(int(start), seq_len)
+    end = int(end)
+    if end <= start:
+        raise ValueError(f"Range window kosong: start={start}, end={end}")
+
+    n_features = features.shape[1]
+    indices = tf.data.Dataset.range(start, end)
+
+    if isinstance(features, np.memmap) or isinstance(targets, np.memmap):
+        # Slice lewat numpy supaya hanya window yang dibutuhkan yang dibaca dari disk
+        def _read_window(i):
+            i = int(i)
+            x = np.asarray(features[i - seq_len:i], dtype=np.float32)
+            y = np.float32(targets[i])
+            return x, y
+
+        def _window(i):
+            x, y = tf.numpy_function(_read_window, [i], (tf.float32, tf.float32))
+            x.set_shape((seq_len, n_features))
+            y.set_shape(())
+            return x, y
+    else:
+        base = tf.constant(np.asarray(features, dtype=np.float32))
+        labels = tf.constant(np.asarray(targets, dtype=np.float32).reshape(-1))
+
+        def _window(i):
+            return base[i - seq_len:i], labels[i]
+
+    ds = indices.map(_window, num_parallel_calls=tf.data.AUTOTUNE)
+
+    if cache == "memory":
+        ds = ds.cache()
+    elif cache:
+        ds = ds.cache(cache)
+
+    if shuffle:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """Catat throughput training step (samples/detik) per epoch, tanpa waktu validasi"""
+
+    def __init__(self, n_samples: int):
+        super().__init__()
+        self.n_samples = n_samples
+        self.samples_per_sec = []
+        self._epoch_start = None
+        self._last_batch_end = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._last_batch_end = self._epoch_start
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._last_batch_end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = self._last_batch_end - self._epoch_start
+        sps = self.n_samples / elapsed if elapsed > 0 else 0.0
+        self.samples_per_sec.append(sps)
+        if logs is not None:
+            logs["samples_per_sec"] = sps
+        logger.info(f"Epoch {epoch + 1}: {sps:,.0f} samples/sec")
+
+    def summary(self) -> dict:
+        if not self.samples_per_sec:
+            return {}
+        # Epoch pertama termasuk tracing graph, jadi tidak dihitung di rata-rata
+        steady = self.samples_per_sec[1:] or self.samples_per_sec
+        return {
+            "samples_per_sec_mean": float(np.mean(steady)),
+            "samples_per_sec_last": float(self.samples_per_sec[-1]),
+            "samples_per_sec_first_epoch": float(self.samples_per_sec[0]),
+        }
+
+
+class PeriodicCheckpoint(tf.keras.callbacks.Callback):
+    """Simpan model lengkap setiap N epoch ke run_dir/epoch_XXX.keras"""
+
+    def __init__(self, run_dir: str, every: int):
+        super().__init__()
+        self.run_dir = run_dir
+        self.every = every
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.every > 0 and (epoch + 1) % self.every == 0:
+            path = os.path.join(self.run_dir, f"epoch_{epoch + 1:03d}.keras")
+            self.model.save(path)
+            logger.info(f"Checkpoint disimpan ke {path}")
+
+
+class TrainingSummary(tf.keras.callbacks.Callback):
+    """
+    Lacak epoch terbaik berdasarkan val_loss, kembalikan bobot terbaik di akhir training,
+    dan hitung berapa epoch serta waktu yang dihemat oleh early stopping.
+    state_dir (direktori BackupAndRestore): nilai dan bobot terbaik ikut disimpan di sana,
+    sehingga setelah resume epoch terbaik sebelum crash tidak hilang
+    """
+
+    STATE_FILE = "best_state.json"
+    WEIGHTS_FILE = "best.weights.h5"
+
+    def __init__(self, max_epochs: int, monitor: str = "val_loss", restore_best: bool = True, state_dir=None):
+        super().__init__()
+        self.max_epochs = max_epochs
+        self.monitor = monitor
+        self.restore_best = restore_best
+        self.state_dir = state_dir
+        self.best = np.inf
+        self.best_epoch = None
+        self.best_weights = None
+        self.first_epoch = None
+        self.last_epoch = None
+        self.epoch_times = []
+        self.wall_clock_sec = 0.0
+        self._epoch_start = None
+        self._train_start = None
+
+    def saved_state(self):
+        """State terbaik dari run yang crash ({"best", "best_epoch"}), None jika tidak ada"""
+        path = os.path.join(self.state_dir, self.STATE_FILE) if self.state_dir else None
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"State terbaik {path} tidak bisa dibaca: {e}")
+            return None
+
+    def _save_state(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        if self.restore_best:
+            self.model.save_weights(os.path.join(self.state_dir, self.WEIGHTS_FILE))
+        with open(os.path.join(self.state_dir, self.STATE_FILE), "w") as f:
+            json.dump({"monitor": self.monitor, "best": self.best, "best_epoch": self.best_epoch}, f)
+
+    def _load_state(self):
+        """Pulihkan best/best_epoch (dan bobotnya, ke memori) dari run sebelum resume"""
+        state = self.saved_state()
+        if not state or state.get("monitor") != self.monitor or state.get("best_epoch") is None:
+            return
+        self.best, self.best_epoch = float(state["best"]), int(state["best_epoch"])
+        weights_path = os.path.join(self.state_dir, self.WEIGHTS_FILE)
+        if self.restore_best and os.path.exists(weights_path):
+            current = self.model.get_weights()
+            self.model.load_weights(weights_path)
+            self.best_weights = self.model.get_weights()
+            self.model.set_weights(current)
+        logger.info(f"Resume: epoch terbaik sebelumnya {self.best_epoch + 1} ({self.monitor}={self.best:.6f})")
+
+    def on_train_begin(self, logs=None):
+        self._train_start = time.perf_counter()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        if self.first_epoch is None:
+            # > 0 jika training dilanjutkan dari checkpoint (BackupAndRestore)
+            self.first_epoch = epoch
+            if epoch > 0 and self.state_dir:
+                self._load_state()
+        self._epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_times.append(time.perf_counter() - self._epoch_start)
+        self.last_epoch = epoch
+        current = (logs or {}).get(self.monitor)
+        if current is not None and current < self.best:
+            self.best = float(current)
+            self.best_epoch = epoch
+            if self.restore_best:
+                self.best_weights = self.model.get_weights()
+            if self.state_dir:
+                self._save_state()
+
+    def on_train_end(self, logs=None):
+        if self.restore_best and self.best_weights is not None and self.best_epoch != self.last_epoch:
+            logger.info(f"Restore bobot terbaik dari epoch {self.best_epoch + 1} ({self.monitor}={self.best:.6f})")
+            self.model.set_weights(self.best_weights)
+        self.wall_clock_sec = time.perf_counter() - self._train_start
+
+    def summary(self) -> dict:
+        if self.last_epoch is None:
+            return {}
+        epochs_run = self.last_epoch + 1
+        epochs_saved = max(0, self.max_epochs - epochs_run)
+        avg_epoch_sec = float(np.mean(self.epoch_times)) if self.epoch_times else 0.0
+        return {
+            "max_epochs": self.max_epochs,
+            "epochs_run": epochs_run,
+            "resumed_from_epoch": self.first_epoch or 0,
+            "stopped_early": epochs_saved > 0,
+            "best_epoch": self.best_epoch + 1 if self.best_epoch is not None else None,
+            "best_" + self.monitor: self.best if self.best_epoch is not None else None,
+            "epochs_saved": epochs_saved,
+            "avg_epoch_sec": avg_epoch_sec,
+            "wall_clock_sec": float(self.wall_clock_sec),
+            "est_time_saved_sec": epochs_saved * avg_epoch_sec,
+        }
+
+
+def build_training_callbacks(run_name: str, max_epochs: int, patience=EARLY_STOPPING_PATIENCE,
+                             min_delta=EARLY_STOPPING_MIN_DELTA, checkpoint_dir=CHECKPOINT_DIR,
+                             checkpoint_every=CHECKPOINT_EVERY_EPOCHS, resume=RESUME_TRAINING):
+    """
+    Callback standar untuk training:
+    - EarlyStopping pada val_loss (bobot terbaik di-restore oleh TrainingSummary)
+    - best.keras (val_loss terbaik) dan checkpoint periodik per N epoch
+    - BackupAndRestore agar run yang crash bisa dilanjutkan dari epoch terakhir; state terbaik
+      TrainingSummary disimpan di direktori backup yang sama (dihapus BackupAndRestore saat run selesai)
+    Returns: (callbacks, summary_callback)
+    """
+    run_dir = os.path.join(checkpoint_dir, run_name)
+    os.makedirs(run_dir, exist_ok=True)
+    backup_dir = os.path.join(run_dir, "backup")
+
+    summary = TrainingSummary(max_epochs, state_dir=backup_dir if resume else None)
+    callbacks = []
+
+    if resume:
+        # Harus pertama supaya epoch awal sudah dipulihkan sebelum callback lain jalan
+        callbacks.append(tf.keras.callbacks.BackupAndRestore(backup_dir=backup_dir))
+    callbacks.append(summary)
+
+    if patience > 0:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(
+            monitor="val_loss", patience=patience, min_delta=min_delta, verbose=1
+        ))
+
+    # Saat resume, best.keras hanya ditimpa jika lebih baik dari epoch terbaik sebelum crash
+    resumed = summary.saved_state()
+    callbacks.append(tf.keras.callbacks.ModelCheckpoint(
+        os.path.join(run_dir, "best.keras"), monitor="val_loss", save_best_only=True,
+        initial_value_threshold=resumed["best"] if resumed else None
+    ))
+    if checkpoint_every > 0:
+        callbacks.append(PeriodicCheckpoint(run_dir, checkpoint_every))
+
+    return callbacks, summary
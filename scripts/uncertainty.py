@@ -0,0 +1,118 @@
+"""
+Estimasi ketidakpastian prediksi dengan Monte Carlo dropout
+K forward pass stokastik (dropout aktif) dijalankan dalam satu batch: input di-tile K kali
+lalu dipanggil sekali dengan training=True. Hasilnya interval prediksi dan level confidence.
+"""
+
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger("uncertainty")
+
+MC_DEFAULT_SAMPLES = int(os.getenv("MC_DEFAULT_SAMPLES", "30"))
+MC_MAX_SAMPLES = int(os.getenv("MC_MAX_SAMPLES", "200"))
+MC_INTERVAL = float(os.getenv("MC_INTERVAL", "0.9"))
+# Lebar interval relatif terhadap prediksi (persen) untuk level confidence
+CONFIDENCE_HIGH_PCT = float(os.getenv("CONFIDENCE_HIGH_PCT", "2.0"))
+CONFIDENCE_MEDIUM_PCT = float(os.getenv("CONFIDENCE_MEDIUM_PCT", "5.0"))
+
+
+def supports_mc_dropout(model) -> bool:
+    """Hanya model Keras dengan layer Dropout yang bisa dijalankan stokastik"""
+    layers = getattr(model, "layers", None)
+    if not layers or not hasattr(model, "predict_on_batch"):
+        return False
+    return any(type(layer).__name__ == "Dropout" for layer in layers)
+
+
+def confidence_level(interval_width_pct: float) -> str:
+    if interval_width_pct <= CONFIDENCE_HIGH_PCT:
+        return "High"
+    if interval_width_pct <= CONFIDENCE_MEDIUM_PCT:
+        return "Medium"
+    return "Low"
+
+
+class MCDropoutEstimator:
+    """
+    Jalankan MC dropout dengan K yang dibatasi budget latency.
+    Biaya per sampel (detik per baris batch) diestimasi dengan EWMA dari panggilan sebelumnya,
+    sehingga K bisa dikurangi sebelum panggilan dimulai jika budget tidak cukup.
+    """
+
+    def __init__(self, max_samples=MC_MAX_SAMPLES, smoothing=0.3):
+        self.max_samples = max_samples
+        self.smoothing = smoothing
+        self._cost = {}
+        self._lock = threading.Lock()
+
+    def samples_for_budget(self, key, requested: int, n_inputs: int, latency_budget_ms=None) -> int:
+        k = max(2, min(int(requested), self.max_samples))
+        if latency_budget_ms is None:
+            return k
+        with self._lock:
+            cost = self._cost.get(key)
+        if cost is None:
+            return k
+        affordable = int((latency_budget_ms / 1000.0) / (cost * n_inputs))
+        return max(2, min(k, affordable))
+
+    def _record(self, key, elapsed: float, rows: int):
+        per_row = elapsed / rows
+        with self._lock:
+            prev = self._cost.get(key)
+            self._cost[key] = per_row if prev is None else (1 - self.smoothing) * prev + self.smoothing * per_row
+
+    def sample(self, model, X: np.ndarray, k: int, key=None) -> np.ndarray:
+        """K sampel stokastik untuk setiap input: (n_inputs, k), dalam satu forward pass"""
+        X = np.asarray(X, dtype=np.float32)
+        tiled = np.repeat(X, k, axis=0)
+        start = time.perf_counter()
+        out = model(tiled, training=True)
+        out = np.asarray(out).reshape(len(X), k, -1)[:, :, 0]
+        self._record(key if key is not None else id(model), time.perf_counter() - start, len(tiled))
+        return out
+
+    def estimate(self, model, X: np.ndarray, inverse_fn, samples=MC_DEFAULT_SAMPLES,
+                 latency_budget_ms=None, interval=MC_INTERVAL, key=None) -> list:
+        """
+        Interval prediksi per input dalam skala harga.
+        inverse_fn: array skala model -> array harga (mis. inverse scale kolom Close)
+        """
+        if not supports_mc_dropout(model):
+            raise ValueError("Model tidak mendukung MC dropout (butuh model Keras dengan layer Dropout)")
+
+        key = key if key is not None else id(model)
+        k = self.samples_for_budget(key, samples, len(X), latency_budget_ms)
+        start = time.perf_counter()
+        draws = self.sample(model, X, k, key)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        prices = inverse_fn(draws.reshape(-1)).reshape(draws.shape)
+        alpha = (1 - interval) / 2
+        lower, median, upper = np.quantile(prices, [alpha, 0.5, 1 - alpha], axis=1)
+        mean, std = prices.mean(axis=1), prices.std(axis=1, ddof=1)
+
+        results = []
+        for i in range(len(X)):
+            width_pct = float((upper[i] - lower[i]) / abs(mean[i]) * 100) if mean[i] else float("inf")
+            results.append({
+                "method": "mc_dropout",
+                "samples": k,
+                "samples_requested": int(samples),
+                "interval": interval,
+                "lower": float(lower[i]),
+                "upper": float(upper[i]),
+                "median": float(median[i]),
+                "mean": float(mean[i]),
+                "std": float(std[i]),
+                "interval_width_pct": width_pct,
+                "confidence": confidence_level(width_pct),
+                "latency_ms": round(elapsed_ms, 2),
+                "latency_budget_ms": latency_budget_ms,
+            })
+        return results
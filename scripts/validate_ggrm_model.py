@@ -7,14 +7,20 @@ import numpy as np
 import pandas as pd
 import tensorflow as tf
 import joblib
-import yfinance as yf
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+import os
 import logging
 import json
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 
+from market_data import fetch_history
+from dataset_snapshot import DatasetSnapshot, load_snapshot, resolve_snapshot, DATASET_SNAPSHOT
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +31,12 @@ logger = logging.getLogger(__name__)
 TICKER = "GGRM.JK"
 SEQ_LEN = 60
 HORIZON = 1
+FEATURES = ['Close', 'Open', 'High', 'Low', 'Volume', 'return1', 'ma7', 'ma21', 'std7']
+
+# Walk-forward backtest
+WALK_FORWARD_PERIOD = "5y"
+WALK_FORWARD_FOLDS = 10
+PREDICT_BATCH_SIZE = 1024
 
 def load_model_and_data():
     """Load model, scaler, dan metadata"""
@@ -44,14 +56,16 @@ def load_model_and_data():
         logger.error(f"File tidak ditemukan: {e}")
         raise
 
-def fetch_test_data(ticker=TICKER, period="6mo"):
-    """Fetch data GGRM untuk testing"""
-    logger.info(f"Fetching test data untuk {ticker}...")
+def fetch_test_data(ticker=TICKER, period="6mo", snapshot=None):
+    """Fetch data GGRM untuk testing (dari snapshot jika diberikan: period terakhir snapshot, tanpa download)"""
+    if snapshot is not None:
+        df = snapshot.frame(period)
+        logger.info(f"Test data dari snapshot {snapshot.manifest['name']}: {len(df)} rows")
+        return df
     
-    df = yf.download(ticker, period=period, interval="1d", progress=False)
+    logger.info(f"Fetching test data untuk {ticker}...")
     
-    if df.empty:
-        raise ValueError(f"No data for {ticker}")
+    df = fetch_history(ticker, period)
     
     logger.info(f"Downloaded {len(df)} rows")
     return df
@@ -138,16 +152,21 @@ def evaluate_model(model, scaler, X_test, y_test, df_test):
         'mape': float(mape)
     }, y_test_actual, y_pred_actual
 
-def test_recent_predictions():
-    """Test predictions untuk data terbaru"""
+def test_recent_predictions(df=None, model=None, scaler=None):
+    """
+    Test predictions untuk data terbaru
+    df/model/scaler yang sudah dimuat bisa diteruskan agar tidak download dan load ulang
+    """
     logger.info("\n" + "=" * 50)
     logger.info("RECENT PRICE PREDICTIONS")
     logger.info("=" * 50)
     
-    model, scaler, _ = load_model_and_data()
+    if model is None or scaler is None:
+        model, scaler, _ = load_model_and_data()
     
     # Fetch recent data
-    df = yf.download(TICKER, period="3mo", interval="1d", progress=False)
+    if df is None:
+        df = fetch_history(TICKER, period="6mo")
     df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
     
     df['return1'] = df['Close'].pct_change(1)
@@ -189,15 +208,192 @@ def test_recent_predictions():
         'date': str(df.index[-1].date())
     }
 
-def main():
+def build_walk_forward_origins(df, scaler, seq_len=SEQ_LEN, start=None):
+    """
+    Bangun semua rolling origin sebagai strided view (tanpa copy)
+    Origin t memakai window baris [t - seq_len, t) untuk memprediksi Close di baris t
+    df boleh DatasetSnapshot: fitur dibaca dari memory-map, dan jika scaler sama dengan
+    scaler snapshot, scaled.npy dipakai langsung tanpa transform. start membatasi baris
+    ke period yang diminta (seperti download period), bukan seluruh snapshot termasuk baris training
+    Returns: (windows, last_close, actual_close, dates)
+    """
+    if isinstance(df, DatasetSnapshot):
+        index = df.feature_index()
+        lo = int(index.searchsorted(start)) if start is not None else 0
+        if df.uses_scaler(scaler):
+            data_scaled = df.scaled[lo:]
+        else:
+            data_scaled = scaler.transform(df.features[lo:]).astype(np.float32)
+        closes = df.features[lo:, 0]
+        index = index[lo:]
+    else:
+        df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+        df['return1'] = df['Close'].pct_change(1)
+        df['ma7'] = df['Close'].rolling(7).mean()
+        df['ma21'] = df['Close'].rolling(21).mean()
+        df['std7'] = df['Close'].rolling(7).std()
+        df = df.dropna()
+        
+        data_scaled = scaler.transform(df[FEATURES].values.astype(float)).astype(np.float32)
+        closes = df['Close'].values.astype(float).reshape(-1)
+        index = df.index
+    
+    if len(data_scaled) <= seq_len:
+        raise ValueError(f"Data walk-forward hanya {len(data_scaled)} baris, butuh lebih dari seq_len={seq_len}")
+    
+    # (n_rows - seq_len + 1, seq_len, n_features) view; window terakhir tidak punya actual
+    windows = np.lib.stride_tricks.sliding_window_view(data_scaled, (seq_len, data_scaled.shape[1]))[:, 0]
+    windows = windows[:-1]
+    last_close = closes[seq_len - 1:-1]
+    actual_close = closes[seq_len:]
+    dates = index[seq_len:]
+    
+    logger.info(f"Walk-forward origins: {len(windows)} ({dates[0].date()} → {dates[-1].date()})")
+    return windows, last_close, actual_close, dates
+
+def walk_forward_metrics(pred, actual, last_close, n_folds=WALK_FORWARD_FOLDS):
+    """MAE, RMSE, MAPE dan direction accuracy per fold (contiguous) dalam satu pass vectorized"""
+    n = len(actual)
+    n_folds = max(1, min(n_folds, n))
+    fold_id = (np.arange(n) * n_folds) // n
+    counts = np.bincount(fold_id, minlength=n_folds)
+    
+    err = pred - actual
+    hits = np.sign(pred - last_close) == np.sign(actual - last_close)
+    sums = {
+        'abs': np.bincount(fold_id, weights=np.abs(err), minlength=n_folds),
+        'sq': np.bincount(fold_id, weights=err ** 2, minlength=n_folds),
+        'ape': np.bincount(fold_id, weights=np.abs(err / actual), minlength=n_folds),
+        'hit': np.bincount(fold_id, weights=hits, minlength=n_folds),
+    }
+    
+    mae = sums['abs'] / counts
+    rmse = np.sqrt(sums['sq'] / counts)
+    mape = sums['ape'] / counts * 100
+    direction = sums['hit'] / counts * 100
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    
+    folds = [{
+        'fold': int(k + 1),
+        'start_index': int(starts[k]),
+        'n_origins': int(counts[k]),
+        'mae': float(mae[k]),
+        'rmse': float(rmse[k]),
+        'mape': float(mape[k]),
+        'direction_accuracy': float(direction[k])
+    } for k in range(n_folds)]
+    
+    overall = {
+        'n_origins': int(n),
+        'mae': float(np.abs(err).mean()),
+        'rmse': float(np.sqrt((err ** 2).mean())),
+        'mape': float(np.abs(err / actual).mean() * 100),
+        'direction_accuracy': float(hits.mean() * 100)
+    }
+    return folds, overall
+
+def walk_forward_backtest(model, scaler, df, n_folds=WALK_FORWARD_FOLDS, seq_len=SEQ_LEN, start=None):
+    """Jalankan model sekali (batch besar) untuk semua origin lalu hitung metrik per fold"""
+    windows, last_close, actual_close, dates = build_walk_forward_origins(df, scaler, seq_len, start)
+    
+    y_pred = model.predict(windows, batch_size=PREDICT_BATCH_SIZE, verbose=0).reshape(-1)
+    dummy = np.zeros((len(y_pred), scaler.n_features_in_))
+    dummy[:, 0] = y_pred
+    pred_close = scaler.inverse_transform(dummy)[:, 0]
+    
+    folds, overall = walk_forward_metrics(pred_close, actual_close, last_close, n_folds)
+    for fold in folds:
+        i = fold['start_index']
+        fold['start_date'] = str(dates[i].date())
+        fold['end_date'] = str(dates[i + fold['n_origins'] - 1].date())
+    
+    logger.info(f"Walk-forward overall: MAE={overall['mae']:.2f}, RMSE={overall['rmse']:.2f}, "
+                f"MAPE={overall['mape']:.2f}%, Direction={overall['direction_accuracy']:.2f}%")
+    return {'folds': folds, 'overall': overall}
+
+def _backtest_model_version(model_path, scaler_path, df, n_folds, start=None):
+    """Worker: load satu versi model dan jalankan walk-forward (df boleh path snapshot)"""
+    if isinstance(df, str):
+        df = DatasetSnapshot(df)
+    model = tf.keras.models.load_model(model_path, compile=False)
+    scaler = joblib.load(scaler_path)
+    result = walk_forward_backtest(model, scaler, df, n_folds, start=start)
+    return {'model_path': model_path, 'scaler_path': scaler_path, **result}
+
+def backtest_model_versions(versions, df, n_folds=WALK_FORWARD_FOLDS, workers=None, start=None):
+    """
+    Walk-forward untuk beberapa versi model secara paralel (satu proses per versi)
+    versions: list (model_path, scaler_path)
+    df: DataFrame atau path snapshot (worker memory-map snapshot, DataFrame tidak di-pickle per proses)
+    start: awal period untuk snapshot (DatasetSnapshot.period_start)
+    """
+    workers = workers or min(len(versions), os.cpu_count() or 1)
+    if workers <= 1 or len(versions) == 1:
+        return [_backtest_model_version(m, s, df, n_folds, start) for m, s in versions]
+    
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [pool.submit(_backtest_model_version, m, s, df, n_folds, start) for m, s in versions]
+        return [f.result() for f in futures]
+
+def run_walk_forward(model_specs, period=WALK_FORWARD_PERIOD, n_folds=WALK_FORWARD_FOLDS, workers=None,
+                     snapshot=None):
+    """
+    Download data sekali (atau pakai period terakhir dari snapshot), backtest semua versi model,
+    simpan ke walk_forward_results.json
+    """
+    versions = []
+    for spec in model_specs:
+        model_path, _, scaler_path = spec.partition(":")
+        versions.append((model_path, scaler_path or "scaler_ggrm.pkl"))
+    
+    start = None
+    if snapshot:
+        df = resolve_snapshot(snapshot)
+        start = DatasetSnapshot(df).period_start(period)
+    else:
+        df = fetch_test_data(period=period)
+    results = backtest_model_versions(versions, df, n_folds, workers, start)
+    
+    output = {
+        'timestamp': datetime.now().isoformat(),
+        'ticker': TICKER,
+        'period': period,
+        'start_date': str(start.date()) if start is not None else None,
+        'dataset_snapshot': os.path.basename(df) if snapshot else None,
+        'n_folds': n_folds,
+        'models': results
+    }
+    with open('walk_forward_results.json', 'w') as f:
+        json.dump(output, f, indent=2)
+    logger.info("✅ Walk-forward selesai! Results disimpan ke walk_forward_results.json")
+    return output
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validasi model GGRM")
+    parser.add_argument("--walk-forward", action="store_true", help="Jalankan walk-forward backtest")
+    parser.add_argument("--models", nargs="+", default=["stock_model.keras"],
+                        help="Versi model untuk walk-forward, format model.keras[:scaler.pkl]")
+    parser.add_argument("--period", default=WALK_FORWARD_PERIOD)
+    parser.add_argument("--folds", type=int, default=WALK_FORWARD_FOLDS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--snapshot", default=DATASET_SNAPSHOT or None,
+                        help="Snapshot dari dataset_snapshot.py (path, nama, atau ticker) sebagai ganti download")
+    args = parser.parse_args(argv)
+    
     try:
+        if args.walk_forward:
+            run_walk_forward(args.models, args.period, args.folds, args.workers, args.snapshot)
+            return 0
+        
         # Load model
         model, scaler, metadata = load_model_and_data()
         
         logger.info(f"Metadata: {json.dumps(metadata, indent=2)}")
         
         # Fetch test data
-        df = fetch_test_data(period="6mo")
+        snapshot = load_snapshot(args.snapshot) if args.snapshot else None
+        df = fetch_test_data(period="6mo", snapshot=snapshot)
         
         # Prepare test sequences
         X_test, y_test, df_test = prepare_test_sequences(df, scaler)
@@ -206,7 +402,7 @@ def main():
         metrics, y_actual, y_pred = evaluate_model(model, scaler, X_test, y_test, df_test)
         
         # Test recent predictions
-        recent = test_recent_predictions()
+        recent = test_recent_predictions(df, model, scaler)
         
         # Save test results
         results = {
@@ -61,7 +61,20 @@ def check_files():
     
     required_files = {
         'train_model.py': 'Training script',
+        'training_pipeline.py': 'Training input pipeline',
+        'feature_buffer.py': 'Per-ticker scaled feature ring buffer',
+        'market_scheduler.py': 'Post-close forecast scheduler',
+        'market_data.py': 'Market data providers, cache and circuit breaker',
+        'numpy_lstm.py': 'NumPy LSTM inference engine',
+        'quantize_model.py': 'TFLite quantized export and comparison',
+        'uncertainty.py': 'MC dropout prediction intervals',
+        'ensemble.py': 'Parallel model ensemble',
+        'request_profiler.py': 'Per-request sampling profiler',
+        'memory_monitor.py': 'Memory introspection and budget shedding',
+        'dataset_snapshot.py': 'Versioned memory-mapped training dataset snapshots',
+        'train_global.py': 'Global multi-ticker training',
         'backend_api.py': 'API server',
+        'model_registry.py': 'Model registry',
         'requirements.txt': 'Dependencies',
         'retrain_ggrm.py': 'Retrain script',
         'daily_prediction.py': 'Daily prediction',